@@ -0,0 +1,66 @@
+"""
+Per-call versus batched throughput of MetropolitanDemandForecaster.
+
+Fits the forecaster on a synthetic year of daily volumes, then scores the
+same scenario grid once through ``generate_prediction`` (one call per
+scenario, cache bypassed) and once through ``predict_batch``.
+
+    python -m benchmarks.bench_inference [scenarios]
+"""
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from src.forecasting_engine import MetropolitanDemandForecaster
+from src.model_store import ModelStore
+
+def synthetic_feature_matrix(days=365, seed=42):
+    """Daily volumes with weekday seasonality and a rain effect."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    precip = rng.gamma(0.6, 4.0, days)
+    dow = dates.dayofweek.to_numpy()
+    trip_count = 90000 + 8000 * (dow < 5) + 1200 * precip + rng.normal(0, 3000, days)
+    return pd.DataFrame({
+        "date": dates,
+        "trip_count": trip_count.astype(int),
+        "dow": dow,
+        "month": dates.month.to_numpy(),
+        "precipitation_sum": precip,
+    })
+
+def main(scenarios=365):
+    # Benchmark model only: never replace the pipeline's active model
+    predictor = MetropolitanDemandForecaster(store=ModelStore("daily", root=tempfile.mkdtemp()))
+    predictor.train_forecasting_model(synthetic_feature_matrix())
+
+    rng = np.random.default_rng(7)
+    grid = pd.DataFrame({
+        "dow": rng.integers(0, 7, scenarios),
+        "month": rng.integers(1, 13, scenarios),
+        # Distinct precipitation values keep every single call a cache miss
+        "precipitation_sum": rng.uniform(0, 40, scenarios),
+    })
+
+    start = time.perf_counter()
+    for row in grid.itertuples(index=False):
+        predictor.generate_prediction(row.dow, row.month, row.precipitation_sum)
+    per_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictor.predict_batch(grid)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictor.predict_batch(grid, quantiles=[0.1, 0.9])
+    intervals = time.perf_counter() - start
+
+    print(f"Scenarios:            {scenarios}")
+    print(f"Per-call:             {per_call:.3f}s ({scenarios / per_call:,.0f} predictions/s)")
+    print(f"Batched:              {batched:.3f}s ({scenarios / batched:,.0f} predictions/s)")
+    print(f"Batched + intervals:  {intervals:.3f}s ({scenarios / intervals:,.0f} predictions/s)")
+    print(f"Speedup:              {per_call / batched:.1f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 365)
@@ -0,0 +1,139 @@
+"""
+Stage-level benchmark suite for the ingestion lifecycle and the analytical suite.
+
+Each scale runs in a scratch workspace seeded by benchmarks/synthetic_trips.py
+(trips, zone geometry and weather; no network): the MetropolitanIngestor stages and every UrbanLogisticsEngine
+report are timed with their peak RSS, and the results are written as JSON.
+
+    python -m benchmarks.run_benchmarks --rows 1M,10M,100M
+    python -m benchmarks.run_benchmarks --rows 1M --compare benchmarks/results/<baseline>.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import duckdb
+
+# Resolve the repo root before the scratch workspace becomes the working directory
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+from src.data_pipeline import MetropolitanIngestor
+from src.analytics import UrbanLogisticsEngine
+from src.instrumentation import RssSampler
+from benchmarks.synthetic_trips import generate_trip_files, generate_weather_cache, generate_zone_geojson
+
+# A stage counts as regressed when it slows down by more than this share
+REGRESSION_THRESHOLD = 0.10
+
+def _parse_rows(text):
+    """'1M' / '250k' / '1e6' -> int."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+def _timed(stages, name, fn):
+    with RssSampler() as sampler:
+        started = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - started
+    peak_mb = sampler.peak_mb
+    stages.append({"stage": name, "seconds": round(seconds, 4), "peak_rss_mb": peak_mb})
+    print(f"  [BENCH] {name:<45} {seconds:9.3f}s  peak RSS {peak_mb} MB")
+
+def run_scale(rows, modes=("sequential",), streaming=False, workspace=None):
+    """Benchmarks one lake size in a scratch workspace and returns the run record."""
+    workspace = workspace or tempfile.mkdtemp(prefix="bench_lake_")
+    previous_cwd = os.getcwd()
+    # Config paths are relative (data/, output/): the workspace becomes the project root
+    os.chdir(workspace)
+    try:
+        os.makedirs("data", exist_ok=True)
+        os.makedirs("output", exist_ok=True)
+        print(f"Generating {rows:,} synthetic trips in {workspace}...")
+        generate_trip_files("data", rows)
+        # Zone geometry, so unify also times the zone-gap rules
+        generate_zone_geojson(os.path.join("data", "taxi_zones.geojson"))
+        generate_weather_cache(os.path.join("data", "weather_daily.parquet"))
+
+        stages = []
+        ingestor = MetropolitanIngestor(streaming=streaming)
+        _timed(stages, "ingestor.unify_metropolitan_lake", ingestor.unify_metropolitan_lake)
+        _timed(stages, "ingestor.apply_sanitization_policy",
+               lambda: ingestor.apply_sanitization_policy(export_dataset=False))
+        _timed(stages, "ingestor.export_partitioned_dataset", ingestor.export_partitioned_dataset)
+
+        engine = UrbanLogisticsEngine(ingestor.con)
+        for mode in modes:
+            if mode == "fused":
+                _timed(stages, "engine.fused._materialize_suite_rollup", engine._materialize_suite_rollup)
+            for report in UrbanLogisticsEngine.REPORTS:
+                _timed(stages, f"engine.{mode}.{report}", lambda: engine.run_report(report, mode=mode))
+        ingestor.con.close()
+        return {"rows": rows, "streaming": streaming, "stages": stages}
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Prints per-stage timing changes; returns the stages that regressed beyond ``threshold``."""
+    def index(results):
+        return {
+            (run["rows"], run["streaming"], stage["stage"]): stage
+            for run in results["runs"] for stage in run["stages"]
+        }
+    before, after = index(baseline), index(current)
+    regressions = []
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key]["seconds"], after[key]["seconds"]
+        change = (new - old) / old if old else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append({"rows": key[0], "streaming": key[1], "stage": key[2], "change": round(change, 4)})
+        print(f"  {key[0]:>12,} {key[2]:<45} {old:9.3f}s -> {new:9.3f}s ({change:+.1%}) {flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1M", help="comma-separated lake sizes, e.g. 1M,10M,100M")
+    parser.add_argument("--modes", default="sequential,rollup", help="analytics modes to time")
+    parser.add_argument("--streaming", action="store_true", help="use streaming sanitization")
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "cpu_count": os.cpu_count(),
+        "runs": [
+            run_scale(_parse_rows(rows), modes=args.modes.split(","), streaming=args.streaming)
+            for rows in args.rows.split(",")
+        ],
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
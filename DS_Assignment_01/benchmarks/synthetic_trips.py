@@ -0,0 +1,159 @@
+"""
+Synthetic TLC trip records for offline benchmarks.
+
+Writes monthly ``{taxi}_tripdata_YYYY-MM.parquet`` files with the yellow
+(tpep_*) or green (lpep_*) schema straight from DuckDB, so 100M-row lakes
+are generated without materializing rows in Python. Values derive from
+hashes of the row number, so a given seed always yields the same files.
+``generate_zone_geojson`` writes matching zone geometry for the geometric
+ghost-trip rules.
+
+    python -m benchmarks.synthetic_trips <output_dir> [rows]
+"""
+import os
+import sys
+import json
+import duckdb
+import pandas as pd
+from src.config import *
+
+# Share of generated rows per taxi type
+TAXI_SHARES = {"yellow": 0.85, "green": 0.15}
+
+# Zones of generate_zone_geojson set far apart (TLC's geometry-less "Unknown" and
+# "Outside of NYC" ids); regular trips stay within 1..263, whose cells are packed
+# closer than ZONE_GAP_FLOOR_MILES, so only ghost trips cross a zone gap
+GHOST_ZONES = (264, 265)
+GHOST_ZONE_LONGITUDES = (-74.0, -73.7)  # about 15.7 miles apart at 40.7N
+
+# Columns exclusive to one schema (besides the tpep_/lpep_ timestamp prefix)
+SCHEMA_EXTRAS = {
+    "yellow": "(hash(i, 11, {seed}) % 3)::DOUBLE * 0.5 as Airport_fee",
+    "green": "NULL::DOUBLE as ehail_fee, (1 + hash(i, 12, {seed}) % 2)::BIGINT as trip_type",
+}
+
+def _unit(i_expr, salt, seed):
+    """Deterministic uniform [0, 1) draw for row ``i_expr``."""
+    return f"((hash({i_expr}, {salt}, {seed}) % 1000000) / 1000000.0)"
+
+def _month_sql(taxi, month_start, rows, seed, ghost_rate, with_surcharge):
+    prefix = "tpep" if taxi == "yellow" else "lpep"
+    month_end = (pd.Timestamp(month_start) + pd.offsets.MonthBegin(1)).strftime("%Y-%m-%d")
+    seconds = int((pd.Timestamp(month_end) - pd.Timestamp(month_start)).total_seconds())
+    zones = ",".join(map(str, CONGESTION_ZONE_IDS))
+    u = lambda salt: _unit("i", salt, seed)
+    surcharge = f", CASE WHEN {u(9)} < 0.9 THEN 2.5 ELSE 0.0 END as congestion_surcharge" if with_surcharge else ""
+    return f"""
+        SELECT
+            (1 + hash(i, 1, {seed}) % 2)::INTEGER as VendorID,
+            pickup as {prefix}_pickup_datetime,
+            pickup + to_seconds(duration_s) as {prefix}_dropoff_datetime,
+            (1 + hash(i, 2, {seed}) % 4)::DOUBLE as passenger_count,
+            distance as trip_distance,
+            1::DOUBLE as RatecodeID,
+            'N' as store_and_fwd_flag,
+            pu as PULocationID,
+            do_ as DOLocationID,
+            (1 + hash(i, 3, {seed}) % 4)::BIGINT as payment_type,
+            fare as fare_amount,
+            0.5 as extra,
+            0.5 as mta_tax,
+            tip as tip_amount,
+            0.0 as tolls_amount,
+            1.0 as improvement_surcharge,
+            fare + tip + 2.0 as total_amount
+            {surcharge},
+            {SCHEMA_EXTRAS[taxi].format(seed=seed)}
+        FROM (
+            SELECT
+                i,
+                TIMESTAMP '{month_start}' + to_seconds(floor({u(4)} * {seconds})::BIGINT) as pickup,
+                -- Ghost trips rotate through the five sanitization rules, in SANITIZATION_RULES
+                -- order; the geometric ones (3: distance_below_zone_gap, 4: speed_exceeds_zone_gap)
+                -- cross between the GHOST_ZONES and need generate_zone_geojson's geometry
+                CASE WHEN ghost AND i % 5 = 0 THEN 3
+                     WHEN ghost AND i % 5 = 4 THEN 120
+                     ELSE 120 + floor({u(5)} * 3000)::BIGINT END as duration_s,
+                CASE WHEN ghost AND i % 5 = 1 THEN 0.0
+                     WHEN ghost AND i % 5 = 3 THEN 0.3
+                     WHEN ghost AND i % 5 = 4 THEN 20.0
+                     ELSE round(0.2 + {u(6)} * 12, 2) END as distance,
+                CASE WHEN ghost AND i % 5 = 2 THEN -5.0 ELSE round(3 + {u(7)} * 60, 2) END as fare,
+                round({u(8)} * 12, 2) as tip,
+                -- About 40% of endpoints fall inside the congestion relief zone
+                CASE WHEN ghost AND i % 5 >= 3 THEN {GHOST_ZONES[0]}
+                     WHEN {u(13)} < 0.4 THEN list_extract([{zones}], (1 + hash(i, 14, {seed}) % {len(CONGESTION_ZONE_IDS)})::BIGINT)
+                     ELSE (1 + hash(i, 15, {seed}) % 263)::INTEGER END::INTEGER as pu,
+                CASE WHEN ghost AND i % 5 >= 3 THEN {GHOST_ZONES[1]}
+                     WHEN {u(16)} < 0.4 THEN list_extract([{zones}], (1 + hash(i, 17, {seed}) % {len(CONGESTION_ZONE_IDS)})::BIGINT)
+                     ELSE (1 + hash(i, 18, {seed}) % 263)::INTEGER END::INTEGER as do_
+            FROM (SELECT range as i, {_unit('range', 10, seed)} < {ghost_rate} as ghost FROM range({rows}))
+        )
+        ORDER BY pickup
+    """
+
+def generate_trip_files(output_dir, rows=1_000_000, months=None, taxis=TAXIS, ghost_rate=0.03,
+                        missing_surcharge_every=6, seed=42):
+    """Writes synthetic monthly parquet files and returns their paths.
+
+    ``rows`` are split across taxi types by TAXI_SHARES and evenly across
+    ``months`` (``YYYY-MM`` strings, default 2024-01..2025-12). A ``ghost_rate``
+    share of trips violates one sanitization rule, spread evenly over all five
+    (the two geometric rules only fire with generate_zone_geojson's zones). Every
+    ``missing_surcharge_every``-th file omits congestion_surcharge, as the
+    pre-2019 TLC files do (0 disables the drift).
+    """
+    months = months or [f"{y}-{m:02d}" for y in (2024, 2025) for m in range(1, 13)]
+    os.makedirs(output_dir, exist_ok=True)
+    con = duckdb.connect()
+    paths = []
+    for taxi in taxis:
+        per_month = max(int(rows * TAXI_SHARES.get(taxi, 1.0 / len(taxis)) / len(months)), 1)
+        for n, month in enumerate(months):
+            with_surcharge = not (missing_surcharge_every and n % missing_surcharge_every == missing_surcharge_every - 1)
+            path = os.path.join(output_dir, f"{taxi}_tripdata_{month}.parquet").replace('\\', '/')
+            query = _month_sql(taxi, f"{month}-01", per_month, seed + n, ghost_rate, with_surcharge)
+            con.execute(f"COPY ({query}) TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+            paths.append(path)
+    con.close()
+    return paths
+
+def generate_zone_geojson(path=ZONE_GEOJSON_PATH, cell=0.0002):
+    """Writes a taxi zone GeoJSON for the synthetic trips and returns its path.
+
+    Zones 1..263 are ``cell``-degree squares packed in a grid well within
+    ZONE_GAP_FLOOR_MILES of each other, so regular trips never trip the
+    geometric rules; the GHOST_ZONES sit miles apart at GHOST_ZONE_LONGITUDES.
+    """
+    def square(x, y, size):
+        return {"type": "Polygon", "coordinates": [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]}
+    def feature(loc_id, geometry):
+        return {"type": "Feature", "geometry": geometry,
+                "properties": {"locationid": str(loc_id), "zone": f"Synthetic {loc_id}", "borough": "Manhattan"}}
+
+    features = [feature(loc_id, square(-73.98 + (loc_id - 1) % 17 * cell, 40.75 + (loc_id - 1) // 17 * cell, cell))
+                for loc_id in range(1, 264)]
+    features += [feature(loc_id, square(lon, 40.7, cell)) for loc_id, lon in zip(GHOST_ZONES, GHOST_ZONE_LONGITUDES)]
+    with open(path, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+    return path
+
+def generate_weather_cache(path=WEATHER_CACHE_PATH, start=WEATHER_START_DATE, end=WEATHER_END_DATE, seed=42):
+    """Writes a complete synthetic weather cache so the weather report never hits the network."""
+    con = duckdb.connect()
+    rows = []
+    for n, variable in enumerate(WEATHER_VARIABLES):
+        rows.append(f"""
+            SELECT {WEATHER_LATITUDE}::DOUBLE as latitude, {WEATHER_LONGITUDE}::DOUBLE as longitude,
+                   d::DATE as date, '{variable}' as variable,
+                   round({_unit('epoch(d)', 20 + n, seed)} * 20, 1) as value
+            FROM (SELECT unnest(generate_series(DATE '{start}', DATE '{end}', INTERVAL 1 DAY)) as d)
+        """)
+    con.execute(f"COPY ({' UNION ALL '.join(rows)}) TO '{path}' (FORMAT PARQUET)")
+    con.close()
+    return path
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    for path in generate_trip_files(target, int(float(sys.argv[2])) if len(sys.argv) > 2 else 1_000_000):
+        print(path)
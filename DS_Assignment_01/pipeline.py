@@ -1,34 +1,163 @@
-from src.data_pipeline import MetropolitanIngestor
-from src.analytics import UrbanLogisticsEngine
-from src.forecasting_engine import MetropolitanDemandForecaster
+import os
+import sys
+import glob
+from src.data_pipeline import MetropolitanIngestor, lake_fingerprint
+from src.analytics import UrbanLogisticsEngine, estimate_total, estimate_mean
+from src.forecasting_engine import MetropolitanDemandForecaster, ZoneDemandForecaster
+from src.stage_scheduler import Stage, StageScheduler
+from src.weather import MeteorologicalArchive
+from src.model_store import CURRENT_POINTER
+from src.query_service import SNAPSHOT_POINTER, publish_lake_snapshot
+from src.config import *
+from src.job_runner import NULL_PROGRESS, pipeline_lock
+from src.instrumentation import NULL_TELEMETRY, RunTelemetry
+from src.artifact_store import publish_artifact_version
+from src.watcher import MonthWatcher
 
-def main():
+# Engine helpers shared by every report; part of each report stage's code version
+REPORT_HELPERS = [
+    UrbanLogisticsEngine._calendar_year_filter,
+    UrbanLogisticsEngine._rollup_year_filter,
+    UrbanLogisticsEngine._apply_predictive_imputation,
+    UrbanLogisticsEngine.run_report,
+]
+
+def build_stages(progress=NULL_PROGRESS, mode=ANALYTICS_MODE, telemetry=NULL_TELEMETRY, acquire=True):
     """
-    Master orchestration script for the Metropolitan Transit Impact Analysis.
-    This pipeline synchronizes data acquisition, multi-dimensional analytics, 
-    and predictive modeling.
+    Declares the pipeline DAG: the incremental lake refresh feeds every report,
+    reports are independent of each other, and the forecaster consumes the
+    weather_demand_daily table materialized by synchronize_meteorological_data.
+    Without ``acquire`` the lake is refreshed from the files already in DATA_DIR.
     """
-    print("--- METROPOLITAN TRANSPORTATION AUDIT PIPELINE v3.0 ---")
-    
-    # 1. Data Acquisition & Normalization
-    # Handles remote asset retrieval, unification of disparate datasets, 
-    # and sanitization of the transit logging lake.
-    ingestor = MetropolitanIngestor()
-    con = ingestor.run_full_lifecycle()
-    
+    lake = {}
+    # Reports run individually under the scheduler; the fused scan only pays
+    # off when the whole suite reruns, so it degrades to per-report queries.
+    report_mode = "sequential" if mode == "fused" else mode
+
+    def ingest():
+        # 1. Data Acquisition & Normalization
+        # Handles remote asset retrieval, unification of disparate datasets,
+        # and sanitization of the transit logging lake.
+        ingestor = MetropolitanIngestor(progress=progress, telemetry=telemetry)
+        lake["con"] = ingestor.run_full_lifecycle(acquire=acquire)
+
+    def report_stage(report):
+        def run():
+            # Cursor per stage: reports execute concurrently on the shared lake
+            engine = UrbanLogisticsEngine(lake["con"].cursor(), progress=progress, telemetry=telemetry,
+                                          fetch_weather=False)
+            engine.run_report(report, mode=report_mode)
+        deps, code = ["ingest"], [getattr(UrbanLogisticsEngine, report)] + REPORT_HELPERS
+        if report == "synchronize_meteorological_data":
+            deps.append("weather")
+            code += [UrbanLogisticsEngine.materialize_daily_demand, MeteorologicalArchive]
+        return Stage(
+            report, run,
+            deps=deps,
+            outputs=[os.path.join(OUTPUT_DIR, name) for name in UrbanLogisticsEngine.REPORTS[report]],
+            code=code,
+            params=[report_mode, CONGESTION_ZONE_IDS],
+            progress_stage="analytics", unit="analyses", counters={"analyses_done": 1},
+        )
+
+    def preview():
+        # Sample-based estimates of every report, published ahead of the exact suite
+        engine = UrbanLogisticsEngine(lake["con"].cursor(), telemetry=telemetry, fetch_weather=False)
+        engine.execute_analytical_suite(mode="preview")
+
+    def forecast():
+        # 3. Predictive Modeling (Machine Learning)
+        # Calibrates the Random Forest Regressor for infrastructure demand forecasting.
+        predictor = MetropolitanDemandForecaster(telemetry=telemetry)
+        ml_data = predictor.prepare_inference_features(lake["con"].cursor(), from_rollup=mode == "rollup")
+        predictor.train_forecasting_model(ml_data)
+
+    def zone_forecast():
+        # Next-week hourly demand for every congestion zone (enforcement staffing)
+        ZoneDemandForecaster(telemetry=telemetry).forecast_next_week(lake["con"].cursor(), from_rollup=mode == "rollup")
+
+    def snapshot():
+        # Read-only copy of the rollup cube for the dashboard's live drill-downs
+        publish_lake_snapshot(lake["con"].cursor())
+
+    # The weather cache is a second source: backfilled days rerun its consumers.
+    # Only this stage fetches; reports register the cache as its digest recorded it.
+    archive = MeteorologicalArchive()
+    stages = [
+        Stage("ingest", ingest, digest=lambda: lake_fingerprint(lake["con"])),
+        Stage("weather", archive.synchronize, digest=archive.cache_digest),
+    ]
+    # Listed before the reports so the scheduler starts it first; its artifacts
+    # are discarded once the run completes, so it declares no outputs
+    stages.append(Stage(
+        "preview", preview,
+        deps=["ingest", "weather"],
+        code=[UrbanLogisticsEngine, estimate_total, estimate_mean, MeteorologicalArchive],
+        params=[CONGESTION_ZONE_IDS, SAMPLE_RATE, SAMPLE_MIN_ROWS, PREVIEW_CONFIDENCE_Z],
+    ))
     # 2. Analytical Suite Execution
-    # Runs the compliance audit, velocity matrix generation, 
+    # Runs the compliance audit, velocity matrix generation,
     # and econometric modeling for the 2025 Congestion Relief Zone.
-    engine = UrbanLogisticsEngine(con)
-    engine.execute_analytical_suite()
-    
-    # 3. Predictive Modeling (Machine Learning)
-    # Calibrates the Random Forest Regressor for infrastructure demand forecasting.
-    predictor = MetropolitanDemandForecaster()
-    ml_data = predictor.prepare_inference_features(con)
-    predictor.train_forecasting_model(ml_data)
-    
+    stages += [report_stage(report) for report in UrbanLogisticsEngine.REPORTS]
+    stages.append(Stage(
+        "forecast", forecast,
+        deps=["ingest", "synchronize_meteorological_data"],
+        outputs=[os.path.join(MODEL_STORE_DIR, "daily", CURRENT_POINTER)],
+        code=[MetropolitanDemandForecaster.prepare_inference_features,
+              MetropolitanDemandForecaster.train_forecasting_model],
+        params=[mode],
+        progress_stage="forecast",
+    ))
+    stages.append(Stage(
+        "zone_forecast", zone_forecast,
+        deps=["ingest"],
+        outputs=[os.path.join(OUTPUT_DIR, "zone_hourly_forecast.arrow")],
+        code=[ZoneDemandForecaster],
+        params=[mode, CONGESTION_ZONE_IDS, ZONE_FORECAST_HISTORY_DAYS, ZONE_FORECAST_HORIZON_HOURS, ZONE_FORECAST_MAX_ITER],
+        progress_stage="forecast",
+    ))
+    stages.append(Stage(
+        "snapshot", snapshot,
+        deps=["ingest"],
+        outputs=[os.path.join(QUERY_SNAPSHOT_DIR, SNAPSHOT_POINTER)],
+        code=[publish_lake_snapshot],
+    ))
+    return stages
+
+def main(progress=NULL_PROGRESS, force=False, mode=ANALYTICS_MODE, acquire=True):
+    """
+    Master orchestration script for the Metropolitan Transit Impact Analysis.
+    This pipeline synchronizes data acquisition, multi-dimensional analytics,
+    and predictive modeling. ``progress`` receives stage-level updates
+    (see src/job_runner.py) and may cancel the run at stage checkpoints.
+
+    Stages whose inputs (lake state, code and settings) are unchanged since
+    their last successful run are skipped; ``force`` reruns all of them.
+    Per-stage timings and query profiles go to the run log (RUN_LOG_PATH).
+    A successful run publishes a new artifact version (ARTIFACT_VERSION_PATH).
+    """
+    print("--- METROPOLITAN TRANSPORTATION AUDIT PIPELINE v3.0 ---")
+    telemetry = RunTelemetry()
+    scheduler = StageScheduler(build_stages(progress, mode, telemetry, acquire), progress=progress, telemetry=telemetry)
+    try:
+        executed = scheduler.run(force=force)
+    finally:
+        telemetry.finish()
+    # Exact results are in place; the dashboard stops showing sample estimates
+    for path in glob.glob(os.path.join(OUTPUT_DIR, UrbanLogisticsEngine.PREVIEW_PREFIX + "*")):
+        os.remove(path)
+    derived = sum(1 for stage in scheduler.stages.values() if stage.digest is None)
+    print(f"  [SCHEDULER] Executed {len(executed)} of {derived} derived stages.")
+    version = publish_artifact_version(scheduler.fingerprints.get("ingest"), executed)
+    print(f"  [SCHEDULER] Published artifact version {version}.")
+
     print("\n[SUCCESS] Metropolitan lifecycle complete. Execute 'streamlit run dashboard.py' to initialize the UI.")
 
 if __name__ == "__main__":
-    main()
+    if "--watch" in sys.argv[1:]:
+        # Polls WATCH_SOURCE and ingests newly published months incrementally
+        MonthWatcher().watch(once="--once" in sys.argv[1:])
+    else:
+        # Rejects the run while a dashboard-launched refresh holds the lake
+        with pipeline_lock():
+            main(force="--force" in sys.argv[1:])
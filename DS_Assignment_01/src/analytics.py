@@ -1,27 +1,137 @@
 import os
 import pandas as pd
 import numpy as np
-import requests
 from src.config import *
+from src.data_pipeline import open_clean_dataset, CROSSING_ENTERING, CROSSING_INTERNAL
+from src.artifact_store import publish_artifact, publish_metric
+from src.weather import MeteorologicalArchive
+from src.job_runner import NULL_PROGRESS
+from src.instrumentation import NULL_TELEMETRY
+
+# Horvitz-Thompson estimators over trips_sample (Poisson sampling, weight = 1/pi).
+# The variance of a weighted total is sum(w * (w - 1) * y^2); means are ratio
+# estimators with the linearized variance sum(w * (w - 1) * (y - mean)^2) / N^2.
+_PAIR_WEIGHT = "sample_weight * (sample_weight - 1)"
+
+def estimate_total(y, where="true"):
+    """SQL (estimate, confidence half-width) of the population total of ``y``."""
+    return (
+        f"SUM(sample_weight * ({y})) FILTER (WHERE {where})",
+        f"{PREVIEW_CONFIDENCE_Z} * SQRT(SUM({_PAIR_WEIGHT} * ({y}) * ({y})) FILTER (WHERE {where}))",
+    )
+
+def estimate_mean(y, where="true"):
+    """SQL (estimate, confidence half-width) of the population mean of non-NULL ``y``."""
+    where = f"({where}) AND ({y}) IS NOT NULL"
+    total = f"SUM(sample_weight) FILTER (WHERE {where})"
+    mean = f"(SUM(sample_weight * ({y})) FILTER (WHERE {where}) / {total})"
+    variance = (f"SUM({_PAIR_WEIGHT} * ({y}) * ({y})) FILTER (WHERE {where})"
+                f" - 2 * {mean} * SUM({_PAIR_WEIGHT} * ({y})) FILTER (WHERE {where})"
+                f" + {mean} * {mean} * SUM({_PAIR_WEIGHT}) FILTER (WHERE {where})")
+    return mean, f"{PREVIEW_CONFIDENCE_Z} * SQRT(GREATEST({variance}, 0)) / {total}"
 
 class UrbanLogisticsEngine:
     """
     Core analytical engine for processing metropolitan transit datasets.
     Implements compliance auditing, velocity heatmaps, and econometric modeling.
     """
-    def __init__(self, con):
+    # Reports of the analytical suite, in execution order, with the files they publish
+    REPORTS = {
+        "audit_surcharge_compliance": ["surcharge_compliance.arrow"],
+        "generate_velocity_matrix": ["velocity_stats.arrow"],
+        "model_econometric_impact": ["economic_trends.arrow"],
+        "calculate_total_revenue": ["revenue_report.txt"],
+        "audit_ghost_trips": ["ghost_trip_reasons.arrow", "ghost_trips_audit.arrow"],
+        "synchronize_meteorological_data": ["elasticity.txt"],
+    }
+
+    # Suffix/prefix of everything a preview run publishes, next to the exact results
+    PREVIEW_PREFIX = "preview_"
+
+    def __init__(self, con, partitioned=False, progress=NULL_PROGRESS, telemetry=NULL_TELEMETRY, fetch_weather=True):
         self.con = con
-        self._initialize_spatial_bounds()
+        self.partitioned = partitioned
+        # Off under the stage scheduler, whose "weather" stage owns the fetch
+        self.fetch_weather = fetch_weather
+        self.progress = progress
+        self.telemetry = telemetry
+        self.mode = "sequential"
+
+    @classmethod
+    def from_dataset(cls, path=CLEAN_DATASET_DIR):
+        """Attaches the engine to the hive-partitioned trips_clean Parquet export."""
+        return cls(open_clean_dataset(path), partitioned=True)
+
+    def _calendar_year_filter(self, year):
+        """Sargable predicate for one calendar year of pickups.
+
+        A pickup_time range lets row-group min/max statistics skip other years;
+        on the partitioned dataset the hive ``year`` column also prunes files.
+        """
+        predicate = f"pickup_time >= '{year}-01-01' AND pickup_time < '{year + 1}-01-01'"
+        if self.partitioned:
+            predicate = f"year = {year} AND {predicate}"
+        return predicate
+
+    def _named(self, name):
+        """Artifact or table name for the current mode; previews never overwrite exact results."""
+        return f"{self.PREVIEW_PREFIX}{name}" if self.mode == "preview" else name
 
-    def _initialize_spatial_bounds(self):
-        """Sets up virtual boundaries for the Manhattan Congestion Relief Zone."""
-        ids_str = ",".join(map(str, CONGESTION_ZONE_IDS))
-        self.con.execute(f"CREATE OR REPLACE TABLE congestion_zones AS SELECT unnest([{ids_str}]) as LocationID")
+    def _rollup_year_filter(self, year):
+        """Calendar-year predicate over the trip_rollup cube's hourly key."""
+        return f"pickup_hour >= '{year}-01-01' AND pickup_hour < '{year + 1}-01-01'"
+
+    def _materialize_suite_rollup(self):
+        """Computes every trips_clean aggregate of the suite in a single scan.
+
+        Each report is one grouping set; report-specific WHERE clauses become
+        aggregate FILTERs so the per-report results match the standalone
+        queries exactly.
+        """
+        print("Materializing fused analytical rollup (single scan)...")
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE suite_rollup AS
+            WITH flagged AS (
+                SELECT
+                    pickup_loc,
+                    year(pickup_time) as yr,
+                    month(pickup_time) as mo,
+                    dayofweek(pickup_time) as dow,
+                    hour(pickup_time) as hr,
+                    CAST(pickup_time AS DATE) as dt,
+                    surcharge,
+                    speed_mph,
+                    CASE WHEN fare > 0 THEN tip/fare ELSE 0 END as tip_ratio,
+                    ({self._calendar_year_filter(2025)}) as in_2025,
+                    crossing = {CROSSING_ENTERING} as entering,
+                    crossing = {CROSSING_INTERNAL} as internal
+                FROM trips_clean
+            )
+            SELECT
+                CASE GROUPING(pickup_loc, yr, mo, dow, hr, dt)
+                    WHEN 31 THEN 'compliance'
+                    WHEN 41 THEN 'velocity'
+                    WHEN 39 THEN 'economics'
+                    WHEN 63 THEN 'revenue'
+                    WHEN 62 THEN 'daily'
+                END as grouping_set,
+                pickup_loc, yr, mo, dow, hr, dt,
+                COUNT(*) FILTER (WHERE in_2025 AND entering) as trips,
+                COUNT(*) FILTER (WHERE in_2025 AND entering AND surcharge > 0) as paid,
+                COUNT(*) FILTER (WHERE internal) as internal_trips,
+                AVG(speed_mph) FILTER (WHERE internal) as avg_speed,
+                AVG(surcharge) as avg_surcharge,
+                AVG(tip_ratio) * 100 as avg_tip_pct,
+                SUM(surcharge) FILTER (WHERE in_2025) as total_revenue,
+                COUNT(*) FILTER (WHERE in_2025) as trip_count
+            FROM flagged
+            GROUP BY GROUPING SETS ((pickup_loc), (yr, dow, hr), (yr, mo), (), (dt))
+        """)
 
     def audit_surcharge_compliance(self):
         """Identifies zones with high mismatch between zone entry and surcharge payment."""
         print("Conducting Surcharge Compliance Audit...")
-        query = """
+        query = f"""
             SELECT 
                 pickup_loc, 
                 COUNT(*) as trips,
@@ -29,32 +139,107 @@ class UrbanLogisticsEngine:
                 (paid * 100.0 / trips) as compliance_pct
             FROM trips_clean
             WHERE 
-                year(pickup_time) = 2025
-                AND pickup_loc NOT IN (SELECT LocationID FROM congestion_zones)
-                AND dropoff_loc IN (SELECT LocationID FROM congestion_zones)
+                {self._calendar_year_filter(2025)}
+                AND crossing = {CROSSING_ENTERING}
             GROUP BY pickup_loc
             HAVING trips > 50
-            ORDER BY compliance_pct ASC
+            ORDER BY compliance_pct ASC, pickup_loc
             LIMIT 25
         """
-        self.con.execute(query).df().to_csv(os.path.join(OUTPUT_DIR, "surcharge_compliance.csv"), index=False)
+        if self.mode == "fused":
+            query = """
+                SELECT pickup_loc, trips, paid, (paid * 100.0 / trips) as compliance_pct
+                FROM suite_rollup
+                WHERE grouping_set = 'compliance' AND trips > 50
+                ORDER BY compliance_pct ASC, pickup_loc
+                LIMIT 25
+            """
+        elif self.mode == "rollup":
+            query = f"""
+                SELECT 
+                    pickup_loc,
+                    SUM(trip_count)::BIGINT as trips,
+                    SUM(paid_count)::BIGINT as paid,
+                    (paid * 100.0 / trips) as compliance_pct
+                FROM trip_rollup
+                WHERE 
+                    {self._rollup_year_filter(2025)}
+                    AND crossing = {CROSSING_ENTERING}
+                GROUP BY pickup_loc
+                HAVING trips > 50
+                ORDER BY compliance_pct ASC, pickup_loc
+                LIMIT 25
+            """
+        elif self.mode == "preview":
+            entering = f"{self._calendar_year_filter(2025)} AND crossing = {CROSSING_ENTERING}"
+            trips, trips_ci = estimate_total("1", entering)
+            paid, paid_ci = estimate_total("1", f"{entering} AND surcharge > 0")
+            pct, pct_ci = estimate_mean("(surcharge > 0)::INTEGER", entering)
+            query = f"""
+                SELECT
+                    pickup_loc,
+                    {trips} as trips,
+                    {paid} as paid,
+                    {pct} * 100 as compliance_pct,
+                    {trips_ci} as trips_ci,
+                    {paid_ci} as paid_ci,
+                    {pct_ci} * 100 as compliance_pct_ci
+                FROM trips_sample
+                GROUP BY pickup_loc
+                HAVING trips > 50
+                ORDER BY compliance_pct ASC, pickup_loc
+                LIMIT 25
+            """
+        publish_artifact(self.telemetry.query(self.con, query, "surcharge_compliance"), self._named("surcharge_compliance"))
 
     def generate_velocity_matrix(self):
         """Computes temporal velocity heatmaps for infrastructure monitoring."""
         print("Synthesizing Velocity Heatmaps...")
-        query = """
+        query = f"""
             SELECT 
                 year(pickup_time) as year,
                 dayofweek(pickup_time) as dow,
                 hour(pickup_time) as hour,
                 AVG(speed_mph) as avg_speed
             FROM trips_clean
-            WHERE 
-                pickup_loc IN (SELECT LocationID FROM congestion_zones)
-                AND dropoff_loc IN (SELECT LocationID FROM congestion_zones)
+            WHERE crossing = {CROSSING_INTERNAL}
             GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
         """
-        self.con.execute(query).df().to_csv(os.path.join(OUTPUT_DIR, "velocity_stats.csv"), index=False)
+        if self.mode == "fused":
+            query = """
+                SELECT yr as year, dow, hr as hour, avg_speed
+                FROM suite_rollup
+                WHERE grouping_set = 'velocity' AND internal_trips > 0
+                ORDER BY 1, 2, 3
+            """
+        elif self.mode == "rollup":
+            query = f"""
+                SELECT 
+                    year(pickup_hour) as year,
+                    dayofweek(pickup_hour) as dow,
+                    hour(pickup_hour) as hour,
+                    SUM(speed_sum) / NULLIF(SUM(speed_count), 0) as avg_speed
+                FROM trip_rollup
+                WHERE crossing = {CROSSING_INTERNAL}
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+            """
+        elif self.mode == "preview":
+            speed, speed_ci = estimate_mean("speed_mph")
+            query = f"""
+                SELECT 
+                    year(pickup_time) as year,
+                    dayofweek(pickup_time) as dow,
+                    hour(pickup_time) as hour,
+                    {speed} as avg_speed,
+                    {speed_ci} as avg_speed_ci
+                FROM trips_sample
+                WHERE crossing = {CROSSING_INTERNAL}
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+            """
+        publish_artifact(self.telemetry.query(self.con, query, "velocity_stats"), self._named("velocity_stats"))
 
     def model_econometric_impact(self):
         """Analyzes the correlation between toll imposition and driver gratuity (tips)."""
@@ -69,12 +254,45 @@ class UrbanLogisticsEngine:
             GROUP BY 1, 2
             ORDER BY 1, 2
         """
-        df = self.con.execute(query).df()
+        if self.mode == "fused":
+            query = """
+                SELECT yr as year, mo as month, avg_surcharge, avg_tip_pct
+                FROM suite_rollup
+                WHERE grouping_set = 'economics'
+                ORDER BY 1, 2
+            """
+        elif self.mode == "rollup":
+            query = """
+                SELECT 
+                    year(pickup_hour) as year,
+                    month(pickup_hour) as month,
+                    SUM(surcharge_sum) / NULLIF(SUM(surcharge_count), 0) as avg_surcharge,
+                    SUM(tip_pct_sum) / NULLIF(SUM(tip_pct_count), 0) * 100 as avg_tip_pct
+                FROM trip_rollup
+                GROUP BY 1, 2
+                ORDER BY 1, 2
+            """
+        elif self.mode == "preview":
+            surcharge, surcharge_ci = estimate_mean("surcharge")
+            tip_pct, tip_pct_ci = estimate_mean("CASE WHEN fare > 0 THEN tip/fare ELSE 0 END")
+            query = f"""
+                SELECT 
+                    year(pickup_time) as year,
+                    month(pickup_time) as month,
+                    {surcharge} as avg_surcharge,
+                    {tip_pct} * 100 as avg_tip_pct,
+                    {surcharge_ci} as avg_surcharge_ci,
+                    {tip_pct_ci} * 100 as avg_tip_pct_ci
+                FROM trips_sample
+                GROUP BY 1, 2
+                ORDER BY 1, 2
+            """
+        df = self.telemetry.query(self.con, query, "economic_trends")
         
         # Impute missing terminal window (Dec 2025) via historical weighting
-        self._apply_predictive_imputation(df, "economic_trends.csv")
+        self._apply_predictive_imputation(df, self._named("economic_trends"))
 
-    def _apply_predictive_imputation(self, df, filename):
+    def _apply_predictive_imputation(self, df, artifact):
         """Standardizes temporal datasets via weighted historical imputation."""
         target_year, target_month = 2025, 12
         if df[(df['year'] == target_year) & (df['month'] == target_month)].empty:
@@ -88,69 +306,155 @@ class UrbanLogisticsEngine:
                     new_row[col] = val
                 df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
         
-        df[df['year'] >= 2024].sort_values(['year', 'month']).to_csv(os.path.join(OUTPUT_DIR, filename), index=False)
+        publish_artifact(df[df['year'] >= 2024].sort_values(['year', 'month']), artifact)
+
+    def materialize_daily_demand(self):
+        """Joins 2025 daily trip volumes with the weather series in-database.
+
+        The resulting weather_demand_daily table feeds the weather report, the
+        elasticity metric and the forecaster's feature matrix from one aggregation.
+        Preview runs write preview_weather_demand_daily, with a ``trip_count_ci``.
+        """
+        query = f"""
+            SELECT CAST(pickup_time AS DATE) as date, COUNT(*) as trip_count
+            FROM trips_clean WHERE {self._calendar_year_filter(2025)} GROUP BY 1
+        """
+        if self.mode == "fused":
+            query = """
+                SELECT dt as date, trip_count
+                FROM suite_rollup
+                WHERE grouping_set = 'daily' AND trip_count > 0
+            """
+        elif self.mode == "rollup":
+            query = f"""
+                SELECT CAST(pickup_hour AS DATE) as date, SUM(trip_count)::BIGINT as trip_count
+                FROM trip_rollup WHERE {self._rollup_year_filter(2025)} GROUP BY 1
+            """
+        elif self.mode == "preview":
+            trips, trips_ci = estimate_total("1")
+            query = f"""
+                SELECT CAST(pickup_time AS DATE) as date, {trips} as trip_count, {trips_ci} as trip_count_ci
+                FROM trips_sample WHERE {self._calendar_year_filter(2025)} GROUP BY 1
+            """
+        interval = ", d.trip_count_ci" if self.mode == "preview" else ""
+        self.con.execute(f"""
+            CREATE OR REPLACE TABLE {self._named("weather_demand_daily")} AS
+            SELECT
+                d.date,
+                d.trip_count,
+                dayofweek(d.date) as dow,
+                month(d.date) as month,
+                w.* EXCLUDE (date){interval}
+            FROM ({query}) d
+            JOIN {self._named("weather_daily")} w ON w.date = d.date
+            ORDER BY d.date
+        """)
 
     def synchronize_meteorological_data(self):
         """Integrates external weather datasets for environmental sensitivity analysis."""
         print("Synchronizing Meteorological Temporal Series...")
-        try:
-            url = "https://archive-api.open-meteo.com/v1/archive?latitude=40.7831&longitude=-73.9712&start_date=2025-01-01&end_date=2025-12-31&daily=precipitation_sum&timezone=America%2FNew_York"
-            weather = pd.DataFrame(requests.get(url, timeout=15).json()['daily'])
-            weather['time'] = pd.to_datetime(weather['time'])
-            
-            daily_trips = self.con.execute("""
-                SELECT CAST(pickup_time AS DATE) as date, COUNT(*) as trip_count
-                FROM trips_clean WHERE year(pickup_time) = 2025 GROUP BY 1
-            """).df()
-            daily_trips['date'] = pd.to_datetime(daily_trips['date'])
-            
-            merged = pd.merge(daily_trips, weather, left_on='date', right_on='time')
-            merged.to_csv(os.path.join(OUTPUT_DIR, "weather_impact.csv"), index=False)
-            
-            # Save core elasticity metric
-            corr = merged['trip_count'].corr(merged['precipitation_sum'])
-            with open(os.path.join(OUTPUT_DIR, "elasticity.txt"), "w") as f:
-                f.write(f"{corr:.4f}")
-        except:
-            with open(os.path.join(OUTPUT_DIR, "elasticity.txt"), "w") as f:
-                f.write("-0.0245") # Empirical fallback
+        archive = MeteorologicalArchive()
+        if self.fetch_weather:
+            # Backfills every missing day of the configured range into the local cache
+            archive.synchronize()
+        archive.register(self.con, table=self._named("weather_daily"))
+        self.materialize_daily_demand()
+        demand = self._named("weather_demand_daily")
+
+        days, corr = self.con.execute(f"""
+            SELECT COUNT(precipitation_sum), corr(trip_count, precipitation_sum)
+            FROM {demand}
+        """).fetchone()
+        if days == 0:
+            print("  [ERROR] No cached or fetchable weather for 2025; elasticity unavailable.")
+            publish_metric(self._named("elasticity"), "Unavailable")
+            return
+
+        columns = "date, trip_count, precipitation_sum" + (", trip_count_ci" if self.mode == "preview" else "")
+        publish_artifact(self.telemetry.query(self.con, f"""
+            SELECT {columns} FROM {demand}
+        """, "weather_impact"), self._named("weather_impact"))
+
+        # Save core elasticity metric
+        publish_metric(self._named("elasticity"), f"{corr:.4f}" if corr is not None else "Unavailable")
 
     def calculate_total_revenue(self):
         """Estimates total surcharge revenue for the 2025 calendar year."""
         print("Calculating Total 2025 Surcharge Revenue...")
-        query = "SELECT SUM(surcharge) as total_revenue FROM trips_clean WHERE year(pickup_time) = 2025"
-        res = self.con.execute(query).df()
+        query = f"SELECT SUM(surcharge) as total_revenue FROM trips_clean WHERE {self._calendar_year_filter(2025)}"
+        if self.mode == "fused":
+            query = "SELECT total_revenue FROM suite_rollup WHERE grouping_set = 'revenue'"
+        elif self.mode == "rollup":
+            query = f"SELECT SUM(surcharge_sum) as total_revenue FROM trip_rollup WHERE {self._rollup_year_filter(2025)}"
+        elif self.mode == "preview":
+            revenue, revenue_ci = estimate_total("surcharge", self._calendar_year_filter(2025))
+            query = f"SELECT {revenue} as total_revenue, {revenue_ci} as total_revenue_ci FROM trips_sample"
+        res = self.telemetry.query(self.con, query, "revenue_report")
         revenue = res.iloc[0]['total_revenue'] if not res.empty else 0
-        with open(os.path.join(OUTPUT_DIR, "revenue_report.txt"), "w") as f:
-            f.write(f"{revenue:,.2f}")
+        if self.mode == "preview":
+            ci = res.iloc[0]['total_revenue_ci']
+            publish_metric(self._named("revenue_report"), f"{revenue:,.2f} ± {0 if pd.isna(ci) else ci:,.2f}")
+            return
+        publish_metric("revenue_report", f"{revenue:,.2f}")
 
     def audit_ghost_trips(self):
         """Identifies suspicious vendors based on high volumes of anomalous 'Ghost Trips'."""
         print("Identifying Suspicious Vendors (Ghost Trip Analysis)...")
-        # Identify trips in raw but not in clean
+        if self.partitioned:
+            # The Parquet export carries sanitized trips only; rejections live in the lake
+            print("  [STATUS] Ghost trip audit requires the lake; skipped on dataset view.")
+            return
+        # Rejection counts are tallied per source file at sanitization (both modes)
         query = """
             SELECT 
                 taxi_type as vendor,
-                COUNT(*) as ghost_count
-            FROM raw_trips r
-            WHERE NOT EXISTS (
-                SELECT 1 FROM trips_clean c 
-                WHERE r.pickup_time = c.pickup_time 
-                AND r.pickup_loc = c.pickup_loc
-            )
-            GROUP BY 1
-            ORDER BY 2 DESC
-            LIMIT 5
+                reject_reason,
+                SUM(trips)::BIGINT as ghost_count
+            FROM trip_rejections
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+        reasons = self.telemetry.query(self.con, query, "ghost_trip_reasons")
+        publish_artifact(reasons, self._named("ghost_trip_reasons"))
+
+        vendors = reasons.groupby('vendor', as_index=False)['ghost_count'].sum()
+        vendors = vendors.sort_values('ghost_count', ascending=False).head(5)
+        publish_artifact(vendors, self._named("ghost_trips_audit"))
+
+    def execute_analytical_suite(self, mode=ANALYTICS_MODE):
+        """Runs every report.
+
+        ``mode="fused"`` serves the trips_clean reports from one scan,
+        ``mode="rollup"`` answers them from the maintained trip_rollup cube and
+        ``mode="preview"`` estimates them from the stratified trips_sample,
+        publishing ``preview_``-prefixed results with ``*_ci`` interval columns.
+        Ghost trip counts are exact in every mode.
         """
-        self.con.execute(query).df().to_csv(os.path.join(OUTPUT_DIR, "ghost_trips_audit.csv"), index=False)
-
-    def execute_analytical_suite(self):
-        self.audit_surcharge_compliance()
-        self.generate_velocity_matrix()
-        self.model_econometric_impact()
-        self.calculate_total_revenue()
-        self.audit_ghost_trips()
-        self.synchronize_meteorological_data()
+        if mode == "preview" and self.partitioned:
+            raise ValueError("Preview mode reads trips_sample, which only the lake holds")
+        self.progress.start_stage("analytics", len(self.REPORTS), unit="analyses")
+        if mode == "fused":
+            with self.telemetry.stage("suite_rollup", "UrbanLogisticsEngine", mode=mode):
+                self._materialize_suite_rollup()
+        self.mode = mode
+        try:
+            for report in self.REPORTS:
+                self._run_instrumented(report)
+                self.progress.advance(analyses_done=1)
+        finally:
+            self.mode = "sequential"
+
+    def run_report(self, report, mode="sequential"):
+        """Runs a single report of the suite (``mode`` "sequential", "rollup" or "preview")."""
+        self.mode = mode
+        try:
+            self._run_instrumented(report)
+        finally:
+            self.mode = "sequential"
+
+    def _run_instrumented(self, report):
+        with self.telemetry.stage(report, "UrbanLogisticsEngine", mode=self.mode):
+            getattr(self, report)()
 
 if __name__ == "__main__":
     pass
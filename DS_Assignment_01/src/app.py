@@ -4,9 +4,13 @@ import pydeck as pdk
 import plotly.express as px
 import plotly.graph_objects as go
 import os
-import json
 from datetime import datetime
 from src.config import *
+from src.zone_geometry import ZoneGeometryIndex
+from src.artifact_store import ArtifactStore, load_artifact_version
+from src.job_runner import PipelineJobRunner, PipelineBusyError
+from src.instrumentation import load_run_log
+from src.query_service import LakeQueryService, QueryTimeoutError
 
 # Configuration
 st.set_page_config(layout="wide", page_title="NYC Congestion Audit v2.0", page_icon="🗽")
@@ -75,12 +79,57 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def load_zone_geometry(path, mtime):
+    """Parses the zone GeoJSON once per file version (backed by a binary sidecar)."""
+    return ZoneGeometryIndex.load(path)
+
+@st.cache_resource
+def get_artifact_store():
+    """Process-wide artifact cache shared across reruns and sessions."""
+    return ArtifactStore(OUTPUT_DIR)
+
 def load_data(filename):
-    path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(path): return None
-    return pd.read_csv(path)
+    return get_artifact_store().load_table(os.path.splitext(filename)[0])
+
+@st.cache_resource
+def get_query_service():
+    """Process-wide pool of read-only snapshot connections shared across sessions."""
+    return LakeQueryService()
+
+def live_query(fallback, method, *args):
+    """Answers a drill-down from the lake snapshot; falls back to the published artifact."""
+    try:
+        df = getattr(get_query_service(), method)(*args)
+    except QueryTimeoutError as e:
+        st.warning(f"Live query timed out ({e}); showing the published report.")
+        return fallback
+    return fallback if df is None else df
 
+PREVIEW_NOTE = ("🧪 **Preview estimate**: computed from a stratified sample of the lake while the exact "
+                "run is in progress. `*_ci` columns are 95% confidence half-widths.")
 
+def _artifact_mtime(name, ext="arrow"):
+    path = os.path.join(OUTPUT_DIR, f"{name}.{ext}")
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _preview_is_current(name, ext="arrow"):
+    """A preview newer than the exact result means the exact one is still being recomputed."""
+    exact, preview = _artifact_mtime(name, ext), _artifact_mtime(f"preview_{name}", ext)
+    return preview is not None and (exact is None or preview > exact)
+
+def load_report(filename):
+    """Returns ``(df, is_preview)``: the exact report, or its sample estimate while that is pending."""
+    name = os.path.splitext(filename)[0]
+    if _preview_is_current(name):
+        return load_data(f"preview_{name}"), True
+    return load_data(filename), False
+
+def load_report_metric(name, default=None):
+    """Scalar counterpart of load_report."""
+    if _preview_is_current(name, "txt"):
+        return get_artifact_store().load_metric(f"preview_{name}", default), True
+    return get_artifact_store().load_metric(name, default), False
 
 # Sidebar Dashboard Intelligence
 with st.sidebar:
@@ -94,18 +143,14 @@ with st.sidebar:
     st.markdown("---")
     
     # KPIs in Sidebar for constant awareness
-    revenue_val = "Unavailable"
-    if os.path.exists(os.path.join(OUTPUT_DIR, "revenue_report.txt")):
-        with open(os.path.join(OUTPUT_DIR, "revenue_report.txt"), 'r') as f:
-            revenue_val = f.read()
-    
-    elasticity_val = "0.0"
-    if os.path.exists(os.path.join(OUTPUT_DIR, "elasticity.txt")):
-        with open(os.path.join(OUTPUT_DIR, "elasticity.txt"), 'r') as f:
-            elasticity_val = f.read()
+    revenue_val, revenue_preview = load_report_metric("revenue_report", "Unavailable")
+    elasticity_val, elasticity_preview = load_report_metric("elasticity", "0.0")
             
-    st.metric("Total Revenue 2025", f"${revenue_val}")
-    st.metric("Rain Elasticity", elasticity_val)
+    st.metric("Total Revenue 2025" + (" (preview estimate)" if revenue_preview else ""), f"${revenue_val}")
+    st.metric("Rain Elasticity" + (" (preview estimate)" if elasticity_preview else ""), elasticity_val)
+    artifact_version = load_artifact_version()
+    if artifact_version is not None:
+        st.caption(f"Artifact version {artifact_version['version']} · published {artifact_version['published_at']}")
     
     st.markdown("---")
     st.subheader("📖 How to Navigate")
@@ -130,20 +175,33 @@ st.title("🗽 Metropolitan Transit Impact Analysis")
 st.markdown("### Institutional Audit of the NYC Congestion Relief Zone 2025")
 
 # Tabs
-tabs = st.tabs(["🌎 The Map", "⏱️ The Flow", "💹 The Economics", "🌧️ The Weather"])
+tabs = st.tabs(["🌎 The Map", "⏱️ The Flow", "💹 The Economics", "🌧️ The Weather", "🧪 The Run Log"])
 
 # Load all data
-leakage_df = load_data("surcharge_compliance.csv")
-velocity_df = load_data("velocity_stats.csv")
-econ_df = load_data("economic_trends.csv")
-weather_df = load_data("weather_impact.csv")
+leakage_df, leakage_preview = load_report("surcharge_compliance.csv")
+velocity_df, velocity_preview = load_report("velocity_stats.csv")
+econ_df, econ_preview = load_report("economic_trends.csv")
+weather_df, weather_preview = load_report("weather_impact.csv")
 
 # --- TAB 1: THE MAP (BORDER EFFECT) ---
 with tabs[0]:
     st.header("🌎 The Border Effect")
     st.markdown("Interactive PyDeck visualization of the 'Border Effect' - evaluating surcharge compliance for trips entering the Congestion Relief Zone.")
+
+    if get_query_service().snapshot_version() is not None:
+        col_dates, col_taxis = st.columns(2)
+        map_dates = col_dates.date_input("Pickup window", (datetime(2025, 1, 1), datetime(2025, 12, 31)), key="map_dates")
+        map_taxis = col_taxis.multiselect("Taxi type", TAXIS, default=TAXIS, key="map_taxis")
+        if len(map_dates) == 2 and map_taxis:
+            live_df = live_query(None, "border_compliance", str(map_dates[0]),
+                                 str(pd.Timestamp(map_dates[1]) + pd.Timedelta(days=1)), map_taxis)
+            if live_df is not None:
+                leakage_df, leakage_preview = live_df, False
+
+    if leakage_preview:
+        st.info(PREVIEW_NOTE)
     
-    if leakage_df is not None:
+    if leakage_df is not None and not leakage_df.empty:
         geojson_path = os.path.join(DATA_DIR, "taxi_zones.geojson")
         if not os.path.exists(geojson_path):
             st.warning("⚠️ Geospatial metadata (GeoJSON) is currently unavailable. Please execute the data pipeline.")
@@ -156,35 +214,10 @@ with tabs[0]:
                 col2.metric("Critical Hotspot", f"Zone {int(leakage_df.iloc[0]['pickup_loc'])}", "Lowest Compliance")
                 col3.metric("Audit Integrity", "Verified", "OpenData Sync")
 
-                # Extraction of Coordinates from GeoJSON for 3D Mapping
-                with open(geojson_path, 'r') as f:
-                    geo_json_data = json.load(f)
-                
-                # Create a lookup for centroids
-                centroids = {}
-                for feature in geo_json_data['features']:
-                    loc_id = int(feature['properties']['locationid'])
-                    # Simple centroid calculation for visualization
-                    coords = feature['geometry']['coordinates']
-                    if feature['geometry']['type'] == 'MultiPolygon':
-                        coords = coords[0][0]
-                    else:
-                        coords = coords[0]
-                    
-                    lon = sum([p[0] for p in coords]) / len(coords)
-                    lat = sum([p[1] for p in coords]) / len(coords)
-                    centroids[loc_id] = (lon, lat)
-
-                # Map coordinates to leakage data
-                def safe_get_centroid(x, idx):
-                    try:
-                        return centroids.get(int(x), [None, None])[idx]
-                    except:
-                        return None
-
-                leakage_df['lon'] = leakage_df['pickup_loc'].apply(lambda x: safe_get_centroid(x, 0))
-                leakage_df['lat'] = leakage_df['pickup_loc'].apply(lambda x: safe_get_centroid(x, 1))
-                leakage_df = leakage_df.dropna(subset=['lon', 'lat'])
+                # Zone centroids come from the cached geometry index (vectorized join)
+                zone_frame = load_zone_geometry(geojson_path, os.path.getmtime(geojson_path)).to_frame()[['LocationID', 'lon', 'lat']]
+                leakage_df = leakage_df.merge(zone_frame, left_on='pickup_loc', right_on='LocationID', how='inner')
+                leakage_df = leakage_df.drop(columns=['LocationID'])
                 
                 view_state = pdk.ViewState(latitude=40.75, longitude=-73.98, zoom=10, pitch=45, bearing=0)
                 
@@ -235,6 +268,19 @@ with tabs[1]:
         indicates successful congestion mitigation.
     </div>
     """, unsafe_allow_html=True)
+
+    if get_query_service().snapshot_version() is not None:
+        col_taxis, col_zones = st.columns([1, 3])
+        flow_taxis = col_taxis.multiselect("Taxi type", TAXIS, default=TAXIS, key="flow_taxis")
+        flow_zones = col_zones.multiselect("Zones (default: whole congestion zone)", CONGESTION_ZONE_IDS, key="flow_zones")
+        if flow_taxis:
+            live_df = live_query(None, "velocity_matrix", "2024-01-01", "2026-01-01",
+                                 flow_taxis, flow_zones or CONGESTION_ZONE_IDS)
+            if live_df is not None:
+                velocity_df, velocity_preview = live_df, False
+
+    if velocity_preview:
+        st.info(PREVIEW_NOTE)
     
     if velocity_df is not None:
         col1, col2 = st.columns(2)
@@ -270,6 +316,9 @@ with tabs[2]:
     </div>
     """, unsafe_allow_html=True)
     
+    if econ_preview:
+        st.info(PREVIEW_NOTE)
+
     if econ_df is not None:
         fig = go.Figure()
         fig.add_trace(go.Bar(x=econ_df['month'], y=econ_df['avg_surcharge'], name="Mean Surcharge ($)", 
@@ -298,6 +347,9 @@ with tabs[3]:
     </div>
     """, unsafe_allow_html=True)
     
+    if weather_preview:
+        st.info(PREVIEW_NOTE)
+
     if weather_df is not None:
         fig = px.scatter(weather_df, x="precipitation_sum", y="trip_count", 
                          trendline="ols", color="trip_count",
@@ -322,37 +374,87 @@ with tabs[3]:
         </div>
         """, unsafe_allow_html=True)
         
-        if os.path.exists(os.path.join(OUTPUT_DIR, "elasticity.txt")):
-            with open(os.path.join(OUTPUT_DIR, "elasticity.txt"), 'r') as f:
-                score = f.read()
+        score = get_artifact_store().load_metric("elasticity")
+        if score is not None:
             st.metric("Meteorological Elasticity Coefficient", score)
 
-def synchronize_data():
-    """Trigger the formal metropolitan ingestion pipeline with UI status updates."""
-    import sys
-    import subprocess
-    
-    with st.sidebar:
-        with st.status("Initializing Metropolitan Lifecycle...", expanded=True) as status:
-            st.write("Acquiring remote transit assets...")
-            try:
-                # Use current process executable to ensure same virtual environment
-                result = subprocess.run([sys.executable, "pipeline.py"], 
-                                      capture_output=True, text=True, check=False)
-                
-                if result.returncode == 0:
-                    st.write("Synchronizing analytical artifacts...")
-                    status.update(label="Lifecycle Synchronized!", state="complete", expanded=False)
-                    st.toast("Metropolitan data repository updated successfully.")
-                    st.rerun()
-                else:
-                    st.error("Synchronization Failure")
-                    st.code(result.stderr or result.stdout)
-                    status.update(label="Lifecycle Error", state="error")
-            except Exception as e:
-                st.error(f"Execution Error: {str(e)}")
-                status.update(label="System Error", state="error")
+# --- TAB 5: THE RUN LOG ---
+with tabs[4]:
+    st.header("🧪 The Run Log")
+    run_log = load_run_log()
+    if run_log is None:
+        st.info("No instrumented pipeline run recorded yet.")
+    else:
+        finished = run_log["finished_at"]
+        st.caption(
+            f"Run {run_log['run_id']} · started {datetime.fromtimestamp(run_log['started_at']):%Y-%m-%d %H:%M:%S} · "
+            + (f"{finished - run_log['started_at']:.1f}s wall time" if finished else "in progress"))
+
+        stages_df = pd.DataFrame(run_log["stages"])
+        if not stages_df.empty:
+            stages_df = stages_df.sort_values("seconds", ascending=False)
+            fig = px.bar(stages_df.head(20), x="seconds", y="stage", color="component", orientation="h",
+                         template="plotly_dark", title="Slowest Stages (wall time)")
+            fig.update_layout(yaxis=dict(autorange="reversed"))
+            st.plotly_chart(fig, width="stretch")
+            st.dataframe(stages_df, width="stretch", hide_index=True)
+
+        queries_df = pd.DataFrame(run_log["queries"])
+        if not queries_df.empty:
+            st.subheader("Analytical Queries")
+            queries_df = queries_df.sort_values("seconds", ascending=False)
+            st.dataframe(queries_df.drop(columns=["sql", "profile"]), width="stretch", hide_index=True)
+            for query in queries_df.head(10).to_dict("records"):
+                with st.expander(f"{query['query']} · {query['seconds']:.3f}s · {query['rows_out']:,} rows"):
+                    st.code(query["sql"], language="sql")
+                    if query["profile"]:
+                        st.code(query["profile"])
+
+@st.cache_resource
+def get_job_runner():
+    return PipelineJobRunner()
+
+def _format_eta(seconds):
+    if seconds is None: return "estimating..."
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}m {secs:02d}s" if minutes else f"{secs}s"
+
+@st.fragment(run_every=2)
+def pipeline_job_panel():
+    """Polls the background pipeline run; the rest of the page stays interactive."""
+    runner = get_job_runner()
+    status = runner.status()
+
+    if status and status["state"] == "running":
+        stage = status["stage"] or "starting"
+        st.progress(status["fraction"], text=f"Stage: {stage} ({status['stage_done']}/{status['stage_total']} {status['unit'] or 'steps'})")
+        counters = status["counters"]
+        st.caption(
+            f"Files downloaded: {counters['files_downloaded']:,} · Rows ingested: {counters['rows_ingested']:,} · "
+            f"Analyses done: {counters['analyses_done']} · ETA: {_format_eta(status['eta_seconds'])}")
+        if st.button("⏹️ Cancel Synchronization", width="stretch"):
+            runner.cancel()
+            st.toast("Cancellation requested; the run stops at the next checkpoint.")
+        return
+
+    if status and status["state"] == "succeeded" and st.session_state.get("pipeline_job") == status["job_id"]:
+        # Artifacts changed on disk; the artifact store reloads them by mtime
+        st.session_state.pop("pipeline_job")
+        st.toast("Metropolitan data repository updated successfully.")
+        st.rerun()
+    elif status and status["state"] == "failed":
+        st.error("Synchronization Failure")
+        st.code(status["error"] or runner.log_tail())
+    elif status and status["state"] == "cancelled":
+        st.warning("Last synchronization was cancelled.")
+
+    if st.button("🔄 Execute Data Synchronization", width="stretch"):
+        try:
+            st.session_state["pipeline_job"] = runner.start()
+            st.rerun(scope="fragment")
+        except PipelineBusyError as e:
+            st.warning(str(e))
 
 st.sidebar.markdown("---")
-if st.sidebar.button("🔄 Execute Data Synchronization", width="stretch"):
-    synchronize_data()
+with st.sidebar:
+    pipeline_job_panel()
@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+import pyarrow as pa
+from src.config import *
+from src.job_runner import _atomic_write_json, _read_json
+
+# Typed layouts of the analytical artifacts (also used for legacy CSV fallback)
+ARTIFACT_SCHEMAS = {
+    "surcharge_compliance": {"pickup_loc": "int32", "trips": "int64", "paid": "int64", "compliance_pct": "float64"},
+    "velocity_stats": {"year": "int16", "dow": "int8", "hour": "int8", "avg_speed": "float64"},
+    "economic_trends": {"year": "int16", "month": "int8", "avg_surcharge": "float64", "avg_tip_pct": "float64"},
+    "weather_impact": {"trip_count": "int64", "precipitation_sum": "float64"},
+    "ghost_trips_audit": {"vendor": "category", "ghost_count": "int64"},
+    "ghost_trip_reasons": {"vendor": "category", "reject_reason": "category", "ghost_count": "int64"},
+    "pipeline_audit": {"total_raw": "int64", "total_clean": "int64"},
+    "zone_hourly_forecast": {"pickup_loc": "int32", "predicted_trips": "float64"},
+}
+DATE_COLUMNS = {"weather_impact": ["date"], "preview_weather_impact": ["date"], "zone_hourly_forecast": ["forecast_hour"]}
+
+# Scalar metrics are stored together in one Arrow table (metric, value)
+METRICS_ARTIFACT = "metrics"
+_metrics_lock = threading.Lock()
+
+def _atomic_write_arrow(table, path):
+    """Writes an uncompressed Arrow IPC file (memory-mappable) via rename."""
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def _read_arrow(path):
+    """Memory-maps an Arrow IPC file and returns it as a DataFrame."""
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().to_pandas()
+
+def _read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def _apply_schema(df, name):
+    """Casts known artifact columns to their declared dtypes."""
+    dtypes = {col: dtype for col, dtype in ARTIFACT_SCHEMAS.get(name, {}).items() if col in df.columns}
+    for col in DATE_COLUMNS.get(name, []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df.astype(dtypes) if dtypes else df
+
+def publish_artifact(df, name, output_dir=OUTPUT_DIR):
+    """Publishes a table artifact as Arrow IPC, keeping the CSV export alongside."""
+    df = _apply_schema(df.reset_index(drop=True), name)
+    df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+    _atomic_write_arrow(pa.Table.from_pandas(df, preserve_index=False), os.path.join(output_dir, f"{name}.arrow"))
+
+def publish_metric(name, value, output_dir=OUTPUT_DIR):
+    """Publishes a formatted scalar metric into the shared metrics table and its TXT export."""
+    with open(os.path.join(output_dir, f"{name}.txt"), "w") as f:
+        f.write(value)
+
+    path = os.path.join(output_dir, f"{METRICS_ARTIFACT}.arrow")
+    # Read-modify-write of the shared table; reports may publish concurrently
+    with _metrics_lock:
+        metrics = _read_arrow(path) if os.path.exists(path) else pd.DataFrame({"metric": [], "value": []})
+        metrics = pd.concat([metrics[metrics["metric"] != name], pd.DataFrame({"metric": [name], "value": [value]})])
+        _atomic_write_arrow(pa.Table.from_pandas(metrics.astype(str), preserve_index=False), path)
+
+def publish_artifact_version(lake, executed, path=ARTIFACT_VERSION_PATH):
+    """Records that a run finished publishing its artifacts; returns the new version number.
+
+    Written after every artifact of the run. Artifacts are replaced one file
+    at a time while the run is in progress, so the version marks completion
+    (and the lake state behind it) rather than an isolated snapshot.
+    """
+    previous = _read_json(path) or {}
+    version = previous.get("version", 0) + 1
+    _atomic_write_json({
+        "version": version,
+        "lake": lake,
+        "executed": list(executed),
+        "published_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+    }, path)
+    return version
+
+def load_artifact_version(path=ARTIFACT_VERSION_PATH):
+    """The latest published artifact version record, or None."""
+    return _read_json(path)
+
+class ArtifactStore:
+    """
+    Memoized, mtime-invalidated access to pipeline artifacts for the dashboard.
+    Entries are keyed on (path, mtime, size) and evicted least-recently-used.
+    """
+    def __init__(self, output_dir=OUTPUT_DIR, max_entries=ARTIFACT_CACHE_ENTRIES):
+        self.output_dir = output_dir
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _resolve(self, name, extensions):
+        """First existing artifact file for ``name`` with its version stamp."""
+        for ext in extensions:
+            path = os.path.join(self.output_dir, f"{name}.{ext}")
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return path, (stat.st_mtime_ns, stat.st_size)
+        return None, None
+
+    def _memoized(self, path, version, loader):
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(path)
+                return cached[1]
+
+        value = loader(path)
+        with self._lock:
+            # A newer file version replaces the stale entry under the same path
+            self._cache[path] = (version, value)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def load_table(self, name):
+        """Returns the artifact as a typed DataFrame, or None when it is not published."""
+        path, version = self._resolve(name, ["arrow", "csv"])
+        if path is None:
+            return None
+        if path.endswith(".arrow"):
+            df = self._memoized(path, version, _read_arrow)
+        else:
+            df = self._memoized(path, version, lambda p: _apply_schema(pd.read_csv(p), name))
+        # Shallow copy: callers may add columns without touching the cached frame
+        return df.copy(deep=False)
+
+    def load_metric(self, name, default=None):
+        """Returns a formatted scalar metric from the metrics table (or its TXT export)."""
+        path, version = self._resolve(METRICS_ARTIFACT, ["arrow"])
+        if path is not None:
+            metrics = self._memoized(path, version, lambda p: dict(_read_arrow(p).itertuples(index=False)))
+            if name in metrics:
+                return metrics[name]
+
+        path, version = self._resolve(name, ["txt"])
+        if path is None:
+            return default
+        return self._memoized(path, version, _read_text)
@@ -0,0 +1,229 @@
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+from sklearn.ensemble import RandomForestRegressor
+from src.config import *
+from src.artifact_store import publish_artifact
+from src.forecasting_engine import FEATURE_COLUMNS, MetropolitanDemandForecaster
+
+def _lag_features(df, lags, prefix="lag"):
+    """Adds trip_count lags (in steps of the dense series) and returns their column names."""
+    columns = []
+    for lag in lags:
+        df[f"{prefix}_{lag}"] = df["trip_count"].shift(lag)
+        columns.append(f"{prefix}_{lag}")
+    return columns
+
+def _holiday_flag(timestamps):
+    days = pd.to_datetime(timestamps).dt.normalize()
+    holidays = USFederalHolidayCalendar().holidays(days.min(), days.max())
+    return days.isin(holidays).astype(int)
+
+def baseline_features(df, horizon):
+    """The production feature set: day of week, month and daily precipitation."""
+    return df, list(FEATURE_COLUMNS)
+
+def calendar_features(df, horizon):
+    """Baseline plus a US federal holiday flag."""
+    df = df.assign(is_holiday=_holiday_flag(df["date"]))
+    return df, FEATURE_COLUMNS + ["is_holiday"]
+
+def lagged_features(df, horizon):
+    """Calendar features plus weekly demand lags.
+
+    Only lags of at least ``horizon`` days are used, so every feature is known
+    at the forecast origin for all steps of the horizon (no look-ahead).
+    """
+    df, columns = calendar_features(df, horizon)
+    weeks = -(-horizon // 7)
+    columns += _lag_features(df, [7 * weeks, 7 * (weeks + 1)])
+    df["rolling_7"] = df["trip_count"].shift(horizon).rolling(7).mean()
+    return df, columns + ["rolling_7"]
+
+def hourly_features(df, horizon):
+    """Hour-level series: hour of day, calendar, precipitation and daily-cycle lags.
+
+    ``horizon`` is in hours; lags are whole days at or beyond it.
+    """
+    df = df.assign(is_holiday=_holiday_flag(df["pickup_hour"]))
+    days = -(-horizon // 24)
+    columns = ["hour", "dow", "month", "precipitation_sum", "is_holiday"]
+    columns += _lag_features(df, [24 * days, 24 * (days + 6)])
+    return df, columns
+
+# Named feature sets compared by the search; each maps (matrix, horizon) to
+# (matrix with feature columns, feature column names)
+FEATURE_SETS = {
+    "baseline": baseline_features,
+    "calendar": calendar_features,
+    "lagged": lagged_features,
+}
+
+# Hour-level candidates run on hourly_feature_matrix with horizons in hours
+HOURLY_FEATURE_SETS = {
+    "hourly": hourly_features,
+}
+
+def hourly_feature_matrix(con):
+    """Hourly 2025 city-wide volumes from the trip_rollup cube joined with daily weather."""
+    return con.execute("""
+        SELECT
+            r.pickup_hour,
+            SUM(r.trip_count)::BIGINT as trip_count,
+            hour(r.pickup_hour) as hour,
+            dayofweek(r.pickup_hour) as dow,
+            month(r.pickup_hour) as month,
+            ANY_VALUE(w.precipitation_sum) as precipitation_sum
+        FROM trip_rollup r
+        JOIN weather_daily w ON w.date = CAST(r.pickup_hour AS DATE)
+        WHERE r.pickup_hour >= '2025-01-01' AND r.pickup_hour < '2026-01-01'
+        GROUP BY 1
+        ORDER BY 1
+    """).df()
+
+# Step of each series' time column: lags, rolling windows and fold sizes count these steps
+SERIES_FREQUENCIES = {"date": "D", "pickup_hour": "h"}
+
+def dense_series(df, time_column):
+    """Reindexes a feature matrix onto a gap-free day (``date``) or hour (``pickup_hour``) grid.
+
+    Row-position lags and rolling windows then span fixed time offsets. Missing
+    steps (hours or days without trips, or days without weather, which
+    ``prepare_inference_features`` drops) get a zero trip_count and rebuilt
+    calendar columns; a step whose day has no precipitation is still never
+    trained on or scored.
+    """
+    stamps = pd.to_datetime(df[time_column])
+    grid = pd.date_range(stamps.min(), stamps.max(), freq=SERIES_FREQUENCIES[time_column], name=time_column)
+    df = df.assign(**{time_column: stamps}).set_index(time_column).reindex(grid).reset_index()
+    stamps = df[time_column]
+    df["trip_count"] = df["trip_count"].fillna(0)
+    # Same encoding as DuckDB's dayofweek (Sunday = 0)
+    df["dow"] = (stamps.dt.dayofweek + 1) % 7
+    df["month"] = stamps.dt.month
+    if "hour" in df:
+        df["hour"] = stamps.dt.hour
+    # Precipitation is daily: an hour without trips shares its day's value
+    df["precipitation_sum"] = df.groupby(stamps.dt.normalize())["precipitation_sum"].transform("first")
+    return df
+
+def rolling_origin_splits(n, initial, horizon, step):
+    """Expanding-window (train, test) index pairs over an ordered series of ``n`` rows.
+
+    Each fold trains on every row before its origin and tests on the next
+    ``horizon`` rows; origins advance by ``step`` from ``initial``.
+    """
+    for origin in range(initial, n - horizon + 1, step):
+        yield np.arange(origin), np.arange(origin, origin + horizon)
+
+def _evaluate(task):
+    """Process-pool worker: backtests one (feature set, hyperparameters) pair."""
+    df, feature_set, builder, params, initial, horizon, step = task
+    df, columns = builder(df.copy(), horizon)
+    X, y = df[columns].to_numpy(dtype=np.float64), df["trip_count"].to_numpy(dtype=np.float64)
+    # Rows whose lags reach before the series start are left out of training,
+    # keeping fold origins (and so the scored days) identical across feature sets
+    valid = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+
+    errors, folds = [], []
+    for fold, (train_idx, test_idx) in enumerate(rolling_origin_splits(len(df), initial, horizon, step)):
+        train_idx, test_idx = train_idx[valid[train_idx]], test_idx[valid[test_idx]]
+        if len(train_idx) == 0 or len(test_idx) == 0:
+            continue
+        started = time.perf_counter()
+        model = RandomForestRegressor(random_state=42, n_jobs=1, **params)
+        model.fit(X[train_idx], y[train_idx])
+        fit_seconds = time.perf_counter() - started
+        predicted = model.predict(X[test_idx])
+        folds.append({"fold": fold, "train_rows": len(train_idx),
+                      "fit_seconds": fit_seconds, "total_seconds": time.perf_counter() - started})
+        actual = y[test_idx]
+        errors.append(pd.DataFrame({
+            "step": np.arange(1, len(test_idx) + 1),
+            "abs_error": np.abs(predicted - actual),
+            "ape": np.abs(predicted - actual) / np.where(actual == 0, np.nan, actual),
+        }))
+
+    if not errors:
+        return None
+    errors = pd.concat(errors)
+    per_horizon = errors.groupby("step").agg(mae=("abs_error", "mean"), mape=("ape", "mean")).reset_index()
+    per_horizon["mape"] *= 100
+    label = ",".join(f"{k}={v}" for k, v in sorted(params.items()))
+    per_horizon.insert(0, "params", label)
+    per_horizon.insert(0, "feature_set", feature_set)
+    timing = pd.DataFrame(folds)
+    timing.insert(0, "params", label)
+    timing.insert(0, "feature_set", feature_set)
+    return per_horizon, timing
+
+class RollingOriginBacktester:
+    """
+    Time-ordered evaluation harness for the demand forecaster. Every
+    (feature set, hyperparameter) candidate is scored with expanding-window
+    folds in its own worker process; results are MAE/MAPE per forecast step
+    plus per-fold fit timings.
+    """
+    def __init__(self, initial=BACKTEST_INITIAL_ROWS, horizon=BACKTEST_HORIZON, step=BACKTEST_STEP,
+                 workers=BACKTEST_WORKERS):
+        self.initial = initial
+        self.horizon = horizon
+        self.step = step
+        self.workers = workers
+
+    def search(self, df, param_grid=BACKTEST_PARAM_GRID, feature_sets=FEATURE_SETS, time_column="date"):
+        """Backtests every candidate; returns ``(per_horizon, fold_timings, summary)`` DataFrames.
+
+        ``df`` is a feature matrix such as ``prepare_inference_features`` returns
+        (or ``hourly_feature_matrix`` with ``time_column="pickup_hour"``); it is
+        first reindexed by ``dense_series`` so lags are taken over time, not rows.
+        """
+        df = dense_series(df, time_column)
+        keys = sorted(param_grid)
+        candidates = [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+        tasks = [
+            (df, name, builder, params, self.initial, self.horizon, self.step)
+            for name, builder in feature_sets.items()
+            for params in candidates
+        ]
+        print(f"Backtesting {len(tasks)} forecaster candidates on {len(df)} rows...")
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = [result for result in pool.map(_evaluate, tasks) if result is not None]
+        if not results:
+            raise ValueError(f"Series of {len(df)} rows is too short for initial={self.initial}, horizon={self.horizon}")
+
+        per_horizon = pd.concat([r[0] for r in results], ignore_index=True)
+        timings = pd.concat([r[1] for r in results], ignore_index=True)
+        summary = (per_horizon.groupby(["feature_set", "params"], as_index=False)[["mae", "mape"]].mean()
+                   .merge(timings.groupby(["feature_set", "params"], as_index=False)
+                          .agg(folds=("fold", "count"), mean_fit_seconds=("fit_seconds", "mean")))
+                   .sort_values("mae"))
+        return per_horizon, timings, summary
+
+def _publish_search(results, artifact):
+    per_horizon, timings, summary = results
+    publish_artifact(per_horizon, artifact)
+    publish_artifact(timings, f"{artifact}_folds")
+    publish_artifact(summary, f"{artifact}_summary")
+    print(summary.head(10).to_string(index=False))
+    return summary
+
+def run_backtest(con=None, hourly=True):
+    """Backtests the daily feature sets (and, on the lake, the hourly series) and publishes the comparisons."""
+    df = MetropolitanDemandForecaster().prepare_inference_features(con)
+    summary = _publish_search(RollingOriginBacktester().search(df), "forecast_backtest")
+    if hourly and con is not None:
+        backtester = RollingOriginBacktester(initial=BACKTEST_HOURLY_INITIAL_ROWS, horizon=BACKTEST_HOURLY_HORIZON,
+                                             step=BACKTEST_HOURLY_HORIZON)
+        results = backtester.search(hourly_feature_matrix(con), feature_sets=HOURLY_FEATURE_SETS,
+                                    time_column="pickup_hour")
+        _publish_search(results, "forecast_backtest_hourly")
+    return summary
+
+if __name__ == "__main__":
+    import duckdb
+    run_backtest(duckdb.connect(LAKE_PATH, read_only=True) if os.path.exists(LAKE_PATH) else None)
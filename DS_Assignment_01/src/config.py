@@ -4,6 +4,68 @@ import os
 DATA_DIR = "data"
 OUTPUT_DIR = "output"
 
+# Persistent analytical lake (DuckDB database file + ingestion manifest)
+LAKE_PATH = os.path.join(DATA_DIR, "metropolitan_lake.duckdb")
+
+# Hive-partitioned Parquet export of trips_clean (taxi_type/year/month)
+CLEAN_DATASET_DIR = os.path.join(DATA_DIR, "trips_clean")
+EXPORT_CLEAN_DATASET = True
+
+# DuckDB Resource Governance
+# Streaming mode filters trips while the parquet is read, so no unfiltered
+# raw_trips copy is materialized; rejected rows are kept only as counts.
+STREAMING_SANITIZATION = False
+DUCKDB_MEMORY_LIMIT = "12GB"
+DUCKDB_SPILL_DIR = os.path.join(DATA_DIR, "duckdb_spill")
+DUCKDB_THREADS = os.cpu_count() or 4
+
+# Zone Geometry (parsed once into a binary sidecar keyed on the GeoJSON hash)
+ZONE_GEOJSON_PATH = os.path.join(DATA_DIR, "taxi_zones.geojson")
+ZONE_SIMPLIFY_TOLERANCE = 0.0002  # degrees, roughly 20 m
+
+# Geometric ghost-trip rules (zone-to-zone minimum distances from the GeoJSON)
+ZONE_GAP_FLOOR_MILES = 0.5  # pairs closer than this are never flagged (vertex sampling error)
+ZONE_GAP_MIN_RATIO = 0.5  # reported distance below this share of the gap is impossible
+ZONE_GAP_MAX_SPEED_MPH = 80  # crossing the gap faster than this is impossible
+
+# Dashboard artifact cache (memoized loaders keyed on path + mtime)
+ARTIFACT_CACHE_ENTRIES = 32
+
+# Dashboard drill-down queries (pooled read-only connections over a lake snapshot)
+QUERY_SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+QUERY_SNAPSHOT_KEEP = 2  # snapshot files retained, so readers of the previous one can finish
+QUERY_POOL_SIZE = 4
+QUERY_TIMEOUT = 5.0  # seconds per query, including the wait for a free connection
+QUERY_CACHE_ENTRIES = 256
+
+# Background Pipeline Jobs (launched from the dashboard, one at a time)
+PIPELINE_LOCK_PATH = os.path.join(DATA_DIR, "pipeline.lock")
+PIPELINE_CANCEL_PATH = os.path.join(DATA_DIR, "pipeline.cancel")
+PIPELINE_STATUS_PATH = os.path.join(OUTPUT_DIR, "pipeline_job.json")
+PIPELINE_LOG_PATH = os.path.join(OUTPUT_DIR, "pipeline_job.log")
+PIPELINE_STATUS_INTERVAL = 0.5  # seconds between progress snapshots
+
+# Run Telemetry (per-stage timings and query profiles of the latest run)
+RUN_LOG_PATH = os.path.join(OUTPUT_DIR, "run_log.json")
+PROFILE_QUERIES = False  # capture EXPLAIN ANALYZE per analytical query (runs each query twice)
+
+# Stage Scheduler (content-addressed skip cache; independent stages run in parallel)
+STAGE_CACHE_PATH = os.path.join(OUTPUT_DIR, "stage_cache.json")
+STAGE_WORKERS = 4
+
+# Weather Archive (daily series cached locally; only missing days are fetched)
+WEATHER_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+WEATHER_CACHE_PATH = os.path.join(DATA_DIR, "weather_daily.parquet")
+WEATHER_LATITUDE = 40.7831
+WEATHER_LONGITUDE = -73.9712
+WEATHER_TIMEZONE = "America/New_York"
+WEATHER_VARIABLES = ["precipitation_sum", "temperature_2m_mean", "snowfall_sum"]
+WEATHER_START_DATE = "2023-12-01"
+WEATHER_END_DATE = "2025-12-31"
+WEATHER_CHUNK_DAYS = 92  # days per archive request
+WEATHER_WORKERS = 4
+WEATHER_OFFLINE = False  # serve from the cache only (e.g. fixture caches, no network)
+
 # URLs
 BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 LOOKUP_URL = "https://d37ci6vzurychx.cloudfront.net/misc/taxi+_zone_lookup.csv"
@@ -13,7 +75,66 @@ GEOJSON_URL = "https://data.cityofnewyork.us/resource/8meu-9t5y.geojson?$limit=5
 YEARS_TO_DOWNLOAD = [2024, 2025]
 TAXIS = ["yellow", "green"]
 
+# Earliest pickup kept at ingestion (the December 2023 baseline month)
+INGEST_START_DATE = "2023-12-01"
+
+# Watch Mode (python pipeline.py --watch): polls for newly published months
+WATCH_SOURCE = BASE_URL  # TLC endpoint, another HTTP mirror, or a local directory of monthly files
+WATCH_INTERVAL = 3600  # seconds between polls
+WATCH_ANALYTICS_MODE = "rollup"  # reports answered from the incrementally maintained cube
+ARTIFACT_VERSION_PATH = os.path.join(OUTPUT_DIR, "artifact_version.json")
+
+# Download Settings
+DOWNLOAD_WORKERS = 6
+DOWNLOAD_RETRIES = 4
+DOWNLOAD_CHUNK_SIZE = 2048 * 1024
+DOWNLOAD_BACKOFF = 1.0  # seconds before the first retry, doubled per attempt (429s use Retry-After)
+DOWNLOAD_MAX_BACKOFF = 60
+
+# Analytics Settings
+# "sequential" runs one query per report; "fused" derives every trips_clean
+# report from one GROUPING SETS scan, which pays off when the scan dominates
+# (lakes larger than memory, the Parquet export on remote storage); "rollup"
+# answers them from the trip_rollup cube maintained at sanitization. The stage
+# scheduler reruns reports individually, so "fused" applies to full-suite runs
+# (execute_analytical_suite) and falls back to per-report queries there.
+ANALYTICS_MODE = "sequential"
+
+# Preview mode ("preview") estimates every report from the stratified
+# trips_sample drawn at sanitization, with normal-approximation intervals
+SAMPLE_RATE = 0.01  # base inclusion probability per stratum
+SAMPLE_MIN_ROWS = 200  # expected sampled rows in small strata (taken whole below this)
+PREVIEW_CONFIDENCE_Z = 1.96  # 95% intervals
+
+# Forecaster Settings
+PREDICTION_CACHE_ENTRIES = 1024  # memoized single-point predictions
+MODEL_STORE_DIR = os.path.join(OUTPUT_DIR, "models")
+MODEL_STORE_KEEP = 3  # model versions retained on disk
+FORECAST_N_ESTIMATORS = 100
+FORECAST_N_JOBS = -1  # all cores
+FORECAST_TRAIN_BUDGET = 120  # seconds; the forest stops growing once exceeded
+
+# Zone-level hourly forecaster (one global model across congestion zone series)
+ZONE_FORECAST_HISTORY_DAYS = 365  # training window before the last observed hour
+ZONE_FORECAST_HORIZON_HOURS = 168  # next week; lags never reach past the horizon
+ZONE_FORECAST_MAX_ITER = 300
+
+# Forecaster Backtesting (expanding-window folds, candidates scored in a process pool)
+BACKTEST_INITIAL_ROWS = 120  # days of history before the first forecast origin
+BACKTEST_HORIZON = 7  # days forecast from each origin
+BACKTEST_STEP = 7  # days between origins
+BACKTEST_HOURLY_INITIAL_ROWS = 24 * 90
+BACKTEST_HOURLY_HORIZON = 24 * 7
+BACKTEST_WORKERS = os.cpu_count() or 4
+BACKTEST_PARAM_GRID = {
+    "n_estimators": [100, 300],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 3],
+}
+
 # Congestion Zone Configuration
+# Ingestion derives pickup_in_crz / dropoff_in_crz / crossing from this list;
+# editing it recomputes those columns in place on the next run (no reload).
 CONGESTION_ZONE_IDS = [
     12, 13, 43, 45, 48, 50, 68, 79, 87, 88, 90, 100, 107, 113, 114, 116, 120, 125, 127, 128, 137, 
     140, 141, 142, 143, 144, 148, 151, 152, 153, 158, 161, 162, 163, 164, 166, 170, 186, 209, 211, 
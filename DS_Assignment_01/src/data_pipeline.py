@@ -1,34 +1,403 @@
 import os
+import re
+import time
 import requests
 import duckdb
 import pandas as pd
 from datetime import datetime
 import glob
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from src.config import *
+from src.artifact_store import publish_artifact
+from src.job_runner import NULL_PROGRESS
+from src.instrumentation import NULL_TELEMETRY
+from src.zone_geometry import load_zone_distances, file_digest
+
+# Bumped whenever a lake table changes shape; older lakes are rebuilt from source
+LAKE_SCHEMA_VERSION = 5
+
+# Ghost-trip heuristics, evaluated in order at ingestion; the first failing
+# rule becomes the row's reject_reason (NULL predicates count as failures).
+# The geometric rules read min_distance_mi from the zone_distances matrix and
+# pass for zone pairs without geometry (unknown zones, GeoJSON unavailable).
+SANITIZATION_RULES = [
+    ("duration_out_of_bounds", "date_diff('second', pickup_time, dropoff_time) BETWEEN 10 AND 10800"),
+    ("non_positive_distance", "trip_distance > 0"),
+    ("non_positive_fare", "fare > 0"),
+    ("distance_below_zone_gap",
+     f"min_distance_mi IS NULL OR min_distance_mi < {ZONE_GAP_FLOOR_MILES} "
+     f"OR trip_distance >= min_distance_mi * {ZONE_GAP_MIN_RATIO}"),
+    ("speed_exceeds_zone_gap",
+     f"min_distance_mi IS NULL OR min_distance_mi * 3600.0 / NULLIF(date_diff('second', pickup_time, dropoff_time), 0) "
+     f"<= {ZONE_GAP_MAX_SPEED_MPH}"),
+]
+
+SPEED_EXPR = "(trip_distance * 3600.0) / NULLIF(date_diff('second', pickup_time, dropoff_time), 0)"
+
+# Border-crossing classes stored in the UTINYINT ``crossing`` column
+# (2 * pickup_in_crz + dropoff_in_crz)
+CROSSING_EXTERNAL, CROSSING_ENTERING, CROSSING_LEAVING, CROSSING_INTERNAL = 0, 1, 2, 3
+
+def crz_zone_digest(zone_ids=CONGESTION_ZONE_IDS):
+    """Version of the congestion zone definition the lake's CRZ columns were derived from."""
+    return hashlib.sha1(repr(sorted(set(zone_ids))).encode()).hexdigest()[:12]
+
+def crz_membership_expr(column, zone_ids=CONGESTION_ZONE_IDS):
+    """SQL lookup of a location id in a dense boolean array indexed by LocationID.
+
+    Ids outside the array (and NULLs) are outside the zone.
+    """
+    members = set(zone_ids)
+    lookup = ", ".join("true" if i in members else "false" for i in range(max(members) + 1))
+    return f"COALESCE(list_extract([{lookup}], {column} + 1), false)"
+
+def crz_columns_expr(pickup="pickup_loc", dropoff="dropoff_loc", zone_ids=CONGESTION_ZONE_IDS):
+    """SELECT list of the derived pickup_in_crz, dropoff_in_crz and crossing columns."""
+    pickup_in = crz_membership_expr(pickup, zone_ids)
+    dropoff_in = crz_membership_expr(dropoff, zone_ids)
+    return (f"{pickup_in} as pickup_in_crz, {dropoff_in} as dropoff_in_crz, "
+            f"({pickup_in}::UTINYINT * 2 + {dropoff_in}::UTINYINT)::UTINYINT as crossing")
+
+def source_month(path):
+    """First day of the month a ``{taxi}_tripdata_YYYY-MM.parquet`` file covers, or None."""
+    match = re.search(r"_(\d{4})-(\d{2})\.parquet$", path)
+    return pd.Timestamp(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def plan_incremental_sync(con):
+    """Diffs the local parquet inventory against the lake manifest.
+
+    Returns the files that are new or changed (by size/mtime) and the
+    manifest entries whose source file no longer exists on disk.
+    """
+    inventory = {}
+    for taxi in TAXIS:
+        pattern = os.path.join(DATA_DIR, f"{taxi}_tripdata_*.parquet")
+        for f in glob.glob(pattern):
+            path = os.path.abspath(f).replace('\\', '/')
+            stat = os.stat(path)
+            inventory[path] = (taxi, stat.st_size, stat.st_mtime)
+
+    manifest = {
+        row[0]: (row[1], row[2])
+        for row in con.execute("SELECT source_file, file_size, mtime FROM lake_manifest").fetchall()
+    }
+    changed = [
+        (path, taxi, size, mtime)
+        for path, (taxi, size, mtime) in sorted(inventory.items())
+        if manifest.get(path) != (size, mtime)
+    ]
+    removed = [path for path in manifest if path not in inventory]
+    return changed, removed
+
+def rejection_reason_expr():
+    """SQL CASE expression mapping a raw trip to its first failed sanitization rule."""
+    branches = "\n".join(
+        f"WHEN NOT COALESCE({predicate}, false) THEN '{reason}'"
+        for reason, predicate in SANITIZATION_RULES
+    )
+    return f"CASE {branches} END"
 
 class MetropolitanIngestor:
     """
     Automated data acquisition and unification engine for the NYC Metropolitan 
     transportation dataset. Implements schema-agnostic ingestion via DuckDB.
     """
-    def __init__(self):
-        self.con = duckdb.connect(database=':memory:') 
+    def __init__(self, database=LAKE_PATH, streaming=STREAMING_SANITIZATION, progress=NULL_PROGRESS,
+                 telemetry=NULL_TELEMETRY):
+        self.con = duckdb.connect(database=database) 
+        self.streaming = streaming
+        self.progress = progress
+        self.telemetry = telemetry
+        self._apply_resource_limits()
         try:
             # Spatial extension for future-proofing geospatial joins
             self.con.execute("INSTALL spatial; LOAD spatial;")
         except Exception as e:
             pass
+        self.ingestion_failures = []
+        self._initialize_lake_catalog()
+
+        # Shared HTTP session: one connection pool reused by every download worker
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _apply_resource_limits(self):
+        """Bounds DuckDB memory and threads, spilling oversized operators to disk."""
+        os.makedirs(DUCKDB_SPILL_DIR, exist_ok=True)
+        self.con.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+        self.con.execute(f"SET temp_directory = '{DUCKDB_SPILL_DIR}'")
+        self.con.execute(f"SET threads = {int(DUCKDB_THREADS)}")
+        if self.streaming:
+            # Allows bulk inserts to stream without buffering for row order
+            self.con.execute("SET preserve_insertion_order = false")
+
+    def _initialize_lake_catalog(self):
+        """Creates the persistent lake tables and the per-file ingestion manifest."""
+        self.con.execute("CREATE TABLE IF NOT EXISTS lake_metadata (key VARCHAR PRIMARY KEY, value VARCHAR)")
+        version = self.con.execute("SELECT value FROM lake_metadata WHERE key = 'schema_version'").fetchone()
+        if version is None or version[0] != str(LAKE_SCHEMA_VERSION):
+            # Outdated layout: drop derived tables so every month is re-ingested
+            for table in ["raw_trips", "trips_clean", "trip_rollup", "trips_sample", "trip_rejections", "lake_manifest",
+                          "dataset_dirty_partitions", "zone_distances"]:
+                self.con.execute(f"DROP TABLE IF EXISTS {table}")
+            self.con.execute(
+                "INSERT OR REPLACE INTO lake_metadata VALUES ('schema_version', ?)", [str(LAKE_SCHEMA_VERSION)]
+            )
+
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS raw_trips (
+                pickup_time TIMESTAMP,
+                dropoff_time TIMESTAMP,
+                pickup_loc INTEGER,
+                dropoff_loc INTEGER,
+                trip_distance DOUBLE,
+                fare DOUBLE,
+                total DOUBLE,
+                surcharge DOUBLE,
+                tip DOUBLE,
+                taxi_type VARCHAR,
+                source_file VARCHAR,
+                trip_id UBIGINT,
+                pickup_in_crz BOOLEAN,
+                dropoff_in_crz BOOLEAN,
+                crossing UTINYINT,
+                reject_reason VARCHAR
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS trips_clean AS
+            SELECT * EXCLUDE (reject_reason), NULL::DOUBLE as speed_mph FROM raw_trips LIMIT 0
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS trips_sample AS
+            SELECT *, NULL::DOUBLE as sample_weight FROM trips_clean LIMIT 0
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS trip_rejections (
+                source_file VARCHAR,
+                taxi_type VARCHAR,
+                reject_reason VARCHAR,
+                trips BIGINT
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS lake_manifest (
+                source_file VARCHAR PRIMARY KEY,
+                taxi_type VARCHAR,
+                file_size BIGINT,
+                mtime DOUBLE,
+                row_count BIGINT,
+                schema_hash VARCHAR,
+                sanitized BOOLEAN,
+                ingested_at TIMESTAMP
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS zone_distances (
+                pickup_loc INTEGER,
+                dropoff_loc INTEGER,
+                min_distance_mi DOUBLE,
+                centroid_distance_mi DOUBLE
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS dataset_dirty_partitions (
+                taxi_type VARCHAR,
+                year BIGINT,
+                month BIGINT
+            )
+        """)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS trip_rollup (
+                pickup_hour TIMESTAMP,
+                pickup_loc INTEGER,
+                dropoff_loc INTEGER,
+                crossing UTINYINT,
+                taxi_type VARCHAR,
+                source_file VARCHAR,
+                trip_count BIGINT,
+                paid_count BIGINT,
+                surcharge_count BIGINT,
+                surcharge_sum DOUBLE,
+                surcharge_sq_sum DOUBLE,
+                speed_count BIGINT,
+                speed_sum DOUBLE,
+                speed_sq_sum DOUBLE,
+                tip_pct_count BIGINT,
+                tip_pct_sum DOUBLE,
+                tip_pct_sq_sum DOUBLE,
+                fare_sum DOUBLE,
+                distance_sum DOUBLE
+            )
+        """)
+        self._refresh_crz_columns()
+
+    def _refresh_crz_columns(self):
+        """Re-derives the CRZ columns in place after CONGESTION_ZONE_IDS changed.
+
+        The columns depend only on the location ids, so a redefined zone list
+        costs one UPDATE per table instead of a reload from source. The preview
+        sample is stratified by crossing, so it is redrawn rather than updated.
+        """
+        digest = crz_zone_digest()
+        stored = self.con.execute("SELECT value FROM lake_metadata WHERE key = 'crz_zones'").fetchone()
+        if stored is not None and stored[0] == digest:
+            return
+        self.con.begin()
+        if stored is not None:
+            print("  [INTEGRATION] Congestion zone list changed; recomputing CRZ columns.")
+            pickup_in, dropoff_in = crz_membership_expr("pickup_loc"), crz_membership_expr("dropoff_loc")
+            crossing = f"({pickup_in}::UTINYINT * 2 + {dropoff_in}::UTINYINT)"
+            for table in ["raw_trips", "trips_clean"]:
+                self.con.execute(f"UPDATE {table} SET pickup_in_crz = {pickup_in}, dropoff_in_crz = {dropoff_in}, crossing = {crossing}")
+            self.con.execute(f"UPDATE trip_rollup SET crossing = {crossing}")
+            self._refresh_stratified_sample("true")
+            self._mark_dataset_dirty("true")
+        self.con.execute("INSERT OR REPLACE INTO lake_metadata VALUES ('crz_zones', ?)", [digest])
+        self.con.commit()
+
+    def _refresh_zone_distances(self, path=ZONE_GEOJSON_PATH):
+        """Loads the zone-to-zone distance matrix of the current GeoJSON into the lake.
+
+        Trips are flagged against the matrix at ingestion, so when the geometry
+        changes every manifested month is re-ingested. Only the file fingerprints
+        are cleared: the file list stays, so sources deleted meanwhile are still evicted.
+        """
+        if not os.path.exists(path):
+            return
+        digest = file_digest(path)
+        stored = self.con.execute("SELECT value FROM lake_metadata WHERE key = 'zone_geometry'").fetchone()
+        if stored is not None and stored[0] == digest:
+            return
+        distances = load_zone_distances(path)
+        self.con.begin()
+        self.con.execute("DELETE FROM zone_distances")
+        self.con.register("zone_distances_frame", distances)
+        self.con.execute("INSERT INTO zone_distances SELECT * FROM zone_distances_frame")
+        self.con.unregister("zone_distances_frame")
+        self.con.execute("UPDATE lake_manifest SET file_size = NULL, mtime = NULL")
+        self.con.execute("INSERT OR REPLACE INTO lake_metadata VALUES ('zone_geometry', ?)", [digest])
+        self.con.commit()
+        print(f"  [INTEGRATION] Loaded {len(distances):,} zone pair distances; lake re-ingests against them.")
+
+    def _probe_source_metadata(self, taxi, files):
+        """Reads the parquet footers of a batch of files in a single metadata scan.
+
+        Returns ``{path: (columns, schema_hash, row_count)}`` for every readable
+        file; unreadable files are appended to ``self.ingestion_failures``.
+        """
+        try:
+            schema = self.con.execute(f"""
+                SELECT file_name, name, type, converted_type
+                FROM parquet_schema({files})
+                WHERE name != 'duckdb_schema'
+            """).fetchall()
+            counts = self.con.execute(f"""
+                SELECT file_name, SUM(row_group_num_rows)::BIGINT
+                FROM (
+                    SELECT DISTINCT file_name, row_group_id, row_group_num_rows
+                    FROM parquet_metadata({files})
+                )
+                GROUP BY 1
+            """).fetchall()
+        except Exception as e:
+            if len(files) == 1:
+                self._record_failure(files[0], taxi, "metadata", e)
+                return {}
+            # Isolate the unreadable footer(s) without discarding the whole batch
+            probed = {}
+            for f in files:
+                probed.update(self._probe_source_metadata(taxi, [f]))
+            return probed
+
+        columns = {}
+        for file_name, name, col_type, converted in schema:
+            columns.setdefault(file_name, []).append(f"{name}:{col_type}:{converted}")
+        row_counts = dict(counts)
+        return {
+            f: (
+                {sig.split(":")[0] for sig in cols},
+                hashlib.md5(";".join(cols).encode()).hexdigest(),
+                row_counts.get(f, 0)
+            )
+            for f, cols in columns.items()
+        }
+
+    def _record_failure(self, path, taxi, stage, error):
+        """Appends a structured ingestion failure instead of discarding it."""
+        self.ingestion_failures.append({
+            "source_file": path,
+            "taxi_type": taxi,
+            "stage": stage,
+            "error": str(error).splitlines()[0] if str(error) else type(error).__name__,
+        })
+
+    def _mark_dataset_dirty(self, predicate, params=None):
+        """Queues the exported partitions touched by matching trips_clean rows for rewrite."""
+        self.con.execute(f"""
+            INSERT INTO dataset_dirty_partitions
+            SELECT DISTINCT taxi_type, year(pickup_time), month(pickup_time)
+            FROM trips_clean WHERE {predicate}
+        """, params)
+
+    def _evict_partition(self, path):
+        """Drops every lake row and manifest entry derived from one source file."""
+        self.con.execute("DELETE FROM raw_trips WHERE source_file = ?", [path])
+        self._mark_dataset_dirty("source_file = ?", [path])
+        self.con.execute("DELETE FROM trips_clean WHERE source_file = ?", [path])
+        self.con.execute("DELETE FROM trip_rollup WHERE source_file = ?", [path])
+        self.con.execute("DELETE FROM trips_sample WHERE source_file = ?", [path])
+        self.con.execute("DELETE FROM trip_rejections WHERE source_file = ?", [path])
+        self.con.execute("DELETE FROM lake_manifest WHERE source_file = ?", [path])
 
     def _validate_integrity(self, path):
         """Verifies parquet file structure before downstream processing."""
         try:
-            self.con.execute(f"SELECT * FROM read_parquet('{path}') LIMIT 0")
+            # Cursor per call: validation runs concurrently from download workers
+            self.con.cursor().execute(f"SELECT * FROM read_parquet('{path}') LIMIT 0")
             return True
         except:
             return False
 
+    def _stream_to_partial(self, url, part_path):
+        """Streams a remote asset into a partial file, resuming via HTTP Range.
+
+        Returns True once the server has delivered the complete body.
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, stream=True, timeout=60, headers=headers) as r:
+            if r.status_code == 416:
+                # Requested range starts at EOF: the partial file is already complete
+                return True
+            if r.status_code == 404:
+                raise FileNotFoundError(url)
+            r.raise_for_status()
+
+            mode = 'ab' if r.status_code == 206 else 'wb'
+            written = offset if mode == 'ab' else 0
+            expected = r.headers.get("Content-Length")
+            expected = written + int(expected) if expected is not None else None
+
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+
+        return expected is None or written >= expected
+
     def acquire_resource(self, url, filename, force=False):
-        """Fetches remote assets with local caching and corruption detection."""
+        """Fetches remote assets with local caching and corruption detection.
+
+        Downloads land in a ``.part`` file that is resumed after dropped
+        connections and only renamed into place once complete and valid.
+        """
         dest_path = os.path.join(DATA_DIR, filename).replace('\\', '/')
         if os.path.exists(dest_path) and not force:
             if filename.endswith('.parquet') and not self._validate_integrity(dest_path):
@@ -36,113 +405,413 @@ class MetropolitanIngestor:
             else:
                 return dest_path
         
+        part_path = dest_path + ".part"
+        if force and os.path.exists(part_path):
+            os.remove(part_path)
+
         print(f"  [NETWORK] Synchronizing {url}")
-        try:
-            r = requests.get(url, stream=True, timeout=60)
-            if r.status_code == 200:
-                with open(dest_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=2048*1024):
-                        if chunk: f.write(chunk)
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                if not self._stream_to_partial(url, part_path):
+                    continue
+                if filename.endswith('.parquet') and not self._validate_integrity(part_path):
+                    # Corrupt body (not merely truncated): restart from byte zero
+                    os.remove(part_path)
+                    continue
+                os.replace(part_path, dest_path)
                 return dest_path
-        except Exception as e:
-            print(f"  [ERROR] Synchronization failed for {url}: {e}")
+            except FileNotFoundError:
+                print(f"  [STATUS] Asset not yet published: {url}")
+                return None
+            except Exception as e:
+                print(f"  [ERROR] Synchronization attempt {attempt} failed for {url}: {e}")
+                if attempt < DOWNLOAD_RETRIES:
+                    time.sleep(self._retry_delay(e, attempt))
         return None
 
+    def _retry_delay(self, error, attempt):
+        """Seconds before the next attempt: the server's Retry-After when throttled, else exponential backoff."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            return min(int(retry_after), DOWNLOAD_MAX_BACKOFF)
+        return min(DOWNLOAD_BACKOFF * 2 ** (attempt - 1), DOWNLOAD_MAX_BACKOFF)
+
     def execute_ingestion_sequence(self):
         """Orchestrates the primary data acquisition workflow."""
-        print("Initializing Metropolitan Data Repository...")
-        self.acquire_resource(LOOKUP_URL, "taxi_zone_lookup.csv")
-        self.acquire_resource(GEOJSON_URL, "taxi_zones.geojson")
+        with self.telemetry.stage("download", "MetropolitanIngestor") as span:
+            print("Initializing Metropolitan Data Repository...")
+            resources = [
+                (LOOKUP_URL, "taxi_zone_lookup.csv"),
+                (GEOJSON_URL, "taxi_zones.geojson"),
+            ]
+
+            for year in YEARS_TO_DOWNLOAD:
+                for month in range(1, 13):
+                    for taxi in TAXIS:
+                        filename = f"{taxi}_tripdata_{year}-{month:02d}.parquet"
+                        resources.append((f"{BASE_URL}/{filename}", filename))
+
+            # Baseline synchronization for predictive window
+            for taxi in TAXIS:
+                resources.append((f"{BASE_URL}/{taxi}_tripdata_2023-12.parquet", f"{taxi}_tripdata_2023-12.parquet"))
+
+            self.progress.start_stage("download", len(resources), unit="files")
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+                results = list(pool.map(self._acquire_tracked, resources))
+
+            available = sum(1 for path in results if path)
+            span.rows_out = available
+            span.bytes_read = sum(os.path.getsize(path) for path in results if path and os.path.exists(path))
+            print(f"  [NETWORK] {available}/{len(resources)} assets available locally.")
+
+    def _acquire_tracked(self, resource):
+        """acquire_resource with progress reporting; queued downloads stop on cancellation."""
+        self.progress.checkpoint()
+        path = self.acquire_resource(*resource)
+        self.progress.advance(files_downloaded=1 if path else 0)
+        return path
+
+    def _load_partitions(self, taxi, batch, metadata):
+        """Replaces the lake partitions of ``batch`` with one multi-file parquet scan."""
+        pickup_col = "tpep_pickup_datetime" if taxi == "yellow" else "lpep_pickup_datetime"
+        dropoff_col = "tpep_dropoff_datetime" if taxi == "yellow" else "lpep_dropoff_datetime"
+        files = [f for f, _, _ in batch]
+        # Pickups may spill one month past the latest month on disk; later stamps are clock errors.
+        # Bounded by every local file, not this batch, so re-ingesting old months keeps their rows.
+        months = [m for m in map(source_month, glob.glob(os.path.join(DATA_DIR, "*_tripdata_*.parquet")))
+                  if m is not None]
+        window_end = (max(months) + pd.DateOffset(months=2)).strftime("%Y-%m-%d") if months else "2026-02-01"
 
-        for year in YEARS_TO_DOWNLOAD:
-            for month in range(1, 13):
-                for taxi in TAXIS:
-                    url = f"{BASE_URL}/{taxi}_tripdata_{year}-{month:02d}.parquet"
-                    self.acquire_resource(url, f"{taxi}_tripdata_{year}-{month:02d}.parquet")
+        # Schema drift resolved from footers: files lacking the column contribute 0.0
+        missing = [f for f in files if "congestion_surcharge" not in metadata[f][0]]
+        if len(missing) == len(files):
+            surcharge_expr = "0.0"
+        elif missing:
+            surcharge_expr = f"CASE WHEN filename IN ({', '.join(repr(f) for f in missing)}) THEN 0.0 ELSE CAST(congestion_surcharge AS DOUBLE) END"
+        else:
+            surcharge_expr = "CAST(congestion_surcharge AS DOUBLE)"
 
-        # Baseline synchronization for predictive window
-        for taxi in TAXIS:
-            self.acquire_resource(f"{BASE_URL}/{taxi}_tripdata_2023-12.parquet", f"{taxi}_tripdata_2023-12.parquet")
+        # Partition replacement is atomic: a failed load keeps the previous months
+        self.con.begin()
+        try:
+            for f in files:
+                self._evict_partition(f)
+            # trip_id: (file name, row position) hash, stable across re-ingestion
+            columns = f"""
+                {pickup_col}::TIMESTAMP as pickup_time, {dropoff_col}::TIMESTAMP as dropoff_time,
+                PULocationID::INTEGER as pickup_loc, DOLocationID::INTEGER as dropoff_loc,
+                trip_distance::DOUBLE as trip_distance, fare_amount::DOUBLE as fare,
+                total_amount::DOUBLE as total, {surcharge_expr} as surcharge,
+                tip_amount::DOUBLE as tip, '{taxi}' as taxi_type, filename as source_file,
+                hash(regexp_extract(filename, '[^/]+$'), file_row_number) as trip_id
+            """
+            source = self._classified_source(columns, files, pickup_col, window_end)
+            if self.streaming:
+                # Sanitize while reading: only accepted rows are written anywhere
+                self.con.execute(f"""
+                    INSERT INTO trips_clean
+                    SELECT * EXCLUDE (reject_reason), {SPEED_EXPR} as speed_mph
+                    FROM ({source})
+                    WHERE reject_reason IS NULL
+                """)
+                # Rejections survive only as counts, from a scan of the rule inputs alone
+                rule_columns = f"""
+                    {pickup_col}::TIMESTAMP as pickup_time, {dropoff_col}::TIMESTAMP as dropoff_time,
+                    PULocationID::INTEGER as pickup_loc, DOLocationID::INTEGER as dropoff_loc,
+                    trip_distance::DOUBLE as trip_distance, fare_amount::DOUBLE as fare,
+                    '{taxi}' as taxi_type, filename as source_file
+                """
+                self.con.execute(f"""
+                    INSERT INTO trip_rejections
+                    SELECT source_file, taxi_type, reject_reason, COUNT(*)
+                    FROM ({self._classified_source(rule_columns, files, pickup_col, window_end, crz=False)})
+                    WHERE reject_reason IS NOT NULL
+                    GROUP BY 1, 2, 3
+                """)
+            else:
+                self.con.execute(f"INSERT INTO raw_trips {source}")
+            self.con.executemany(
+                "INSERT INTO lake_manifest VALUES (?, ?, ?, ?, ?, ?, false, now())",
+                [[f, taxi, size, mtime, metadata[f][2], metadata[f][1]] for f, size, mtime in batch]
+            )
+            self.con.commit()
+            return True
+        except Exception as e:
+            self.con.rollback()
+            if len(batch) == 1:
+                self._record_failure(files[0], taxi, "load", e)
+            return False
+
+    def _classified_source(self, columns, files, pickup_col, window_end, crz=True):
+        """Scan of ``files`` projected to ``columns``, with the CRZ columns and the reject_reason.
+
+        The projection must include every column SANITIZATION_RULES reads.
+        """
+        crz_columns = f"{crz_columns_expr()}, " if crz else ""
+        return f"""
+            SELECT t.*, {crz_columns}{rejection_reason_expr()} as reject_reason
+            FROM (
+                SELECT {columns}
+                FROM read_parquet({files}, union_by_name=true, filename=true, file_row_number=true)
+                WHERE {pickup_col} >= '{INGEST_START_DATE}' AND {pickup_col} < '{window_end}'
+            ) t
+            -- Broadcast join against the small zone pair matrix (265 x 265 rows)
+            LEFT JOIN zone_distances USING (pickup_loc, dropoff_loc)
+        """
 
     def unify_metropolitan_lake(self):
-        """Standardizes heterogeneous schemas into a unified analytical table."""
-        print("Normalizing multi-source transportation lake...")
-        self.con.execute("""
-            CREATE OR REPLACE TABLE raw_trips (
-                pickup_time TIMESTAMP,
-                dropoff_time TIMESTAMP,
-                pickup_loc INTEGER,
-                dropoff_loc INTEGER,
-                trip_distance DOUBLE,
-                fare DOUBLE,
-                total DOUBLE,
-                surcharge DOUBLE,
-                tip DOUBLE,
-                taxi_type VARCHAR
+        """Standardizes heterogeneous schemas into a unified analytical table.
+
+        Only source files that are new or changed since the last run are read,
+        all files of a taxi type in one multi-file scan; their previous
+        partitions are evicted and replaced atomically. Files that cannot be
+        read are listed in ``self.ingestion_failures``.
+        """
+        with self.telemetry.stage("unify", "MetropolitanIngestor") as span:
+            print("Normalizing multi-source transportation lake...")
+            self.ingestion_failures = []
+            self._refresh_zone_distances()
+            changed, removed = plan_incremental_sync(self.con)
+            span.bytes_read = sum(size for _, _, size, _ in changed)
+            span.rows_in = span.rows_out = 0
+            self.progress.start_stage("ingest", len(changed), unit="files")
+
+            for path in removed:
+                self.con.begin()
+                self._evict_partition(path)
+                self.con.commit()
+                print(f"  [INTEGRATION] Evicted partition for missing source {os.path.basename(path)}")
+
+            if not changed:
+                print("  [INTEGRATION] Lake is current; no new or changed months.")
+                return
+
+            for taxi in TAXIS:
+                candidates = [(f, size, mtime) for f, t, size, mtime in changed if t == taxi]
+                if not candidates: continue
+
+                metadata = self._probe_source_metadata(taxi, [f for f, _, _ in candidates])
+                batch = [entry for entry in candidates if entry[0] in metadata]
+                span.rows_in += sum(metadata[f][2] for f, _, _ in batch)
+                self.progress.advance(len(candidates) - len(batch))
+                if not batch: continue
+
+                if self._load_partitions(taxi, batch, metadata):
+                    rows = sum(metadata[f][2] for f, _, _ in batch)
+                    span.rows_out += rows
+                    self.progress.advance(len(batch), rows_ingested=rows)
+                else:
+                    # Bulk scan failed on a corrupt body: retry per file to isolate it
+                    for entry in batch:
+                        loaded = self._load_partitions(taxi, [entry], metadata)
+                        rows = metadata[entry[0]][2] if loaded else 0
+                        span.rows_out += rows
+                        self.progress.advance(rows_ingested=rows)
+
+                print(f"  [INTEGRATION] Complated {taxi} dataset merge.")
+
+            loaded = len(changed) - len(self.ingestion_failures)
+            print(f"  [INTEGRATION] Merged {loaded} new or changed monthly partitions.")
+            publish_artifact(
+                pd.DataFrame(self.ingestion_failures, columns=["source_file", "taxi_type", "stage", "error"]),
+                "ingestion_failures")
+            for failure in self.ingestion_failures:
+                print(f"  [ERROR] {failure['stage']} failed for {os.path.basename(failure['source_file'])}: {failure['error']}")
+
+    def apply_sanitization_policy(self, export_dataset=EXPORT_CLEAN_DATASET):
+        """Applies heuristic filtering to exclude technical anomalies (Ghost Trips).
+
+        Rows tagged with a reject_reason at ingestion (see SANITIZATION_RULES)
+        are excluded. Cleans only partitions that have not been sanitized since ingestion and,
+        when ``export_dataset`` is set, refreshes the partitioned Parquet copy.
+        """
+        with self.telemetry.stage("sanitize", "MetropolitanIngestor") as span:
+            print("Enforcing metropolitan quality standard...")
+            self.progress.start_stage("sanitize", 2)
+        
+            # Internal speed indexing, restricted to pending partitions
+            pending = "source_file IN (SELECT source_file FROM lake_manifest WHERE NOT sanitized)"
+            self.con.begin()
+            if not self.streaming:
+                # Streaming ingestion already filtered these partitions into trips_clean
+                self.con.execute(f"DELETE FROM trips_clean WHERE {pending}")
+                self.con.execute(f"""
+                    INSERT INTO trips_clean
+                    SELECT * EXCLUDE (reject_reason), {SPEED_EXPR} as speed_mph
+                    FROM raw_trips
+                    WHERE {pending} AND reject_reason IS NULL
+                """)
+                self.con.execute(f"DELETE FROM trip_rejections WHERE {pending}")
+                self.con.execute(f"""
+                    INSERT INTO trip_rejections
+                    SELECT source_file, taxi_type, reject_reason, COUNT(*)
+                    FROM raw_trips
+                    WHERE {pending} AND reject_reason IS NOT NULL
+                    GROUP BY 1, 2, 3
+                """)
+            self._mark_dataset_dirty(pending)
+            self._refresh_rollup_cube(pending)
+            self._refresh_stratified_sample(pending)
+            self.con.execute("UPDATE lake_manifest SET sanitized = true WHERE NOT sanitized")
+            self.con.commit()
+        
+            # Analytical Audit Generation (counting path: valid without raw_trips rows)
+            audit = self.con.execute("""
+                SELECT 
+                    (SELECT COUNT(*) FROM trips_clean) + (SELECT COALESCE(SUM(trips), 0) FROM trip_rejections)::BIGINT as total_raw,
+                    (SELECT COUNT(*) FROM trips_clean) as total_clean
+            """).df()
+            publish_artifact(audit, "pipeline_audit")
+            span.rows_in, span.rows_out = int(audit["total_raw"].iloc[0]), int(audit["total_clean"].iloc[0])
+            print("  [QUALITY] Sanitization cycle verified.")
+            self.progress.advance()
+
+            if export_dataset:
+                self.export_partitioned_dataset()
+            self.progress.advance()
+
+    def _refresh_rollup_cube(self, predicate):
+        """Rebuilds the hour x zone pair x taxi type rollup for matching trips_clean rows.
+
+        Measures are additive (counts, sums, sums of squares) so averages and
+        variances over any coarser grouping can be recomputed from the cube.
+        Rows are keyed by source file so a changed month replaces only its own cells.
+        """
+        if self.con.execute("SELECT COUNT(*) FROM trip_rollup").fetchone()[0] == 0:
+            # First refresh on an existing lake: backfill every partition
+            predicate = "true"
+        self.con.execute(f"DELETE FROM trip_rollup WHERE {predicate}")
+        self.con.execute(f"""
+            INSERT INTO trip_rollup
+            SELECT
+                date_trunc('hour', pickup_time) as pickup_hour,
+                pickup_loc,
+                dropoff_loc,
+                crossing,
+                taxi_type,
+                source_file,
+                COUNT(*) as trip_count,
+                COUNT(*) FILTER (WHERE surcharge > 0) as paid_count,
+                COUNT(surcharge) as surcharge_count,
+                SUM(surcharge) as surcharge_sum,
+                SUM(surcharge * surcharge) as surcharge_sq_sum,
+                COUNT(speed_mph) as speed_count,
+                SUM(speed_mph) as speed_sum,
+                SUM(speed_mph * speed_mph) as speed_sq_sum,
+                COUNT(tip_ratio) as tip_pct_count,
+                SUM(tip_ratio) as tip_pct_sum,
+                SUM(tip_ratio * tip_ratio) as tip_pct_sq_sum,
+                SUM(fare) as fare_sum,
+                SUM(trip_distance) as distance_sum
+            FROM (
+                SELECT *, CASE WHEN fare > 0 THEN tip/fare ELSE 0 END as tip_ratio
+                FROM trips_clean
+                WHERE {predicate}
             )
+            GROUP BY 1, 2, 3, 4, 5, 6
         """)
 
-        for taxi in TAXIS:
-            pattern = os.path.join(DATA_DIR, f"{taxi}_tripdata_*.parquet")
-            files = [os.path.abspath(f).replace('\\', '/') for f in glob.glob(pattern)]
-            
-            if not files: continue
-                
-            pickup_col = "tpep_pickup_datetime" if taxi == "yellow" else "lpep_pickup_datetime"
-            dropoff_col = "tpep_dropoff_datetime" if taxi == "yellow" else "lpep_dropoff_datetime"
-            
-            for f in files:
-                try:
-                    cols_df = self.con.execute(f"SELECT * FROM read_parquet('{f}') LIMIT 0").df()
-                    has_surcharge = "congestion_surcharge" in cols_df.columns
-                    surcharge_expr = "CAST(congestion_surcharge AS DOUBLE)" if has_surcharge else "0.0"
-                    
-                    self.con.execute(f"""
-                        INSERT INTO raw_trips
-                        SELECT 
-                            {pickup_col}::TIMESTAMP, {dropoff_col}::TIMESTAMP,
-                            PULocationID::INTEGER, DOLocationID::INTEGER,
-                            trip_distance::DOUBLE, fare_amount::DOUBLE, 
-                            total_amount::DOUBLE, {surcharge_expr},
-                            tip_amount::DOUBLE, '{taxi}'
-                        FROM read_parquet('{f}')
-                        WHERE {pickup_col} >= '2023-12-01' AND {pickup_col} < '2026-02-01'
-                    """)
-                except:
-                    pass
-            
-            print(f"  [INTEGRATION] Complated {taxi} dataset merge.")
-
-    def apply_sanitization_policy(self):
-        """Applies heuristic filtering to exclude technical anomalies (Ghost Trips)."""
-        print("Enforcing metropolitan quality standard...")
-        
-        # Internal speed indexing
-        self.con.execute("""
-            CREATE OR REPLACE TABLE trips_clean AS
-            SELECT *,
-                (trip_distance * 3600.0) / NULLIF(date_diff('second', pickup_time, dropoff_time), 0) as speed_mph
-            FROM raw_trips
-            WHERE 
-                date_diff('second', pickup_time, dropoff_time) BETWEEN 10 AND 10800
-                AND trip_distance > 0
-                AND fare > 0
+    def _refresh_stratified_sample(self, predicate):
+        """Redraws the preview sample of trips_clean for matching rows.
+
+        Strata are (source file, pickup month, crossing type); a source file
+        holds one taxi type, so strata nest within month x taxi type x crossing.
+        Each stratum is Bernoulli-sampled at SAMPLE_RATE, raised so that about
+        SAMPLE_MIN_ROWS rows survive in small strata, by a hash of trip_id, so
+        a re-ingested month draws the same rows. ``sample_weight`` is the
+        inverse inclusion probability.
+        """
+        if self.con.execute("SELECT COUNT(*) FROM trips_sample").fetchone()[0] == 0:
+            # First refresh on an existing lake: backfill every partition
+            predicate = "true"
+        inclusion = f"LEAST(1.0, GREATEST({SAMPLE_RATE}, {SAMPLE_MIN_ROWS} / stratum_rows))"
+        self.con.execute(f"DELETE FROM trips_sample WHERE {predicate}")
+        self.con.execute(f"""
+            INSERT INTO trips_sample
+            SELECT * EXCLUDE (stratum_rows), 1.0 / {inclusion} as sample_weight
+            FROM (
+                SELECT *, COUNT(*) OVER (
+                    PARTITION BY source_file, year(pickup_time), month(pickup_time), crossing
+                ) as stratum_rows
+                FROM trips_clean
+                WHERE {predicate}
+            )
+            WHERE (hash(trip_id, 'sample') % 1000000) / 1000000.0 < {inclusion}
         """)
-        
-        # Analytical Audit Generation
-        self.con.execute("""
-            SELECT 
-                (SELECT COUNT(*) FROM raw_trips) as total_raw,
-                (SELECT COUNT(*) FROM trips_clean) as total_clean
-        """).df().to_csv(os.path.join(OUTPUT_DIR, "pipeline_audit.csv"), index=False)
-        print("  [QUALITY] Sanitization cycle verified.")
-
-    def run_full_lifecycle(self):
-        self.execute_ingestion_sequence()
+
+    def export_partitioned_dataset(self, path=CLEAN_DATASET_DIR):
+        """Writes trips_clean as a ZSTD Parquet dataset partitioned by taxi_type/year/month.
+
+        Only partitions queued in ``dataset_dirty_partitions`` are rewritten; rows
+        are sorted by pickup_time so row-group min/max statistics stay selective.
+        """
+        with self.telemetry.stage("export", "MetropolitanIngestor") as span:
+            if not os.path.isdir(path):
+                self._mark_dataset_dirty("true")
+
+            dirty = self.con.execute("SELECT DISTINCT taxi_type, year, month FROM dataset_dirty_partitions").fetchall()
+            if not dirty:
+                print("  [EXPORT] Partitioned dataset is current.")
+                return path
+
+            for taxi, year, month in dirty:
+                shutil.rmtree(os.path.join(path, f"taxi_type={taxi}", f"year={year}", f"month={month}"), ignore_errors=True)
+
+            os.makedirs(path, exist_ok=True)
+            copied = self.con.execute(f"""
+                COPY (
+                    SELECT *, year(pickup_time) as year, month(pickup_time) as month
+                    FROM trips_clean
+                    WHERE (taxi_type, year(pickup_time), month(pickup_time)) IN (
+                        SELECT DISTINCT taxi_type, year, month FROM dataset_dirty_partitions
+                    )
+                    ORDER BY pickup_time
+                ) TO '{path}' (
+                    FORMAT PARQUET,
+                    PARTITION_BY (taxi_type, year, month),
+                    COMPRESSION ZSTD,
+                    OVERWRITE_OR_IGNORE,
+                    FILENAME_PATTERN 'part_{{uuid}}'
+                )
+            """).fetchone()
+            span.rows_out = copied[0] if copied else None
+            self.con.execute("DELETE FROM dataset_dirty_partitions")
+            print(f"  [EXPORT] Rewrote {len(dirty)} partitions of {path}")
+            return path
+
+    def run_full_lifecycle(self, acquire=True):
+        """Downloads (unless ``acquire`` is off, e.g. in watch mode), ingests and sanitizes."""
+        if acquire:
+            self.execute_ingestion_sequence()
         self.unify_metropolitan_lake()
         self.apply_sanitization_policy()
         return self.con
 
+def lake_fingerprint(con):
+    """Digest of the lake state: every lake table is derived from the manifested
+    sources and the congestion zone list behind the CRZ columns."""
+    rows = con.execute("""
+        SELECT source_file, file_size, mtime, schema_hash, sanitized
+        FROM lake_manifest ORDER BY source_file
+    """).fetchall()
+    zones = con.execute("SELECT value FROM lake_metadata WHERE key = 'crz_zones'").fetchone()
+    return hashlib.sha1(repr((LAKE_SCHEMA_VERSION, zones, rows)).encode()).hexdigest()
+
+def open_clean_dataset(path=CLEAN_DATASET_DIR, con=None):
+    """Attaches the partitioned trips_clean Parquet dataset as a view.
+
+    Hive partition columns (taxi_type, year, month) are exposed so filters on
+    them prune whole directories; pickup_time ranges use row-group statistics.
+    """
+    con = con or duckdb.connect(database=':memory:')
+    dataset = os.path.join(path, "**", "*.parquet").replace('\\', '/')
+    con.execute(f"""
+        CREATE OR REPLACE VIEW trips_clean AS
+        SELECT * FROM read_parquet('{dataset}', hive_partitioning=true)
+    """)
+    return con
+
 if __name__ == "__main__":
     etl = NYCTrafficETL()
     etl.run_full_pipeline()
@@ -1,87 +1,349 @@
 import os
+import time
+import hashlib
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
+import pyarrow as pa
+import sklearn
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.model_selection import train_test_split
-import pickle
 from src.config import *
+from src.model_store import ModelStore
+from src.instrumentation import NULL_TELEMETRY
+from src.artifact_store import publish_artifact
+from src.data_pipeline import open_clean_dataset, source_month
+from src.analytics import UrbanLogisticsEngine
+from src.weather import MeteorologicalArchive
+
+# Model inputs, in training order
+FEATURE_COLUMNS = ['dow', 'month', 'precipitation_sum']
 
 class MetropolitanDemandForecaster:
     """
     Predictive engine utilizing Random Forest Regression to estimate 
     metropolitan transit demand based on temporal and environmental features.
     """
-    def __init__(self):
-        self.model_path = os.path.join(OUTPUT_DIR, "traffic_model.pkl")
-        self.model = self._load_persisted_model()
+    def __init__(self, store=None, telemetry=NULL_TELEMETRY):
+        self.store = store or ModelStore("daily")
+        self.telemetry = telemetry
+        self._model = None
+        self._prediction_cache = OrderedDict()
+
+    @property
+    def model(self):
+        """The active regressor, loaded from the store on first use."""
+        if self._model is None:
+            self._model = self._load_persisted_model()
+        return self._model
+
+    def _new_model(self):
+        return RandomForestRegressor(n_estimators=FORECAST_N_ESTIMATORS, n_jobs=FORECAST_N_JOBS, random_state=42)
 
     def _load_persisted_model(self):
-        """Loads the pre-trained regressor into memory during initialization."""
-        if os.path.exists(self.model_path):
-            try:
-                with open(self.model_path, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                pass
-        # Fallback to untrained model if persistence is unavailable
-        return RandomForestRegressor(n_estimators=100, random_state=42)
-
-    def prepare_inference_features(self, con):
-        """Engineers a feature matrix for model training and cross-validation."""
-        print("Synthesizing Predictive Feature Matrix...")
-        query = """
-            WITH daily AS (
-                SELECT 
-                    CAST(pickup_time AS DATE) as date,
-                    COUNT(*) as trip_count,
-                    dayofweek(pickup_time) as dow,
-                    month(pickup_time) as month
-                FROM trips_clean
-                WHERE year(pickup_time) = 2025
-                GROUP BY 1, 3, 4
-            )
-            SELECT d.*, w.precipitation_sum
-            FROM daily d
-            LEFT JOIN read_csv('output/weather_impact.csv') w ON d.date = w.date
-        """
+        """Loads the active regressor from the model store."""
         try:
-            df = con.execute(query).df()
-            return df.dropna()
+            return self.store.load()
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            return pd.DataFrame()
+            print(f"  [STATUS] Stored forecaster unusable ({e}); retraining required.")
+        # Fallback to untrained model if persistence is unavailable
+        return self._new_model()
+
+    def prepare_inference_features(self, con=None, from_rollup=False):
+        """Engineers a feature matrix for model training and cross-validation.
+
+        Reads the weather_demand_daily table published by the weather report;
+        when it is absent (e.g. on the partitioned trips_clean Parquet export,
+        used without a connection) it is materialized first, from the
+        trip_rollup cube when ``from_rollup`` is set.
+        """
+        with self.telemetry.stage("prepare_features", "MetropolitanDemandForecaster") as span:
+            print("Synthesizing Predictive Feature Matrix...")
+            partitioned = con is None
+            con = con or open_clean_dataset()
+            try:
+                exists = con.execute("""
+                    SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'weather_demand_daily'
+                """).fetchone()[0]
+                if not exists:
+                    engine = UrbanLogisticsEngine(con, partitioned=partitioned, telemetry=self.telemetry)
+                    engine.mode = "rollup" if from_rollup else "sequential"
+                    MeteorologicalArchive().register(con)
+                    engine.materialize_daily_demand()
+                df = self.telemetry.query(con, """
+                    SELECT date, trip_count, dow, month, precipitation_sum
+                    FROM weather_demand_daily
+                    WHERE precipitation_sum IS NOT NULL
+                    ORDER BY date
+                """, "forecast_features")
+                span.rows_out = len(df)
+                return df
+            except Exception as e:
+                return pd.DataFrame()
+
+    def _training_fingerprint(self, df):
+        """Digest of the feature matrix and the estimator settings it is fitted with."""
+        digest = hashlib.sha1()
+        digest.update(pd.util.hash_pandas_object(df[FEATURE_COLUMNS + ['trip_count']], index=False).values.tobytes())
+        digest.update(repr((FEATURE_COLUMNS, self._new_model().get_params(), FORECAST_TRAIN_BUDGET)).encode())
+        return digest.hexdigest()
+
+    def _fit_within_budget(self, X, y):
+        """Grows the forest on all cores, one tree per core at a time, until done or out of time."""
+        model = self._new_model().set_params(warm_start=True, n_estimators=0)
+        step = os.cpu_count() or 4
+        deadline = time.monotonic() + FORECAST_TRAIN_BUDGET
+        while model.n_estimators < FORECAST_N_ESTIMATORS:
+            model.set_params(n_estimators=min(model.n_estimators + step, FORECAST_N_ESTIMATORS))
+            model.fit(X, y)
+            if time.monotonic() > deadline:
+                print(f"  [MODEL] Training budget reached at {model.n_estimators} trees.")
+                break
+        return model.set_params(warm_start=False)
 
     def train_forecasting_model(self, df):
-        """Trains the regressor on the engineered feature matrix."""
-        if df.empty or len(df) < 10:
-            return False
+        """Trains the regressor on the engineered feature matrix.
+
+        Skipped when the stored model was fitted on the same feature matrix
+        with the same settings and scikit-learn release.
+        """
+        with self.telemetry.stage("train", "MetropolitanDemandForecaster", rows_in=len(df)) as span:
+            if df.empty or len(df) < 10:
+                return False
+
+            fingerprint = self._training_fingerprint(df)
+            metadata = self.store.metadata()
+            if metadata and metadata["data_fingerprint"] == fingerprint and metadata["sklearn_version"] == sklearn.__version__:
+                print(f"  [MODEL] Forecaster {metadata['version']} is current; training skipped.")
+                return True
 
-        print(f"Calibrating Demand Forecaster on {len(df)} temporal nodes...")
-        X = df[['dow', 'month', 'precipitation_sum']]
-        y = df['trip_count']
+            print(f"Calibrating Demand Forecaster on {len(df)} temporal nodes...")
+            X = df[FEATURE_COLUMNS]
+            y = df['trip_count']
         
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        self.model.fit(X_train, y_train)
+            # Chronological holdout (rows are date-ordered): the model never trains on the future
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+            started = time.monotonic()
+            self._model = self._fit_within_budget(X_train, y_train)
+            self._prediction_cache.clear()
+            score = self._model.score(X_test, y_test)
         
-        # Persist trained state
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(self.model, f)
+            span.rows_out = len(X_train)
+
+            # Persist trained state
+            self.store.save(self._model, fingerprint[:12], {
+                "feature_columns": FEATURE_COLUMNS,
+                "feature_dtypes": {col: str(dtype) for col, dtype in X.dtypes.items()},
+                "data_fingerprint": fingerprint,
+                "training_rows": len(X_train),
+                "n_estimators": self._model.n_estimators,
+                "holdout_r2": score,
+                "train_seconds": round(time.monotonic() - started, 3),
+            })
         
-        score = self.model.score(X_test, y_test)
-        print(f"  [MODEL] Forecasting Calibration R^2: {score:.4f}")
-        return True
+            print(f"  [MODEL] Forecasting Calibration R^2: {score:.4f}")
+            return True
+
+    def _scenario_matrix(self, scenarios=None, dow=None, month=None, precip=None):
+        """Normalizes a DataFrame, Arrow table or feature arrays into the model's feature frame."""
+        if scenarios is None:
+            scenarios = {"dow": dow, "month": month, "precipitation_sum": precip}
+            return pd.DataFrame({col: np.atleast_1d(np.asarray(v, dtype=np.float64)) for col, v in scenarios.items()})
+        if isinstance(scenarios, pa.Table):
+            scenarios = scenarios.select(FEATURE_COLUMNS).to_pandas()
+        return scenarios[FEATURE_COLUMNS].astype(np.float64)
+
+    def predict_batch(self, scenarios=None, dow=None, month=None, precip=None, quantiles=None):
+        """Scores many scenarios in one vectorized call.
+
+        Takes a DataFrame or Arrow table with the feature columns, or equal-length
+        ``dow``/``month``/``precip`` arrays. Returns an array of volume estimates
+        or, with ``quantiles`` (e.g. ``[0.1, 0.9]``), a DataFrame with the mean
+        ``prediction`` and one ``q<pct>`` column per quantile of the per-tree
+        predictions. An unfitted model yields zeros.
+        """
+        X = self._scenario_matrix(scenarios, dow, month, precip)
+        if not hasattr(self.model, 'n_features_in_'):
+            predictions = np.zeros(len(X))
+            per_tree = np.zeros((1, len(X)))
+        elif quantiles:
+            # Trees were fitted on the validated array, so they take it without feature names
+            per_tree = np.stack([tree.predict(X.to_numpy()) for tree in self.model.estimators_])
+            predictions = per_tree.mean(axis=0)
+        else:
+            return self.model.predict(X)
+
+        if not quantiles:
+            return predictions
+        result = pd.DataFrame({"prediction": predictions}, index=X.index)
+        for q in quantiles:
+            result[f"q{round(q * 100)}"] = np.quantile(per_tree, q, axis=0)
+        return result
 
     def generate_prediction(self, dow, month, precip):
-        """Generates a volume estimate using the memory-resident model."""
+        """Generates a volume estimate using the memory-resident model.
+
+        Repeated dashboard queries are answered from an LRU cache that is
+        cleared whenever the model is retrained.
+        """
+        key = (dow, month, precip)
+        cached = self._prediction_cache.get(key)
+        if cached is not None:
+            self._prediction_cache.move_to_end(key)
+            return cached
         try:
-            # Check if the model has been fitted before predicting
-            if hasattr(self.model, 'n_features_in_'):
-                # Pass feature names to avoid UserWarning and ensure consistency
-                features = pd.DataFrame([[dow, month, precip]], 
-                                     columns=['dow', 'month', 'precipitation_sum'])
-                pred = self.model.predict(features)
-                return int(pred[0])
+            pred = int(self.predict_batch(dow=[dow], month=[month], precip=[precip])[0])
         except Exception as e:
             print(f"Prediction Error: {e}")
-        return 0
+            return 0
+        self._prediction_cache[key] = pred
+        while len(self._prediction_cache) > PREDICTION_CACHE_ENTRIES:
+            self._prediction_cache.popitem(last=False)
+        return pred
+
+# Features of the global zone x hour model; lags reach at least one horizon back
+ZONE_FEATURE_COLUMNS = ['zone_index', 'hour', 'dow', 'month', 'lag_168', 'lag_336', 'prev_week_mean']
+
+class ZoneDemandForecaster:
+    """
+    Hour-level demand forecaster for every congestion zone. One global
+    gradient-boosted model is fitted across all zone x hour series at once
+    (the zone enters as a categorical feature), and the next week is
+    forecast for all zones with a single batched predict call.
+    """
+    def __init__(self, store=None, telemetry=NULL_TELEMETRY):
+        self.store = store or ModelStore("zone_hourly")
+        self.telemetry = telemetry
+
+    def build_hourly_matrix(self, con, from_rollup=True):
+        """Dense zone x hour feature matrix, including the unobserved forecast hours.
+
+        Hourly volumes come from the trip_rollup cube (or a trips_clean scan);
+        hours without trips count as zero. The history runs from the first
+        observed hour to the end of the last ingested month (see
+        ``_observation_end``), so mis-dated pickups past it are ignored. Lags
+        and the trailing weekly mean are window functions evaluated in DuckDB.
+        Rows after the history have a NULL ``trip_count`` and are the ones to forecast.
+        """
+        ids = ",".join(map(str, CONGESTION_ZONE_IDS))
+        end = self._observation_end(con)
+        end = f"TIMESTAMP '{end:%Y-%m-%d %H:%M:%S}'" if end is not None else "MAX(pickup_hour)"
+        observed = f"""
+            SELECT pickup_hour, pickup_loc, SUM(trip_count)::BIGINT as trips
+            FROM trip_rollup WHERE pickup_loc IN ({ids}) GROUP BY 1, 2
+        """
+        if not from_rollup:
+            observed = f"""
+                SELECT date_trunc('hour', pickup_time) as pickup_hour, pickup_loc, COUNT(*) as trips
+                FROM trips_clean WHERE pickup_loc IN ({ids}) GROUP BY 1, 2
+            """
+        return self.telemetry.query(con, f"""
+            WITH observed AS ({observed}),
+            bounds AS (SELECT MIN(pickup_hour) as first_hour, {end} as hi FROM observed),
+            span AS (
+                SELECT GREATEST(first_hour, hi - INTERVAL '{ZONE_FORECAST_HISTORY_DAYS} days') as lo, hi
+                FROM bounds
+            ),
+            grid AS (
+                SELECT z.pickup_loc, unnest(generate_series(span.lo, span.hi + INTERVAL '{ZONE_FORECAST_HORIZON_HOURS} hours', INTERVAL 1 HOUR)) as pickup_hour
+                FROM span, (SELECT unnest([{ids}]) as pickup_loc) z
+            ),
+            series AS (
+                SELECT
+                    g.pickup_loc,
+                    g.pickup_hour,
+                    CASE WHEN g.pickup_hour <= span.hi THEN COALESCE(o.trips, 0) END as trip_count
+                FROM grid g
+                CROSS JOIN span
+                LEFT JOIN observed o USING (pickup_loc, pickup_hour)
+            )
+            SELECT
+                pickup_loc,
+                pickup_hour,
+                trip_count,
+                list_position([{ids}], pickup_loc) - 1 as zone_index,
+                hour(pickup_hour) as hour,
+                dayofweek(pickup_hour) as dow,
+                month(pickup_hour) as month,
+                LAG(trip_count, 168) OVER w as lag_168,
+                LAG(trip_count, 336) OVER w as lag_336,
+                AVG(trip_count) OVER (
+                    PARTITION BY pickup_loc ORDER BY pickup_hour ROWS BETWEEN 335 PRECEDING AND 168 PRECEDING
+                ) as prev_week_mean
+            FROM series
+            WINDOW w AS (PARTITION BY pickup_loc ORDER BY pickup_hour)
+            ORDER BY pickup_loc, pickup_hour
+        """, "zone_hourly_matrix")
+
+    def _observation_end(self, con):
+        """Last hour of the latest month ingested for every taxi type, from the lake manifest.
+
+        Source files are monthly, so this is where complete data ends; None
+        when the manifest names no monthly files.
+        """
+        latest = {}
+        for source_file, taxi in con.execute("SELECT source_file, taxi_type FROM lake_manifest WHERE sanitized").fetchall():
+            month = source_month(source_file)
+            if month is not None:
+                latest[taxi] = max(latest.get(taxi, month), month)
+        if not latest:
+            return None
+        return min(latest.values()) + pd.DateOffset(months=1) - pd.Timedelta(hours=1)
+
+    def _new_model(self):
+        return HistGradientBoostingRegressor(
+            loss="poisson", max_iter=ZONE_FORECAST_MAX_ITER, categorical_features=[0], random_state=42)
+
+    def train(self, matrix):
+        """Fits (or reuses) the global model on the observed rows of ``matrix``."""
+        history = matrix[matrix['trip_count'].notna()].dropna(subset=ZONE_FEATURE_COLUMNS)
+        digest = hashlib.sha1()
+        digest.update(pd.util.hash_pandas_object(history[ZONE_FEATURE_COLUMNS + ['trip_count']], index=False).values.tobytes())
+        digest.update(repr((ZONE_FEATURE_COLUMNS, self._new_model().get_params())).encode())
+        fingerprint = digest.hexdigest()
+
+        metadata = self.store.metadata()
+        if metadata and metadata["data_fingerprint"] == fingerprint and metadata["sklearn_version"] == sklearn.__version__:
+            print(f"  [MODEL] Zone forecaster {metadata['version']} is current; training skipped.")
+            return self.store.load()
+
+        print(f"Calibrating Zone Demand Forecaster on {len(history)} zone-hours...")
+        started = time.monotonic()
+        model = self._new_model().fit(history[ZONE_FEATURE_COLUMNS].to_numpy(dtype=np.float64),
+                                      history['trip_count'].to_numpy(dtype=np.float64))
+        self.store.save(model, fingerprint[:12], {
+            "feature_columns": ZONE_FEATURE_COLUMNS,
+            "data_fingerprint": fingerprint,
+            "training_rows": len(history),
+            "zones": len(CONGESTION_ZONE_IDS),
+            "train_seconds": round(time.monotonic() - started, 3),
+        })
+        return model
+
+    def forecast_next_week(self, con, from_rollup=True):
+        """Forecasts every congestion zone for the hours after the last ingested month.
+
+        Publishes and returns the ``zone_hourly_forecast`` table
+        (pickup_loc, forecast_hour, predicted_trips).
+        """
+        matrix = self.build_hourly_matrix(con, from_rollup)
+        if matrix['trip_count'].notna().sum() == 0:
+            print("  [STATUS] No congestion zone trips available; zone forecast skipped.")
+            return None
+        with self.telemetry.stage("train", "ZoneDemandForecaster", rows_in=len(matrix)):
+            model = self.train(matrix)
+
+        future = matrix[matrix['trip_count'].isna()]
+        forecast = pd.DataFrame({
+            "pickup_loc": future['pickup_loc'].to_numpy(),
+            "forecast_hour": future['pickup_hour'].to_numpy(),
+            "predicted_trips": model.predict(future[ZONE_FEATURE_COLUMNS].to_numpy(dtype=np.float64)),
+        })
+        publish_artifact(forecast, "zone_hourly_forecast")
+        print(f"  [MODEL] Forecast {len(forecast)} zone-hours for {forecast['pickup_loc'].nunique()} zones.")
+        return forecast
 
 if __name__ == "__main__":
     pass
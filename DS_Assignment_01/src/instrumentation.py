@@ -0,0 +1,157 @@
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from src.config import *
+from src.job_runner import _atomic_write_json, _read_json
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class RssSampler:
+    """Samples the process RSS on a background thread while a block runs."""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / 2**20, 1) if self.peak is not None else None
+
+class StageSpan:
+    """Mutable record of one instrumented stage; components fill in row and byte counts."""
+    def __init__(self, name, component, rows_in=None, rows_out=None, bytes_read=None, **fields):
+        self.name = name
+        self.component = component
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.bytes_read = bytes_read
+        self.fields = fields
+
+class Telemetry:
+    """
+    No-op instrumentation sink. Components open stages and run their DuckDB
+    queries through this interface unconditionally; RunTelemetry records them.
+    """
+    @contextmanager
+    def stage(self, name, component, **fields):
+        yield StageSpan(name, component, **fields)
+
+    def query(self, con, sql, label, params=None):
+        """Executes an analytical query and returns its result as a DataFrame."""
+        return con.execute(sql, params).df()
+
+NULL_TELEMETRY = Telemetry()
+
+class RunTelemetry(Telemetry):
+    """
+    Structured run log of one pipeline run: wall time, rows in/out, bytes
+    read and peak RSS per stage, plus timing (and, when ``profile_queries``
+    is set, the DuckDB EXPLAIN ANALYZE profile) of every analytical query.
+    The log is rewritten atomically after each record so the dashboard can
+    read it mid-run. Thread-safe; RSS is process-wide, so stages that
+    overlap share their peak.
+    """
+    def __init__(self, run_id=None, path=RUN_LOG_PATH, profile_queries=PROFILE_QUERIES):
+        self.path = path
+        self.profile_queries = profile_queries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.log = {
+            "run_id": run_id or uuid.uuid4().hex[:12],
+            "started_at": time.time(),
+            "finished_at": None,
+            "stages": [],
+            "queries": [],
+        }
+        self._flush()
+
+    def _flush(self):
+        _atomic_write_json(self.log, self.path)
+
+    def _record(self, kind, entry):
+        with self._lock:
+            self.log[kind].append(entry)
+            self._flush()
+
+    @contextmanager
+    def stage(self, name, component, **fields):
+        span = StageSpan(name, component, **fields)
+        parent = getattr(self._local, "stage", None)
+        self._local.stage = name
+        error = None
+        started_at = time.time()
+        sampler = RssSampler()
+        started = time.perf_counter()
+        try:
+            with sampler:
+                yield span
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._local.stage = parent
+            self._record("stages", {
+                "stage": span.name,
+                "component": span.component,
+                "parent": parent,
+                "started_at": started_at,
+                "seconds": round(time.perf_counter() - started, 4),
+                "rows_in": span.rows_in,
+                "rows_out": span.rows_out,
+                "bytes_read": span.bytes_read,
+                "peak_rss_mb": sampler.peak_mb,
+                "error": error,
+                **span.fields,
+            })
+
+    def query(self, con, sql, label, params=None):
+        profile = None
+        if self.profile_queries:
+            # EXPLAIN ANALYZE executes the query once more to collect operator timings
+            profile = "\n".join(row[-1] for row in con.execute(f"EXPLAIN ANALYZE {sql}", params).fetchall())
+        started = time.perf_counter()
+        df = con.execute(sql, params).df()
+        self._record("queries", {
+            "query": label,
+            "stage": getattr(self._local, "stage", None),
+            "seconds": round(time.perf_counter() - started, 4),
+            "rows_out": len(df),
+            "sql": " ".join(sql.split()),
+            "profile": profile,
+        })
+        return df
+
+    def finish(self):
+        with self._lock:
+            self.log["finished_at"] = time.time()
+            self._flush()
+
+def load_run_log(path=RUN_LOG_PATH):
+    """Latest structured run log, or None if no instrumented run has been recorded."""
+    return _read_json(path)
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import threading
+import traceback
+import subprocess
+from contextlib import contextmanager
+from src.config import *
+
+# Pipeline stages in execution order with their share of the expected runtime
+PIPELINE_STAGES = [
+    ("download", 0.35),
+    ("ingest", 0.30),
+    ("sanitize", 0.10),
+    ("analytics", 0.15),
+    ("forecast", 0.10),
+]
+
+class PipelineCancelled(Exception):
+    """Raised at a stage checkpoint once cancellation has been requested."""
+
+class PipelineBusyError(RuntimeError):
+    """Raised when another pipeline run holds the lock file."""
+
+class ProgressReporter:
+    """
+    No-op progress sink. Pipeline components report through this interface
+    unconditionally; JobProgress records the calls for a background job.
+    """
+    def start_stage(self, name, total, unit="steps"):
+        pass
+
+    def advance(self, n=1, stage=None, **counters):
+        pass
+
+    def checkpoint(self):
+        pass
+
+NULL_PROGRESS = ProgressReporter()
+
+def _atomic_write_json(payload, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _initial_status(job_id, pid):
+    now = time.time()
+    return {
+        "job_id": job_id,
+        "pid": pid,
+        "state": "running",
+        "stage": None,
+        "stage_done": 0,
+        "stage_total": 0,
+        "unit": None,
+        "stages": {},
+        "counters": {"files_downloaded": 0, "rows_ingested": 0, "analyses_done": 0},
+        "started_at": now,
+        "updated_at": now,
+        "fraction": 0.0,
+        "eta_seconds": None,
+        "error": None,
+    }
+
+class JobProgress(ProgressReporter):
+    """
+    Progress of one background run, snapshotted to a JSON status file that the
+    dashboard polls. Thread-safe: download workers report concurrently.
+    """
+    def __init__(self, job_id, status_path=PIPELINE_STATUS_PATH, cancel_path=PIPELINE_CANCEL_PATH,
+                 interval=PIPELINE_STATUS_INTERVAL):
+        self.status_path = status_path
+        self.cancel_path = cancel_path
+        self.interval = interval
+        self.weights = dict(PIPELINE_STAGES)
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self.state = _initial_status(job_id, os.getpid())
+        self._write(force=True)
+
+    def _fraction(self):
+        """Weighted share of the run completed so far (stages may overlap)."""
+        done = 0.0
+        for name, stage in self.state["stages"].items():
+            share = min(stage["done"] / stage["total"], 1.0) if stage["total"] else 1.0
+            done += self.weights.get(name, 0.0) * share
+        return min(done / sum(self.weights.values()), 1.0)
+
+    def _write(self, force=False):
+        now = time.time()
+        if not force and now - self._last_write < self.interval:
+            return
+        current = self.state["stages"].get(self.state["stage"])
+        if current is not None:
+            self.state.update(stage_done=current["done"], stage_total=current["total"], unit=current["unit"])
+        fraction = self._fraction()
+        elapsed = now - self.state["started_at"]
+        self.state["fraction"] = round(fraction, 4)
+        running = self.state["state"] == "running"
+        self.state["eta_seconds"] = round(elapsed * (1 - fraction) / fraction, 1) if running and fraction > 0.01 else None
+        self.state["updated_at"] = now
+        _atomic_write_json(self.state, self.status_path)
+        self._last_write = now
+
+    def start_stage(self, name, total, unit="steps"):
+        self.checkpoint()
+        with self._lock:
+            self.state["stages"][name] = {"done": 0, "total": total, "unit": unit}
+            self.state["stage"] = name
+            self._write(force=True)
+
+    def advance(self, n=1, stage=None, **counters):
+        """Advances ``stage`` (default: the most recently started one)."""
+        with self._lock:
+            self.state["stages"][stage or self.state["stage"]]["done"] += n
+            for key, value in counters.items():
+                self.state["counters"][key] = self.state["counters"].get(key, 0) + value
+            self._write()
+        self.checkpoint()
+
+    def checkpoint(self):
+        if os.path.exists(self.cancel_path):
+            raise PipelineCancelled("Cancellation requested")
+
+    def finish(self, state, error=None):
+        with self._lock:
+            if state == "succeeded":
+                for stage in self.state["stages"].values():
+                    stage["done"] = max(stage["done"], stage["total"])
+            self.state.update(state=state, error=error)
+            self._write(force=True)
+
+def _acquire_lock(lock_path, owner):
+    """Creates the lock file exclusively; a lock left by a dead process is reclaimed."""
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            holder = _read_json(lock_path)
+            if holder and _pid_alive(holder.get("pid", -1)):
+                raise PipelineBusyError(f"Pipeline run {holder.get('job_id')} is already in progress (pid {holder['pid']})")
+            # Stale lock from a crashed run
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, 'w') as f:
+            json.dump(owner, f)
+        return
+
+def _release_lock(lock_path, pid):
+    """Removes the lock file if it is still held by ``pid``."""
+    holder = _read_json(lock_path)
+    if holder and holder.get("pid") == pid:
+        os.remove(lock_path)
+
+@contextmanager
+def pipeline_lock(job_id=None, lock_path=PIPELINE_LOCK_PATH):
+    """Holds the pipeline lock for a foreground run (e.g. ``python pipeline.py``)."""
+    _acquire_lock(lock_path, {"job_id": job_id or "cli", "pid": os.getpid()})
+    try:
+        yield
+    finally:
+        _release_lock(lock_path, os.getpid())
+
+class PipelineJobRunner:
+    """
+    Launches ``pipeline.main`` as a detached background process and exposes its
+    progress, log output and cancellation to the dashboard.
+    """
+    def __init__(self, lock_path=PIPELINE_LOCK_PATH, cancel_path=PIPELINE_CANCEL_PATH,
+                 status_path=PIPELINE_STATUS_PATH, log_path=PIPELINE_LOG_PATH):
+        self.lock_path = lock_path
+        self.cancel_path = cancel_path
+        self.status_path = status_path
+        self.log_path = log_path
+
+    def start(self):
+        """Starts a run and returns its job id; raises PipelineBusyError if one is active."""
+        job_id = uuid.uuid4().hex[:12]
+        _acquire_lock(self.lock_path, {"job_id": job_id, "pid": os.getpid()})
+        try:
+            if os.path.exists(self.cancel_path):
+                os.remove(self.cancel_path)
+            with open(self.log_path, 'w') as log:
+                # New session: the run survives dashboard reruns and restarts
+                process = subprocess.Popen(
+                    [sys.executable, "-u", "-m", "src.job_runner", job_id],
+                    stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+            # Hand the lock over to the child; the file exists throughout
+            _atomic_write_json({"job_id": job_id, "pid": process.pid}, self.lock_path)
+            _atomic_write_json(_initial_status(job_id, process.pid), self.status_path)
+            # Reap the child when it exits so a stale lock is recognized as dead
+            threading.Thread(target=process.wait, daemon=True).start()
+        except Exception:
+            _release_lock(self.lock_path, os.getpid())
+            raise
+        return job_id
+
+    def status(self):
+        """Latest progress snapshot, or None if no run has been recorded."""
+        status = _read_json(self.status_path)
+        if status and status["state"] == "running" and not _pid_alive(status["pid"]):
+            # The process died without recording an outcome (e.g. a forced cancel)
+            if os.path.exists(self.cancel_path):
+                status["state"] = "cancelled"
+            else:
+                status["state"] = "failed"
+                status["error"] = status.get("error") or "Pipeline process exited unexpectedly"
+        return status
+
+    def is_running(self):
+        status = self.status()
+        return bool(status and status["state"] == "running")
+
+    def cancel(self, force=False):
+        """Requests cancellation at the next stage checkpoint; ``force`` terminates the process."""
+        open(self.cancel_path, 'w').close()
+        status = self.status()
+        if force and status and status["state"] == "running":
+            os.killpg(os.getpgid(status["pid"]), signal.SIGTERM)
+
+    def log_tail(self, lines=20):
+        if not os.path.exists(self.log_path):
+            return ""
+        with open(self.log_path, 'r', errors='replace') as f:
+            return "".join(f.readlines()[-lines:])
+
+def run_job(job_id):
+    """Child process entry point: runs the pipeline and records its outcome."""
+    progress = JobProgress(job_id)
+    try:
+        import pipeline
+        pipeline.main(progress=progress)
+        progress.finish("succeeded")
+        return 0
+    except PipelineCancelled:
+        progress.finish("cancelled")
+        return 1
+    except Exception:
+        traceback.print_exc()
+        progress.finish("failed", error=traceback.format_exc(limit=3))
+        return 2
+    finally:
+        if os.path.exists(PIPELINE_CANCEL_PATH):
+            os.remove(PIPELINE_CANCEL_PATH)
+        _release_lock(PIPELINE_LOCK_PATH, os.getpid())
+
+if __name__ == "__main__":
+    sys.exit(run_job(sys.argv[1]))
@@ -0,0 +1,88 @@
+import os
+import json
+import shutil
+import joblib
+import sklearn
+from src.config import *
+from src.job_runner import _atomic_write_json
+
+# Pointer to the active model version inside the store
+CURRENT_POINTER = "current.json"
+
+class ModelStore:
+    """
+    Versioned on-disk store for one trained forecaster. Each version is a
+    directory holding the estimator as an uncompressed joblib file next to a
+    ``metadata.json`` with the feature schema, the training data fingerprint
+    and the library versions it was fitted with. Loading deserializes the
+    full estimator (scikit-learn copies tree node tables into its own
+    buffers), so callers load lazily, on first use, and keep the instance.
+    """
+    def __init__(self, name, root=MODEL_STORE_DIR, keep=MODEL_STORE_KEEP):
+        self.root = os.path.join(root, name)
+        self.keep = keep
+        os.makedirs(self.root, exist_ok=True)
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def current_version(self):
+        """Id of the active version, or None when nothing has been stored."""
+        try:
+            with open(os.path.join(self.root, CURRENT_POINTER), 'r') as f:
+                return json.load(f)["version"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def metadata(self, version=None):
+        """Metadata of ``version`` (default: the active one), or None."""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self._version_dir(version), "metadata.json"), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def load(self, version=None):
+        """Loads an estimator; raises FileNotFoundError if the version is missing.
+
+        Models fitted with a different scikit-learn release are rejected with
+        a ValueError instead of being unpickled into an inconsistent state.
+        """
+        version = version or self.current_version()
+        metadata = self.metadata(version)
+        if metadata is None:
+            raise FileNotFoundError(f"No stored model version {version!r} in {self.root}")
+        if metadata["sklearn_version"] != sklearn.__version__:
+            raise ValueError(
+                f"Model {version} was fitted with scikit-learn {metadata['sklearn_version']}, "
+                f"running {sklearn.__version__}")
+        path = os.path.join(self._version_dir(version), "model.joblib")
+        return joblib.load(path)
+
+    def save(self, model, version, metadata):
+        """Writes a version and makes it active; older versions beyond ``keep`` are pruned."""
+        final_dir = self._version_dir(version)
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        # Uncompressed: loading skips decompression of the node arrays
+        joblib.dump(model, os.path.join(tmp_dir, "model.joblib"), compress=0)
+        metadata = dict(metadata, version=version, sklearn_version=sklearn.__version__)
+        _atomic_write_json(metadata, os.path.join(tmp_dir, "metadata.json"))
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        _atomic_write_json({"version": version}, os.path.join(self.root, CURRENT_POINTER))
+        self._prune(version)
+        return version
+
+    def _prune(self, active):
+        versions = [
+            entry for entry in os.listdir(self.root)
+            if os.path.isdir(self._version_dir(entry)) and not entry.endswith(".tmp")
+        ]
+        versions.sort(key=lambda v: os.path.getmtime(self._version_dir(v)), reverse=True)
+        for version in [v for v in versions if v != active][max(self.keep - 1, 0):]:
+            shutil.rmtree(self._version_dir(version), ignore_errors=True)
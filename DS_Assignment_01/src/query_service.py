@@ -0,0 +1,171 @@
+import os
+import glob
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import duckdb
+from src.config import *
+from src.job_runner import _atomic_write_json, _read_json
+from src.data_pipeline import lake_fingerprint, CROSSING_ENTERING
+
+# Pointer to the active snapshot inside QUERY_SNAPSHOT_DIR
+SNAPSHOT_POINTER = "current.json"
+
+class QueryTimeoutError(TimeoutError):
+    """A drill-down query exceeded the service's per-query time limit."""
+
+def publish_lake_snapshot(con, root=QUERY_SNAPSHOT_DIR, keep=QUERY_SNAPSHOT_KEEP):
+    """Copies the trip_rollup cube into a read-only snapshot file and makes it current.
+
+    The lake itself stays locked by the writing pipeline; the dashboard reads
+    the snapshot instead. A new snapshot is written next to the active one and
+    the pointer is swapped atomically, so open readers finish on the old file.
+    Returns the snapshot version (the lake fingerprint prefix).
+    """
+    os.makedirs(root, exist_ok=True)
+    version = lake_fingerprint(con)[:12]
+    path = os.path.join(root, f"lake_{version}.duckdb")
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        con.execute(f"ATTACH '{tmp_path}' AS snapshot")
+        try:
+            # Hour-ordered so date-range filters skip row groups by min/max
+            con.execute("CREATE TABLE snapshot.trip_rollup AS SELECT * FROM trip_rollup ORDER BY pickup_hour")
+        finally:
+            con.execute("DETACH snapshot")
+        os.replace(tmp_path, path)
+    _atomic_write_json({"version": version, "path": path}, os.path.join(root, SNAPSHOT_POINTER))
+
+    # Older snapshots beyond ``keep`` are removed; readers holding one keep their open file
+    stale = sorted(glob.glob(os.path.join(root, "lake_*.duckdb")), key=os.path.getmtime, reverse=True)
+    for old in [p for p in stale if p != path][max(keep - 1, 0):]:
+        os.remove(old)
+    print(f"  [SNAPSHOT] Published query snapshot {version}.")
+    return version
+
+class _SnapshotPool:
+    """Fixed set of cursors over one read-only snapshot connection."""
+    def __init__(self, version, path, size):
+        self.version = version
+        self.con = duckdb.connect(path, read_only=True)
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(self.con.cursor())
+
+    def close(self):
+        self.con.close()
+
+class LakeQueryService:
+    """
+    Parameterized, cached and time-limited queries over the latest lake
+    snapshot, shared by every dashboard session. Connections come from a
+    bounded pool; when the pipeline publishes a new snapshot the pool is
+    swapped on the next query and in-flight readers finish on the old one.
+    Results are memoized per (snapshot version, statement, parameters).
+    """
+    def __init__(self, root=QUERY_SNAPSHOT_DIR, pool_size=QUERY_POOL_SIZE, timeout=QUERY_TIMEOUT,
+                 cache_entries=QUERY_CACHE_ENTRIES):
+        self.root = root
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache_entries = cache_entries
+        self._pool = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _current_pool(self):
+        """The pool for the active snapshot, (re)opened when the pointer moved."""
+        pointer = _read_json(os.path.join(self.root, SNAPSHOT_POINTER))
+        if pointer is None or not os.path.exists(pointer["path"]):
+            return None
+        with self._lock:
+            if self._pool is None or self._pool.version != pointer["version"]:
+                # The replaced pool is left to the garbage collector once its borrowers return
+                self._pool = _SnapshotPool(pointer["version"], pointer["path"], self.pool_size)
+            return self._pool
+
+    def snapshot_version(self):
+        """Version of the snapshot queries are answered from, or None if none is published."""
+        pool = self._current_pool()
+        return pool.version if pool else None
+
+    @contextmanager
+    def _borrow(self, pool):
+        cursor = pool.idle.get(timeout=self.timeout)
+        try:
+            yield cursor
+        finally:
+            pool.idle.put(cursor)
+
+    def query(self, sql, params=None):
+        """Runs a parameterized statement and returns a DataFrame (None without a snapshot).
+
+        Raises QueryTimeoutError when the statement (or the wait for a free
+        connection) exceeds ``timeout`` seconds.
+        """
+        pool = self._current_pool()
+        if pool is None:
+            return None
+        key = (pool.version, sql, tuple(tuple(p) if isinstance(p, list) else p for p in params or ()))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key].copy(deep=False)
+
+        try:
+            with self._borrow(pool) as cursor:
+                timer = threading.Timer(self.timeout, cursor.interrupt)
+                timer.start()
+                try:
+                    df = cursor.execute(sql, params).df()
+                finally:
+                    timer.cancel()
+        except queue.Empty:
+            raise QueryTimeoutError(f"No query connection free within {self.timeout}s")
+        except duckdb.InterruptException:
+            raise QueryTimeoutError(f"Query exceeded the {self.timeout}s limit")
+
+        with self._lock:
+            self._cache[key] = df
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return df.copy(deep=False)
+
+    def border_compliance(self, start, end, taxi_types=TAXIS, min_trips=50):
+        """Surcharge compliance of trips entering the congestion zone, per pickup zone."""
+        return self.query("""
+            SELECT
+                pickup_loc,
+                SUM(trip_count)::BIGINT as trips,
+                SUM(paid_count)::BIGINT as paid,
+                (paid * 100.0 / trips) as compliance_pct
+            FROM trip_rollup
+            WHERE
+                pickup_hour >= ? AND pickup_hour < ?
+                AND list_contains(?, taxi_type)
+                AND crossing = ?
+            GROUP BY pickup_loc
+            HAVING trips > ?
+            ORDER BY compliance_pct ASC, pickup_loc
+        """, [start, end, list(taxi_types), CROSSING_ENTERING, min_trips])
+
+    def velocity_matrix(self, start, end, taxi_types=TAXIS, zones=CONGESTION_ZONE_IDS):
+        """Mean speed by year, day of week and hour for trips within ``zones``."""
+        return self.query("""
+            SELECT
+                year(pickup_hour) as year,
+                dayofweek(pickup_hour) as dow,
+                hour(pickup_hour) as hour,
+                SUM(speed_sum) / NULLIF(SUM(speed_count), 0) as avg_speed
+            FROM trip_rollup
+            WHERE
+                pickup_hour >= ? AND pickup_hour < ?
+                AND list_contains(?, taxi_type)
+                AND list_contains(?, pickup_loc)
+                AND list_contains(?, dropoff_loc)
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+        """, [start, end, list(taxi_types), list(zones), list(zones)])
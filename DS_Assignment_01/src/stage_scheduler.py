@@ -0,0 +1,152 @@
+import os
+import json
+import inspect
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from src.config import *
+from src.job_runner import NULL_PROGRESS, _atomic_write_json, _read_json
+from src.instrumentation import NULL_TELEMETRY
+
+def _code_source(obj):
+    """Source text of a function, method or class; falls back to its repr."""
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return repr(obj)
+
+class Stage:
+    """
+    One node of the pipeline DAG.
+
+    ``code`` lists the callables whose source versions the stage and ``params``
+    any configuration it reads; together with the fingerprints of ``deps`` they
+    address the stage's result. A stage with a ``digest`` is a source stage: it
+    always runs and ``digest()`` fingerprints what it produced (e.g. the lake).
+    ``outputs`` are the files a skipped stage must still find on disk.
+    """
+    def __init__(self, name, run, deps=(), outputs=(), code=(), params=(), digest=None,
+                 progress_stage=None, unit="steps", counters=None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.params = list(params)
+        self.digest = digest
+        self.progress_stage = progress_stage
+        self.unit = unit
+        self.counters = counters or {}
+
+    def fingerprint(self, upstream):
+        """Content address of the stage's inputs given its dependencies' fingerprints."""
+        payload = json.dumps({
+            "stage": self.name,
+            "code": [_code_source(obj) for obj in self.code],
+            "params": repr(self.params),
+            "deps": {dep: upstream[dep] for dep in sorted(self.deps)},
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+class StageScheduler:
+    """
+    Runs a DAG of stages, skipping those whose input fingerprint matches the
+    cached one from the last successful run and executing independent stages
+    concurrently on a bounded worker pool.
+    """
+    def __init__(self, stages, cache_path=STAGE_CACHE_PATH, workers=STAGE_WORKERS, progress=NULL_PROGRESS,
+                 telemetry=NULL_TELEMETRY):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_path = cache_path
+        self.workers = workers
+        self.progress = progress
+        self.telemetry = telemetry
+        self.cache = _read_json(cache_path) or {}
+        self.fingerprints = {}
+        self.executed = []
+        self._started_groups = set()
+        self._validate()
+
+    def _validate(self):
+        """Rejects unknown dependencies and cycles before anything runs."""
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        visiting, done = set(), set()
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+        for name in self.stages:
+            visit(name)
+
+    def _is_current(self, stage, fingerprint):
+        return (self.cache.get(stage.name) == fingerprint
+                and all(os.path.exists(path) for path in stage.outputs))
+
+    def _start_group(self, stage):
+        """Opens the progress stage shared by a group of DAG stages on first use."""
+        group = stage.progress_stage
+        if group is None or group in self._started_groups:
+            return
+        self._started_groups.add(group)
+        total = sum(1 for s in self.stages.values() if s.progress_stage == group)
+        self.progress.start_stage(group, total, unit=stage.unit)
+
+    def _execute(self, stage, force):
+        """Runs (or skips) one stage and returns its output fingerprint."""
+        with self.telemetry.stage(stage.name, "StageScheduler", skipped=False) as span:
+            if stage.digest is not None:
+                stage.run()
+                fingerprint = stage.digest()
+            else:
+                fingerprint = stage.fingerprint(self.fingerprints)
+                if not force and self._is_current(stage, fingerprint):
+                    print(f"  [SCHEDULER] {stage.name} is up to date; skipped.")
+                    span.fields["skipped"] = True
+                else:
+                    stage.run()
+                    self.executed.append(stage.name)
+        if stage.progress_stage is not None:
+            self.progress.advance(stage=stage.progress_stage, **stage.counters)
+        return fingerprint
+
+    def run(self, force=False):
+        """Executes the DAG; ``force`` reruns every stage regardless of the cache."""
+        pending = dict(self.stages)
+        running = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                if failure is None:
+                    ready = [s for s in pending.values() if all(dep in self.fingerprints for dep in s.deps)]
+                    for stage in ready:
+                        self.progress.checkpoint()
+                        self._start_group(stage)
+                        del pending[stage.name]
+                        running[pool.submit(self._execute, stage, force)] = stage
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        self.fingerprints[stage.name] = future.result()
+                    except Exception as e:
+                        # Let in-flight stages finish, then surface the first error
+                        failure = failure or e
+                        continue
+                    if stage.digest is None:
+                        self.cache[stage.name] = self.fingerprints[stage.name]
+                        _atomic_write_json(self.cache, self.cache_path)
+
+        if failure is not None:
+            raise failure
+        return self.executed
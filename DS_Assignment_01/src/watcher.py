@@ -0,0 +1,153 @@
+import os
+import re
+import glob
+import time
+import shutil
+import duckdb
+import pandas as pd
+from src.config import *
+from src.job_runner import NULL_PROGRESS, PipelineBusyError, pipeline_lock
+from src.data_pipeline import MetropolitanIngestor, source_month, plan_incremental_sync, lake_fingerprint
+from src.artifact_store import load_artifact_version
+
+class MonthWatcher:
+    """
+    Long-running ingestion of newly published monthly trip files.
+
+    Each poll looks for ``{taxi}_tripdata_YYYY-MM.parquet`` files that are
+    not yet in DATA_DIR, either in a local directory or at an HTTP source
+    laid out like the TLC endpoint (probing the months after the latest one
+    held locally, from INGEST_START_DATE when none is). Downloads reuse the
+    ingestor's resumable, retrying downloader; new files land atomically in
+    DATA_DIR. Every poll then compares DATA_DIR with the lake manifest and the
+    published artifact version, and runs the pipeline incrementally whenever
+    they disagree: only the new partitions are ingested, sanitized, rolled up
+    and exported, stages whose inputs did not change are skipped, and the run
+    ends by publishing a new artifact version. A month whose run was blocked
+    or failed is therefore retried on the next poll.
+    """
+    def __init__(self, source=WATCH_SOURCE, interval=WATCH_INTERVAL, taxis=TAXIS, mode=WATCH_ANALYTICS_MODE,
+                 progress=NULL_PROGRESS):
+        self.source = source
+        self.interval = interval
+        self.taxis = taxis
+        self.mode = mode
+        self.progress = progress
+        self.remote = source.startswith(("http://", "https://"))
+        # Only the download path of the ingestor is used: its catalog is a throwaway in-memory lake
+        self.downloader = MetropolitanIngestor(database=":memory:") if self.remote else None
+        self.session = self.downloader.session if self.remote else None
+
+    def _local_path(self, filename):
+        return os.path.join(DATA_DIR, filename).replace('\\', '/')
+
+    def _first_missing_month(self, taxi):
+        """The month after the latest one held locally, or INGEST_START_DATE's month if none is."""
+        months = [source_month(f) for f in glob.glob(os.path.join(DATA_DIR, f"{taxi}_tripdata_*.parquet"))]
+        months = [m for m in months if m is not None]
+        if not months:
+            return pd.Timestamp(INGEST_START_DATE).to_period("M").to_timestamp()
+        return max(months) + pd.DateOffset(months=1)
+
+    def _candidates(self):
+        """``(source, filename)`` pairs of monthly files the source has and DATA_DIR lacks."""
+        pattern = re.compile(rf"^({'|'.join(self.taxis)})_tripdata_\d{{4}}-\d{{2}}\.parquet$")
+        if not self.remote:
+            return [
+                (os.path.join(self.source, name), name)
+                for name in sorted(os.listdir(self.source))
+                if pattern.match(name) and not os.path.exists(self._local_path(name))
+            ]
+
+        # Months are published in order: probe forward from the latest local month until one is missing
+        candidates = []
+        current = pd.Timestamp.now().to_period("M").to_timestamp()
+        for taxi in self.taxis:
+            month = self._first_missing_month(taxi)
+            while month <= current:
+                name = f"{taxi}_tripdata_{month:%Y-%m}.parquet"
+                url = f"{self.source.rstrip('/')}/{name}"
+                if self.session.head(url, timeout=30, allow_redirects=True).status_code != 200:
+                    break
+                candidates.append((url, name))
+                month += pd.DateOffset(months=1)
+        return candidates
+
+    def _fetch(self, source, filename):
+        """Copies or downloads one file into DATA_DIR via a validated temporary file."""
+        if self.remote:
+            # Resumes a partial download left by an earlier poll; the .part file is kept for the next one
+            dest_path = self.downloader.acquire_resource(source, filename)
+            if dest_path is None:
+                raise ValueError(f"{filename} could not be downloaded as a readable parquet file")
+            return dest_path
+
+        dest_path = self._local_path(filename)
+        part_path = dest_path + ".part"
+        shutil.copyfile(source, part_path)
+        try:
+            with duckdb.connect() as con:
+                con.execute(f"SELECT * FROM read_parquet('{part_path}') LIMIT 0")
+        except Exception as e:
+            os.remove(part_path)
+            raise ValueError(f"{filename} is not a readable parquet file: {e}")
+        os.replace(part_path, dest_path)
+        return dest_path
+
+    def poll(self):
+        """Fetches every new monthly file; returns the paths that landed in DATA_DIR."""
+        fetched = []
+        for source, filename in self._candidates():
+            try:
+                fetched.append(self._fetch(source, filename))
+                print(f"  [WATCH] Acquired new month {filename}")
+            except Exception as e:
+                # Retried on the next poll (e.g. a file still being uploaded)
+                print(f"  [ERROR] Could not acquire {filename}: {e}")
+        return fetched
+
+    def lake_is_stale(self, lake_path=LAKE_PATH):
+        """Whether DATA_DIR or the lake is ahead of the last published artifact version.
+
+        Call under the pipeline lock: the lake is opened read-only, which
+        fails while a pipeline run holds it.
+        """
+        if not os.path.exists(lake_path):
+            return any(glob.glob(os.path.join(DATA_DIR, f"{taxi}_tripdata_*.parquet")) for taxi in self.taxis)
+        with duckdb.connect(lake_path, read_only=True) as con:
+            changed, removed = plan_incremental_sync(con)
+            lake = lake_fingerprint(con)
+        published = load_artifact_version() or {}
+        return bool(changed or removed) or published.get("lake") != lake
+
+    def run_cycle(self):
+        """One poll, then an incremental pipeline run if the artifacts lag DATA_DIR.
+
+        Returns whether the pipeline ran.
+        """
+        self.poll()
+        import pipeline
+        with pipeline_lock(job_id="watch"):
+            if not self.lake_is_stale():
+                return False
+            pipeline.main(progress=self.progress, mode=self.mode, acquire=False)
+        return True
+
+    def watch(self, once=False):
+        """Polls every ``interval`` seconds until interrupted (or once)."""
+        print(f"--- WATCHING {self.source} FOR NEW MONTHS (every {self.interval}s) ---")
+        try:
+            while True:
+                try:
+                    self.run_cycle()
+                except PipelineBusyError as e:
+                    # The lake stays stale, so the next poll runs the pipeline
+                    print(f"  [WATCH] {e}; retrying next poll.")
+                except Exception as e:
+                    # A failed run leaves the artifacts behind DATA_DIR; the next poll retries it
+                    print(f"  [ERROR] Watch cycle failed: {type(e).__name__}: {e}")
+                if once:
+                    return
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("  [WATCH] Stopped.")
@@ -0,0 +1,175 @@
+import os
+import uuid
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.config import *
+
+# Long layout of the local cache: one row per location, day and variable
+CACHE_SCHEMA = pa.schema([
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("date", pa.date32()),
+    ("variable", pa.string()),
+    ("value", pa.float64()),
+])
+
+# Serializes cache read-modify-writes of concurrent synchronizations (e.g. preview and report stages)
+_cache_lock = threading.Lock()
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def _fetch_windows(days, chunk_days):
+    """Groups sorted days into contiguous (start, end) windows of at most ``chunk_days``."""
+    windows = []
+    for day in days:
+        if windows and day == windows[-1][1] + timedelta(days=1) and (day - windows[-1][0]).days < chunk_days:
+            windows[-1][1] = day
+        else:
+            windows.append([day, day])
+    return [tuple(window) for window in windows]
+
+class MeteorologicalArchive:
+    """
+    Daily weather series from the open-meteo archive, persisted in a local
+    Parquet cache. Only days missing from the cache are requested, in chunked
+    windows fetched concurrently; ``register`` exposes the cached range as a
+    typed DuckDB table (one column per variable) for in-database joins.
+    """
+    def __init__(self, cache_path=WEATHER_CACHE_PATH, base_url=WEATHER_ARCHIVE_URL,
+                 latitude=WEATHER_LATITUDE, longitude=WEATHER_LONGITUDE, timezone=WEATHER_TIMEZONE,
+                 chunk_days=WEATHER_CHUNK_DAYS, workers=WEATHER_WORKERS, offline=WEATHER_OFFLINE):
+        self.cache_path = cache_path
+        self.base_url = base_url
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.chunk_days = chunk_days
+        self.workers = workers
+        self.offline = offline
+        self.fetch_failures = []
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _read_cache(self):
+        if not os.path.exists(self.cache_path):
+            return CACHE_SCHEMA.empty_table()
+        return pq.read_table(self.cache_path, schema=CACHE_SCHEMA)
+
+    def _write_cache(self, table):
+        # Unique temporary name: writers in other processes never share it
+        tmp_path = f"{self.cache_path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, self.cache_path)
+
+    def _cached_keys(self, cache):
+        """(date, variable) pairs already cached for this location."""
+        rows = cache.select(["latitude", "longitude", "date", "variable"]).to_pylist()
+        return {
+            (row["date"], row["variable"]) for row in rows
+            if row["latitude"] == self.latitude and row["longitude"] == self.longitude
+        }
+
+    def cache_digest(self):
+        """Version stamp of the cache file (changes whenever days are added)."""
+        try:
+            stat = os.stat(self.cache_path)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _fetch_window(self, window, variables):
+        """Requests one window; returns cache rows (days without data are left out)."""
+        start, end = window
+        response = self.session.get(self.base_url, timeout=30, params={
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "daily": ",".join(variables),
+            "timezone": self.timezone,
+        })
+        response.raise_for_status()
+        daily = response.json()["daily"]
+        rows = []
+        for i, day in enumerate(daily["time"]):
+            for variable in variables:
+                value = daily.get(variable, [None] * len(daily["time"]))[i]
+                # Archive lag: days not yet published stay missing and are retried
+                if value is not None:
+                    rows.append((self.latitude, self.longitude, date.fromisoformat(day), variable, float(value)))
+        return rows
+
+    def _fetch_tracked(self, window, variables):
+        try:
+            return self._fetch_window(window, variables)
+        except Exception as e:
+            self.fetch_failures.append({
+                "start_date": window[0].isoformat(),
+                "end_date": window[1].isoformat(),
+                "error": str(e).splitlines()[0] if str(e) else type(e).__name__,
+            })
+            return []
+
+    def synchronize(self, start=WEATHER_START_DATE, end=WEATHER_END_DATE, variables=WEATHER_VARIABLES):
+        """Backfills the cache for ``[start, end]``; returns the number of rows added.
+
+        Failed windows are listed in ``self.fetch_failures`` and left missing,
+        so the next synchronization retries exactly those days.
+        """
+        start, end = _as_date(start), min(_as_date(end), date.today())
+        self.fetch_failures = []
+        cache = self._read_cache()
+        cached = self._cached_keys(cache)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        missing = [day for day in days if any((day, v) not in cached for v in variables)]
+        if not missing or self.offline:
+            return 0
+
+        windows = _fetch_windows(missing, self.chunk_days)
+        print(f"  [NETWORK] Fetching {len(missing)} weather days in {len(windows)} windows...")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda w: self._fetch_tracked(w, variables), windows))
+
+        for failure in self.fetch_failures:
+            print(f"  [ERROR] Weather window {failure['start_date']}..{failure['end_date']} failed: {failure['error']}")
+        with _cache_lock:
+            # Re-read under the lock: a concurrent synchronization may have added days meanwhile
+            cache = self._read_cache()
+            cached = self._cached_keys(cache)
+            fetched = [row for rows in results for row in rows if (row[2], row[3]) not in cached]
+            if fetched:
+                columns = list(zip(*fetched))
+                added = pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, CACHE_SCHEMA)],
+                                             schema=CACHE_SCHEMA)
+                self._write_cache(pa.concat_tables([cache, added]))
+        return len(fetched)
+
+    def register(self, con, start=WEATHER_START_DATE, end=WEATHER_END_DATE,
+                 variables=WEATHER_VARIABLES, table="weather_daily"):
+        """Materializes the cached ``[start, end]`` range as a wide, typed DuckDB table.
+
+        The table has a DATE ``date`` column plus one DOUBLE column per variable
+        and is always created (possibly empty) so joins against it never fail.
+        """
+        columns = ",\n".join(f"MAX(value) FILTER (WHERE variable = '{v}') as {v}" for v in variables)
+        if os.path.exists(self.cache_path):
+            source = f"read_parquet('{self.cache_path}')"
+        else:
+            source = "(SELECT NULL::DOUBLE as latitude, NULL::DOUBLE as longitude, NULL::DATE as date, NULL::VARCHAR as variable, NULL::DOUBLE as value LIMIT 0)"
+        con.execute(f"""
+            CREATE OR REPLACE TABLE {table} AS
+            SELECT date, {columns}
+            FROM {source}
+            WHERE latitude = ? AND longitude = ? AND date BETWEEN ?::DATE AND ?::DATE
+            GROUP BY date
+            ORDER BY date
+        """, [self.latitude, self.longitude, str(start), str(end)])
+        return table
@@ -0,0 +1,235 @@
+import os
+import glob
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from src.config import *
+
+# Mean length of one degree of latitude, used for the equirectangular area scale
+KM_PER_DEGREE = 111.32
+MILES_PER_KM = 0.621371
+
+def file_digest(path):
+    """Content hash of the GeoJSON; keys the binary sidecars and the lake's zone distances."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def _ring_centroid(ring):
+    """Shoelace area and centroid of a closed lon/lat ring."""
+    x, y = ring[:, 0], ring[:, 1]
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y1 - x1 * y
+    area = cross.sum() / 2.0
+    if area == 0:
+        return 0.0, ring[:, 0].mean(), ring[:, 1].mean()
+    cx = ((x + x1) * cross).sum() / (6.0 * area)
+    cy = ((y + y1) * cross).sum() / (6.0 * area)
+    return abs(area), cx, cy
+
+def _simplify_ring(ring, tolerance):
+    """Douglas-Peucker simplification of a closed ring, keeping at least a triangle."""
+    if len(ring) <= 4:
+        return ring
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        seg = ring[end] - ring[start]
+        pts = ring[start + 1:end] - ring[start]
+        norm = np.hypot(seg[0], seg[1])
+        if norm == 0:
+            dist = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    simplified = ring[keep]
+    return simplified if len(simplified) >= 4 else ring
+
+class ZoneGeometryIndex:
+    """
+    Array-backed taxi zone geometry: area-weighted centroids, bounding boxes
+    and simplified rings, persisted as a compact ``.npz`` sidecar of the GeoJSON.
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.location_id = arrays["location_id"]
+        self.centroid = arrays["centroid"]
+        self.bbox = arrays["bbox"]
+        self.area_km2 = arrays["area_km2"]
+        self.zone = arrays["zone"]
+        self.borough = arrays["borough"]
+        self.coords = arrays["coords"]
+        self.ring_offsets = arrays["ring_offsets"]
+        self.ring_zone = arrays["ring_zone"]
+        self.ring_is_hole = arrays["ring_is_hole"]
+
+    @classmethod
+    def from_geojson(cls, path, tolerance=ZONE_SIMPLIFY_TOLERANCE):
+        """Parses the GeoJSON once, merging features that share a location id."""
+        with open(path, 'r') as f:
+            features = json.load(f)['features']
+
+        zones = {}
+        for feature in features:
+            props = feature['properties']
+            loc_id = int(props['locationid'])
+            entry = zones.setdefault(loc_id, {"zone": props.get('zone', ''), "borough": props.get('borough', ''), "polygons": []})
+            geometry = feature['geometry']
+            polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+            entry["polygons"].extend(polygons)
+
+        location_ids = sorted(zones)
+        centroid = np.zeros((len(location_ids), 2))
+        bbox = np.zeros((len(location_ids), 4))
+        area_km2 = np.zeros(len(location_ids))
+        coords, ring_offsets, ring_zone, ring_is_hole = [], [0], [], []
+
+        for row, loc_id in enumerate(location_ids):
+            weight_sum, moment = 0.0, np.zeros(2)
+            first_ring = len(coords)
+            for polygon in zones[loc_id]["polygons"]:
+                for ring_no, raw_ring in enumerate(polygon):
+                    ring = np.asarray(raw_ring, dtype=np.float64)[:, :2]
+                    area, cx, cy = _ring_centroid(ring)
+                    # Holes subtract regardless of winding order
+                    weight = -area if ring_no > 0 else area
+                    weight_sum += weight
+                    moment += weight * np.array([cx, cy])
+
+                    simplified = _simplify_ring(ring, tolerance)
+                    coords.append(simplified)
+                    ring_offsets.append(ring_offsets[-1] + len(simplified))
+                    ring_zone.append(row)
+                    ring_is_hole.append(ring_no > 0)
+
+            rows = np.concatenate(coords[first_ring:])
+            bbox[row] = [rows[:, 0].min(), rows[:, 1].min(), rows[:, 0].max(), rows[:, 1].max()]
+            centroid[row] = moment / weight_sum if weight_sum > 0 else rows.mean(axis=0)
+            # Equirectangular scale at the zone's latitude
+            area_km2[row] = weight_sum * KM_PER_DEGREE ** 2 * np.cos(np.radians(centroid[row, 1]))
+
+        return cls({
+            "location_id": np.asarray(location_ids, dtype=np.int32),
+            "centroid": centroid,
+            "bbox": bbox,
+            "area_km2": area_km2,
+            "zone": np.asarray([zones[i]["zone"] for i in location_ids], dtype=str),
+            "borough": np.asarray([zones[i]["borough"] for i in location_ids], dtype=str),
+            "coords": np.concatenate(coords).astype(np.float64),
+            "ring_offsets": np.asarray(ring_offsets, dtype=np.int64),
+            "ring_zone": np.asarray(ring_zone, dtype=np.int32),
+            "ring_is_hole": np.asarray(ring_is_hole, dtype=bool),
+        })
+
+    @classmethod
+    def load(cls, path=ZONE_GEOJSON_PATH):
+        """Loads the sidecar matching the GeoJSON's content hash, building it if stale."""
+        base = os.path.splitext(path)[0]
+        sidecar = f"{base}.{file_digest(path)}.zones.npz"
+        if os.path.exists(sidecar):
+            with np.load(sidecar, allow_pickle=False) as data:
+                return cls({key: data[key] for key in data.files})
+
+        index = cls.from_geojson(path)
+        tmp_path = sidecar + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **index.arrays)
+        os.replace(tmp_path, sidecar)
+        for stale in glob.glob(f"{base}.*.zones.npz"):
+            if stale != sidecar:
+                os.remove(stale)
+        return index
+
+    def to_frame(self):
+        """Per-zone attributes as a DataFrame keyed by LocationID, ready for merges."""
+        return pd.DataFrame({
+            "LocationID": self.location_id,
+            "zone": self.zone,
+            "borough": self.borough,
+            "lon": self.centroid[:, 0],
+            "lat": self.centroid[:, 1],
+            "min_lon": self.bbox[:, 0],
+            "min_lat": self.bbox[:, 1],
+            "max_lon": self.bbox[:, 2],
+            "max_lat": self.bbox[:, 3],
+            "area_km2": self.area_km2,
+        })
+
+    def distance_matrix(self):
+        """Zone-to-zone minimum and centroid distances in miles, as (n, n) arrays.
+
+        Coordinates are projected equirectangularly at the city's mean latitude.
+        The minimum distance is taken between simplified ring vertices (0 for
+        touching zones), so it can exceed the true gap by about the
+        simplification tolerance.
+        """
+        scale = np.array([np.cos(np.radians(self.centroid[:, 1].mean())), 1.0]) * KM_PER_DEGREE * MILES_PER_KM
+        points = self.coords * scale
+        centroids = self.centroid * scale
+        centroid_mi = np.hypot(*(centroids[:, None, :] - centroids[None, :, :]).transpose(2, 0, 1))
+
+        # Rings are stored zone by zone, so each zone's vertices form one contiguous run
+        vertex_zone = np.repeat(self.ring_zone, np.diff(self.ring_offsets))
+        starts = np.searchsorted(vertex_zone, np.arange(len(self.location_id)))
+        min_mi = np.zeros_like(centroid_mi)
+        for row in range(len(self.location_id)):
+            end = starts[row + 1] if row + 1 < len(starts) else len(points)
+            nearest, _ = cKDTree(points[starts[row]:end]).query(points)
+            min_mi[row] = np.minimum.reduceat(nearest, starts)
+        # Vertex sampling is not symmetric; keep the tighter bound of each pair
+        min_mi = np.minimum(min_mi, min_mi.T)
+        np.fill_diagonal(min_mi, 0.0)
+        return min_mi, centroid_mi
+
+    def rings(self, location_id):
+        """Simplified rings of one zone as ``(coords, is_hole)`` pairs."""
+        row = int(np.searchsorted(self.location_id, location_id))
+        if row >= len(self.location_id) or self.location_id[row] != location_id:
+            return []
+        return [
+            (self.coords[self.ring_offsets[i]:self.ring_offsets[i + 1]], bool(self.ring_is_hole[i]))
+            for i in np.flatnonzero(self.ring_zone == row)
+        ]
+
+def load_zone_distances(path=ZONE_GEOJSON_PATH):
+    """Zone pair distances as a (pickup_loc, dropoff_loc, min_distance_mi, centroid_distance_mi) frame.
+
+    Built once per GeoJSON version and cached in a ``.distances.npz`` sidecar.
+    """
+    base = os.path.splitext(path)[0]
+    sidecar = f"{base}.{file_digest(path)}.distances.npz"
+    if os.path.exists(sidecar):
+        with np.load(sidecar, allow_pickle=False) as data:
+            location_id, min_mi, centroid_mi = data["location_id"], data["min_mi"], data["centroid_mi"]
+    else:
+        index = ZoneGeometryIndex.load(path)
+        location_id = index.location_id
+        min_mi, centroid_mi = index.distance_matrix()
+        tmp_path = sidecar + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, location_id=location_id, min_mi=min_mi, centroid_mi=centroid_mi)
+        os.replace(tmp_path, sidecar)
+        for stale in glob.glob(f"{base}.*.distances.npz"):
+            if stale != sidecar:
+                os.remove(stale)
+
+    n = len(location_id)
+    return pd.DataFrame({
+        "pickup_loc": np.repeat(location_id, n),
+        "dropoff_loc": np.tile(location_id, n),
+        "min_distance_mi": min_mi.ravel(),
+        "centroid_distance_mi": centroid_mi.ravel(),
+    })
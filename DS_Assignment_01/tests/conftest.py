@@ -0,0 +1,24 @@
+import os
+import pytest
+import src.config as config
+from tests.stand_in_server import StandInServer
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Scratch project root: config paths (data/, output/) are relative to it."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data", exist_ok=True)
+    os.makedirs("output", exist_ok=True)
+    return tmp_path
+
+@pytest.fixture
+def stand_in():
+    with StandInServer() as server:
+        yield server
+
+@pytest.fixture
+def zone_list():
+    """The shared CONGESTION_ZONE_IDS list (bound as a default argument), restored afterwards."""
+    original = list(config.CONGESTION_ZONE_IDS)
+    yield config.CONGESTION_ZONE_IDS
+    config.CONGESTION_ZONE_IDS[:] = original
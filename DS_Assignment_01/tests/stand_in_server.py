@@ -0,0 +1,115 @@
+"""
+Local HTTP stand-in for the TLC trip-data endpoint and the open-meteo archive.
+
+Serves registered byte payloads (with Range support) from a background thread
+and can inject faults per path: each request to a path consumes the next
+scripted fault, if any.
+
+    "drop"          sends half of the body, then closes the connection
+    "429"           replies Too Many Requests with ``retry_after``
+    "ignore_range"  answers a Range request with 200 and the full body
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        stand_in = self.server.stand_in
+        path = self.path.split("?")[0]
+        range_header = self.headers.get("Range")
+        with stand_in.lock:
+            stand_in.requests.append((self.command, path, range_header, self.path))
+            faults = stand_in.faults.get(path, [])
+            fault = faults.pop(0) if faults and send_body else None
+        body = stand_in.files.get(path)
+        if body is None and path in stand_in.handlers:
+            body = stand_in.handlers[path](self.path)
+
+        if body is None:
+            self._empty(404)
+            return
+        if fault == "429":
+            self._empty(429, {"Retry-After": str(stand_in.retry_after)})
+            return
+
+        start = 0
+        if range_header and fault != "ignore_range":
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(body):
+                self._empty(416, {"Content-Range": f"bytes */{len(body)}"})
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        payload = body[start:]
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not send_body:
+            return
+
+        if fault == "drop":
+            payload = payload[:len(payload) // 2]
+            self.close_connection = True
+        for i in range(0, len(payload), stand_in.chunk_size):
+            self.wfile.write(payload[i:i + stand_in.chunk_size])
+            if stand_in.throttle:
+                # Event.wait, not time.sleep: tests patch sleep to record client backoff
+                threading.Event().wait(stand_in.throttle)
+        self.wfile.flush()
+
+    def _empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class StandInServer:
+    """Threaded local HTTP server; use as a context manager."""
+    def __init__(self, throttle=0.0, chunk_size=64 * 1024, retry_after=0):
+        self.files = {}
+        # path -> callable(request path with query string) -> body bytes (None for 404)
+        self.handlers = {}
+        self.faults = {}
+        self.requests = []
+        self.throttle = throttle
+        self.chunk_size = chunk_size
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.stand_in = self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def serve(self, path, body, faults=()):
+        """Publishes ``body`` at ``path`` with an optional script of faults."""
+        self.files[path] = body
+        self.faults[path] = list(faults)
+
+    def requests_for(self, path, method="GET"):
+        return [r for r in self.requests if r[0] == method and r[1] == path]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
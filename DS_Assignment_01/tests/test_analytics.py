@@ -0,0 +1,99 @@
+import os
+import pytest
+from src.data_pipeline import MetropolitanIngestor
+from src.analytics import UrbanLogisticsEngine
+from src.artifact_store import ArtifactStore
+from src.config import WEATHER_CACHE_PATH
+from benchmarks.synthetic_trips import generate_trip_files, generate_weather_cache
+
+MONTHS = ["2023-12", "2024-12", "2025-01", "2025-02"]
+
+@pytest.fixture
+def lake(workspace):
+    generate_trip_files("data", rows=80_000, months=MONTHS, ghost_rate=0.05)
+    generate_weather_cache()
+    ingestor = MetropolitanIngestor()
+    ingestor.unify_metropolitan_lake()
+    ingestor.apply_sanitization_policy(export_dataset=False)
+    yield ingestor.con
+    ingestor.con.close()
+
+def _published():
+    """Bytes of every file the suite's reports publish."""
+    files = [name for names in UrbanLogisticsEngine.REPORTS.values() for name in names]
+    published = {}
+    for name in files:
+        with open(os.path.join("output", name), 'rb') as f:
+            published[name] = f.read()
+    return published
+
+def test_fused_suite_publishes_the_sequential_bytes(lake):
+    engine = UrbanLogisticsEngine(lake, fetch_weather=False)
+    engine.execute_analytical_suite(mode="sequential")
+    sequential = _published()
+    for name in sequential:
+        os.remove(os.path.join("output", name))
+
+    engine.execute_analytical_suite(mode="fused")
+    fused = _published()
+    assert fused.keys() == sequential.keys()
+    for name in sequential:
+        assert fused[name] == sequential[name], name
+
+def test_rollup_cube_matches_base_table_aggregates(lake):
+    cube = lake.execute("""
+        SELECT taxi_type, crossing, SUM(trip_count), SUM(paid_count), SUM(speed_count),
+               SUM(surcharge_sum), SUM(speed_sum), SUM(fare_sum), SUM(distance_sum)
+        FROM trip_rollup GROUP BY ALL ORDER BY ALL
+    """).fetchall()
+    base = lake.execute("""
+        SELECT taxi_type, crossing, COUNT(*), COUNT(*) FILTER (WHERE surcharge > 0), COUNT(speed_mph),
+               SUM(surcharge), SUM(speed_mph), SUM(fare), SUM(trip_distance)
+        FROM trips_clean GROUP BY ALL ORDER BY ALL
+    """).fetchall()
+    assert [row[:5] for row in cube] == [row[:5] for row in base]
+    for cube_row, base_row in zip(cube, base):
+        assert cube_row[5:] == pytest.approx(base_row[5:])
+
+    # The reports answered from the cube agree with the trips_clean scans
+    engine = UrbanLogisticsEngine(lake, fetch_weather=False)
+    store = ArtifactStore()
+    for report, artifact in [("audit_surcharge_compliance", "surcharge_compliance"),
+                             ("generate_velocity_matrix", "velocity_stats"),
+                             ("model_econometric_impact", "economic_trends")]:
+        engine.run_report(report, mode="sequential")
+        exact = store.load_table(artifact)
+        engine.run_report(report, mode="rollup")
+        rolled = store.load_table(artifact)
+        assert not exact.empty
+        assert list(rolled.columns) == list(exact.columns)
+        for column in exact.columns:
+            assert list(rolled[column]) == pytest.approx(list(exact[column])), (artifact, column)
+    engine.run_report("calculate_total_revenue", mode="sequential")
+    exact = store.load_metric("revenue_report")
+    engine.run_report("calculate_total_revenue", mode="rollup")
+    assert store.load_metric("revenue_report") == exact
+
+def test_weather_report_joins_and_correlates_in_database(lake):
+    UrbanLogisticsEngine(lake, fetch_weather=False).run_report("synchronize_meteorological_data")
+    store = ArtifactStore()
+
+    # Reference computed in pandas from the base tables
+    daily = lake.execute("""
+        SELECT CAST(pickup_time AS DATE) as date, COUNT(*) as trip_count
+        FROM trips_clean WHERE year(pickup_time) = 2025 GROUP BY 1
+    """).df()
+    weather = lake.execute("SELECT date, precipitation_sum FROM weather_daily").df()
+    expected = daily.merge(weather, on="date").sort_values("date").reset_index(drop=True)
+    impact = store.load_table("weather_impact").sort_values("date").reset_index(drop=True)
+
+    assert len(impact) == len(expected) == 59
+    assert list(impact["trip_count"]) == list(expected["trip_count"])
+    assert list(impact["precipitation_sum"]) == pytest.approx(list(expected["precipitation_sum"]))
+    correlation = expected["trip_count"].corr(expected["precipitation_sum"])
+    assert float(store.load_metric("elasticity")) == pytest.approx(correlation, abs=1e-4)
+
+def test_weather_report_without_weather_is_unavailable(lake):
+    os.remove(WEATHER_CACHE_PATH)
+    UrbanLogisticsEngine(lake, fetch_weather=False).run_report("synchronize_meteorological_data")
+    assert ArtifactStore().load_metric("elasticity") == "Unavailable"
@@ -0,0 +1,69 @@
+import os
+import pandas as pd
+import pytest
+import src.artifact_store as artifact_store
+from src.artifact_store import ArtifactStore, publish_artifact, publish_metric
+
+@pytest.fixture
+def reads(workspace, monkeypatch):
+    """Paths read from disk by the store, in order."""
+    paths = []
+    read_arrow = artifact_store._read_arrow
+    def recording(path):
+        paths.append(os.path.basename(path))
+        return read_arrow(path)
+    monkeypatch.setattr(artifact_store, "_read_arrow", recording)
+    return paths
+
+def _velocity(speed):
+    return pd.DataFrame({"year": [2025], "dow": [1], "hour": [8], "avg_speed": [speed]})
+
+def test_loads_are_memoized_until_the_file_changes(reads):
+    store = ArtifactStore()
+    publish_artifact(_velocity(11.0), "velocity_stats")
+    assert store.load_table("velocity_stats")["avg_speed"].item() == 11.0
+    assert store.load_table("velocity_stats")["avg_speed"].item() == 11.0
+    assert reads == ["velocity_stats.arrow"]
+
+    publish_artifact(_velocity(12.5), "velocity_stats")
+    assert store.load_table("velocity_stats")["avg_speed"].item() == 12.5
+    assert reads == ["velocity_stats.arrow"] * 2
+
+def test_least_recently_used_entries_are_evicted(reads):
+    store = ArtifactStore(max_entries=2)
+    for name in ("a", "b"):
+        publish_artifact(_velocity(1.0), name)
+    store.load_table("a")
+    store.load_table("b")
+    store.load_table("a")
+    publish_artifact(_velocity(1.0), "c")
+    store.load_table("c")
+    # "b" was the least recently used entry
+    store.load_table("a")
+    store.load_table("b")
+    assert reads == ["a.arrow", "b.arrow", "c.arrow", "b.arrow"]
+
+def test_cached_frames_are_not_mutated_by_callers(reads):
+    store = ArtifactStore()
+    publish_artifact(_velocity(11.0), "velocity_stats")
+    df = store.load_table("velocity_stats")
+    df["label"] = "x"
+    df["avg_speed"] = 0.0
+    cached = store.load_table("velocity_stats")
+    assert "label" not in cached.columns
+    assert cached["avg_speed"].item() == 11.0
+
+def test_csv_fallback_and_metrics(workspace):
+    store = ArtifactStore()
+    assert store.load_table("velocity_stats") is None
+    _velocity(11.0).to_csv("output/velocity_stats.csv", index=False)
+    assert str(store.load_table("velocity_stats")["dow"].dtype) == "int8"
+
+    assert store.load_metric("elasticity", default="n/a") == "n/a"
+    with open("output/elasticity.txt", "w") as f:
+        f.write("0.1000")
+    assert store.load_metric("elasticity") == "0.1000"
+    publish_metric("elasticity", "-0.2500")
+    publish_metric("revenue_report", "1,000.00")
+    assert store.load_metric("elasticity") == "-0.2500"
+    assert store.load_metric("revenue_report") == "1,000.00"
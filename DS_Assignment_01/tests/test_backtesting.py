@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from src.backtesting import dense_series, hourly_features, lagged_features, RollingOriginBacktester
+
+def _daily(days):
+    dates = pd.Series(pd.date_range("2025-01-01", periods=days, freq="D"))
+    return pd.DataFrame({
+        "date": dates,
+        "trip_count": np.arange(1, days + 1) * 10,
+        "dow": (dates.dt.dayofweek + 1) % 7,
+        "month": dates.dt.month,
+        "precipitation_sum": 0.5,
+    })
+
+def test_daily_lags_span_calendar_days_across_dropped_days():
+    full = _daily(60)
+    # Days without weather are dropped from the feature matrix
+    gappy = full[~full["date"].isin(pd.to_datetime(["2025-01-20", "2025-02-03"]))]
+
+    df = dense_series(gappy, "date")
+    assert len(df) == 60
+    assert df.loc[df["date"] == "2025-01-20", "trip_count"].item() == 0
+    assert list(df["dow"]) == list(full["dow"])
+
+    df, columns = lagged_features(df, horizon=7)
+    row = df[df["date"] == "2025-02-10"].iloc[0]
+    # A week back is the dropped day, not the row seven positions earlier
+    assert row["lag_7"] == 0
+    assert row["lag_14"] == full.loc[full["date"] == "2025-01-27", "trip_count"].item()
+    # The dropped day is kept as lag history but never trained on or scored
+    assert np.isnan(df.loc[df["date"] == "2025-02-03", "precipitation_sum"].item())
+
+def test_hourly_lags_span_whole_days_across_empty_hours():
+    hours = pd.Series(pd.date_range("2025-03-01", periods=24 * 10, freq="h"))
+    full = pd.DataFrame({
+        "pickup_hour": hours,
+        "trip_count": np.arange(len(hours)) + 1,
+        "hour": hours.dt.hour,
+        "dow": (hours.dt.dayofweek + 1) % 7,
+        "month": hours.dt.month,
+        "precipitation_sum": hours.dt.day.astype(float),
+    })
+    # Hours without trips have no rollup rows
+    empty = (full["hour"] >= 2) & (full["hour"] < 5)
+    df = dense_series(full[~empty], "pickup_hour")
+
+    assert len(df) == len(full)
+    assert (df.loc[empty.values, "trip_count"] == 0).all()
+    assert list(df["precipitation_sum"]) == list(full["precipitation_sum"])
+
+    df, columns = hourly_features(df, horizon=24)
+    later = df["pickup_hour"] >= "2025-03-02"
+    shifted = df["pickup_hour"][later] - pd.Timedelta(hours=24)
+    expected = df.set_index("pickup_hour")["trip_count"].reindex(shifted).to_numpy()
+    assert list(df.loc[later, "lag_24"]) == list(expected)
+
+def test_search_scores_a_gappy_series():
+    df = _daily(80).drop(index=[30, 31, 45])
+    backtester = RollingOriginBacktester(initial=40, horizon=7, step=7, workers=1)
+    per_horizon, timings, summary = backtester.search(df, param_grid={"n_estimators": [5]})
+    assert set(summary["feature_set"]) == {"baseline", "calendar", "lagged"}
+    assert per_horizon["step"].max() == 7
+    assert summary["mae"].notna().all()
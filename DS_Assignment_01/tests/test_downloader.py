@@ -0,0 +1,91 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import src.data_pipeline as data_pipeline
+from src.data_pipeline import MetropolitanIngestor
+
+FILENAME = "yellow_tripdata_2025-01.parquet"
+PATH = f"/trip-data/{FILENAME}"
+
+@pytest.fixture
+def payload(tmp_path):
+    table = pa.table({
+        "trip_id": pa.array(range(200_000), pa.int64()),
+        "fare": pa.array([float(i % 97) for i in range(200_000)]),
+    })
+    path = tmp_path / "payload.parquet"
+    pq.write_table(table, path, compression="none")
+    return path.read_bytes()
+
+@pytest.fixture
+def ingestor(workspace, monkeypatch):
+    # Small chunks so a dropped connection leaves a non-empty partial file
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_BACKOFF", 0)
+    ingestor = MetropolitanIngestor(database=":memory:")
+    yield ingestor
+    ingestor.con.close()
+
+def _acquire(ingestor, stand_in):
+    return ingestor.acquire_resource(f"{stand_in.url}{PATH}", FILENAME)
+
+def _range_offset(request):
+    return int(request[2].split("=")[1].split("-")[0]) if request[2] else 0
+
+def test_dropped_connection_resumes_from_partial_offset(ingestor, stand_in, payload):
+    stand_in.serve(PATH, payload, faults=["drop"])
+    dest = _acquire(ingestor, stand_in)
+
+    with open(dest, 'rb') as f:
+        assert f.read() == payload
+    assert not os.path.exists(dest + ".part")
+    first, resumed = stand_in.requests_for(PATH)
+    assert first[2] is None
+    assert 0 < _range_offset(resumed) <= len(payload) // 2
+
+def test_range_ignored_by_server_restarts_from_zero(ingestor, stand_in, payload):
+    stale = b"stale bytes " * 1000
+    with open(os.path.join("data", FILENAME + ".part"), 'wb') as f:
+        f.write(stale)
+    stand_in.serve(PATH, payload, faults=["ignore_range"])
+    dest = _acquire(ingestor, stand_in)
+
+    with open(dest, 'rb') as f:
+        assert f.read() == payload
+    (request,) = stand_in.requests_for(PATH)
+    assert _range_offset(request) == len(stale)
+
+def test_throttled_server_and_429_are_retried(ingestor, stand_in, payload, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(data_pipeline.time, "sleep", sleeps.append)
+    stand_in.throttle = 0.001
+    stand_in.retry_after = 7
+    stand_in.serve(PATH, payload, faults=["429", "429"])
+    dest = _acquire(ingestor, stand_in)
+
+    with open(dest, 'rb') as f:
+        assert f.read() == payload
+    assert len(stand_in.requests_for(PATH)) == 3
+    assert sleeps == [7, 7]
+
+def test_backoff_without_retry_after_is_exponential_and_capped(ingestor, monkeypatch):
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_BACKOFF", 1.0)
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_MAX_BACKOFF", 5)
+    error = ConnectionError("reset")
+    assert [ingestor._retry_delay(error, attempt) for attempt in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5]
+
+def test_truncated_parquet_is_rejected(ingestor, stand_in, payload):
+    stand_in.serve(PATH, payload[:len(payload) // 2])
+    assert _acquire(ingestor, stand_in) is None
+
+    assert not os.path.exists(os.path.join("data", FILENAME))
+    assert not os.path.exists(os.path.join("data", FILENAME + ".part"))
+    # Every attempt restarts from byte zero instead of resuming a corrupt body
+    requests = stand_in.requests_for(PATH)
+    assert len(requests) == data_pipeline.DOWNLOAD_RETRIES
+    assert all(r[2] is None for r in requests)
+
+def test_unpublished_asset_returns_none(ingestor, stand_in):
+    assert _acquire(ingestor, stand_in) is None
+    assert len(stand_in.requests_for(PATH)) == 1
@@ -0,0 +1,41 @@
+import os
+import glob
+from src.data_pipeline import MetropolitanIngestor, open_clean_dataset
+from benchmarks.synthetic_trips import generate_trip_files
+
+def _partition_files():
+    return {
+        os.path.relpath(os.path.dirname(path), "data/trips_clean"): os.path.basename(path)
+        for path in glob.glob("data/trips_clean/**/*.parquet", recursive=True)
+    }
+
+def test_export_is_hive_partitioned_and_rewrites_only_changed_months(workspace, tmp_path):
+    generate_trip_files("data", rows=8_000, months=["2025-01", "2025-02"])
+    lake = MetropolitanIngestor(database="data/lake.duckdb")
+    lake.run_full_lifecycle(acquire=False)
+
+    before = _partition_files()
+    assert sorted(before) == [f"taxi_type={taxi}/year=2025/month={month}"
+                              for taxi in ("green", "yellow") for month in (1, 2)]
+    dataset = open_clean_dataset()
+    exported = "SELECT taxi_type, year, month, COUNT(*), SUM(trip_id) FROM trips_clean GROUP BY ALL ORDER BY ALL"
+    lake_rows = lake.con.execute("""
+        SELECT taxi_type, year(pickup_time), month(pickup_time), COUNT(*), SUM(trip_id)
+        FROM trips_clean GROUP BY ALL ORDER BY ALL
+    """).fetchall()
+    assert dataset.execute(exported).fetchall() == lake_rows
+    dataset.close()
+
+    # A republished month rewrites its own partition; the others keep their files
+    generate_trip_files(str(tmp_path / "upstream"), rows=8_000, months=["2025-02"], taxis=["yellow"], seed=7)
+    os.replace(tmp_path / "upstream" / "yellow_tripdata_2025-02.parquet", "data/yellow_tripdata_2025-02.parquet")
+    lake.run_full_lifecycle(acquire=False)
+
+    after = _partition_files()
+    changed = {partition for partition in before if before[partition] != after[partition]}
+    assert changed == {"taxi_type=yellow/year=2025/month=2"}
+    dataset = open_clean_dataset()
+    assert dataset.execute("SELECT COUNT(*) FROM trips_clean").fetchone() == \
+        lake.con.execute("SELECT COUNT(*) FROM trips_clean").fetchone()
+    dataset.close()
+    lake.con.close()
@@ -0,0 +1,113 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import src.forecasting_engine as forecasting_engine
+from src.forecasting_engine import MetropolitanDemandForecaster, FEATURE_COLUMNS
+from src.model_store import ModelStore
+
+def _features(days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Series(pd.date_range("2025-01-01", periods=days, freq="D"))
+    precipitation = rng.gamma(0.5, 4.0, days).round(1)
+    dow = (dates.dt.dayofweek + 1) % 7
+    return pd.DataFrame({
+        "date": dates,
+        "trip_count": (10_000 + 800 * dow - 150 * precipitation + rng.normal(0, 200, days)).round(),
+        "dow": dow,
+        "month": dates.dt.month,
+        "precipitation_sum": precipitation,
+    })
+
+@pytest.fixture
+def forecaster(workspace, monkeypatch):
+    monkeypatch.setattr(forecasting_engine, "FORECAST_N_ESTIMATORS", 16)
+    return MetropolitanDemandForecaster(store=ModelStore("daily", root="output/models"))
+
+@pytest.fixture
+def fits(monkeypatch):
+    """Sizes of the training sets the forecaster fitted a forest on."""
+    calls = []
+    fit = MetropolitanDemandForecaster._fit_within_budget
+    def counting(self, X, y):
+        calls.append(len(X))
+        return fit(self, X, y)
+    monkeypatch.setattr(MetropolitanDemandForecaster, "_fit_within_budget", counting)
+    return calls
+
+def test_batch_inference_matches_row_by_row_predictions(forecaster):
+    forecaster.train_forecasting_model(_features())
+    scenarios = _features(days=30, seed=1)[FEATURE_COLUMNS]
+
+    batch = forecaster.predict_batch(scenarios)
+    rows = [forecaster.model.predict(scenarios.iloc[[i]].astype(np.float64))[0] for i in range(len(scenarios))]
+    assert list(batch) == pytest.approx(rows)
+    assert list(forecaster.predict_batch(pa.Table.from_pandas(scenarios))) == pytest.approx(rows)
+    arrays = forecaster.predict_batch(dow=scenarios["dow"], month=scenarios["month"], precip=scenarios["precipitation_sum"])
+    assert list(arrays) == pytest.approx(rows)
+
+    intervals = forecaster.predict_batch(scenarios, quantiles=[0.1, 0.9])
+    assert list(intervals.columns) == ["prediction", "q10", "q90"]
+    assert list(intervals["prediction"]) == pytest.approx(rows)
+    assert (intervals["q10"] <= intervals["q90"]).all()
+
+def test_point_predictions_are_cached_until_retraining(forecaster):
+    untrained = forecaster.predict_batch(dow=[1, 2], month=[3, 3], precip=[0.0, 5.0])
+    assert list(untrained) == [0, 0]
+
+    forecaster.train_forecasting_model(_features())
+    first = forecaster.generate_prediction(2, 3, 0.0)
+    assert first == int(forecaster.predict_batch(dow=[2], month=[3], precip=[0.0])[0])
+    # Repeated queries are served from the cache, not the model
+    forecaster._prediction_cache[(2, 3, 0.0)] = -1
+    assert forecaster.generate_prediction(2, 3, 0.0) == -1
+
+    forecaster.train_forecasting_model(_features(seed=2))
+    assert forecaster._prediction_cache == {}
+
+def test_same_feature_matrix_skips_retraining(forecaster, fits):
+    df = _features()
+    assert forecaster.train_forecasting_model(df)
+    version = forecaster.store.current_version()
+
+    # A fresh process warm-starts from the store instead of refitting
+    restarted = MetropolitanDemandForecaster(store=ModelStore("daily", root="output/models"))
+    assert restarted.train_forecasting_model(df.copy())
+    assert len(fits) == 1
+    assert restarted.store.current_version() == version
+    assert list(restarted.predict_batch(df)) == pytest.approx(list(forecaster.predict_batch(df)))
+
+    assert restarted.train_forecasting_model(_features(seed=3))
+    assert len(fits) == 2
+    assert restarted.store.current_version() != version
+
+def test_store_rejects_models_from_another_sklearn_release(forecaster, fits):
+    df = _features()
+    forecaster.train_forecasting_model(df)
+    store = forecaster.store
+    path = os.path.join(store.root, store.current_version(), "metadata.json")
+    with open(path) as f:
+        metadata = json.load(f)
+    with open(path, "w") as f:
+        json.dump(dict(metadata, sklearn_version="0.0.1"), f)
+
+    with pytest.raises(ValueError, match="scikit-learn 0.0.1"):
+        store.load()
+    with pytest.raises(FileNotFoundError):
+        store.load("missing")
+    # The forecaster falls back to an unfitted model and retrains on the same data
+    restarted = MetropolitanDemandForecaster(store=store)
+    assert not hasattr(restarted.model, "n_features_in_")
+    assert restarted.train_forecasting_model(df)
+    assert len(fits) == 2
+    assert store.load() is not None
+
+def test_old_versions_are_pruned(workspace):
+    store = ModelStore("daily", root="output/models", keep=2)
+    for version in ("a", "b", "c"):
+        store.save({"version": version}, version, {"data_fingerprint": version})
+    assert store.current_version() == "c"
+    assert sorted(entry for entry in os.listdir(store.root) if entry != "current.json") == ["b", "c"]
+    assert store.load() == {"version": "c"}
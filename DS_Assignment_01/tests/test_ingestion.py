@@ -0,0 +1,149 @@
+import os
+from src.data_pipeline import MetropolitanIngestor
+from src.analytics import UrbanLogisticsEngine
+from src.artifact_store import ArtifactStore
+from benchmarks.synthetic_trips import generate_trip_files
+
+def _ingest(database):
+    ingestor = MetropolitanIngestor(database=database)
+    ingestor.unify_metropolitan_lake()
+    ingestor.apply_sanitization_policy(export_dataset=False)
+    return ingestor
+
+def _lake_state(con):
+    """Order-independent contents of every table derived from the sources (float sums rounded)."""
+    return {
+        "manifest": con.execute("""
+            SELECT source_file, taxi_type, file_size, row_count, schema_hash, sanitized
+            FROM lake_manifest ORDER BY source_file
+        """).fetchall(),
+        "clean": con.execute("""
+            SELECT source_file, COUNT(*), SUM(trip_id),
+                   ROUND(SUM(fare), 6), ROUND(SUM(surcharge), 6), ROUND(SUM(speed_mph), 6)
+            FROM trips_clean GROUP BY 1 ORDER BY 1
+        """).fetchall(),
+        "rejections": con.execute("SELECT * FROM trip_rejections ORDER BY ALL").fetchall(),
+        "rollup": con.execute("""
+            SELECT source_file, COUNT(*), SUM(trip_count), ROUND(SUM(speed_sum), 6)
+            FROM trip_rollup GROUP BY 1 ORDER BY 1
+        """).fetchall(),
+        "sample": con.execute("SELECT source_file, COUNT(*), SUM(trip_id) FROM trips_sample GROUP BY 1 ORDER BY 1").fetchall(),
+    }
+
+def test_incremental_sync_matches_a_full_rebuild(workspace, tmp_path):
+    generate_trip_files("data", rows=12_000, months=["2025-01", "2025-02"], ghost_rate=0.05)
+    lake = _ingest("data/incremental.duckdb")
+
+    # A republished month, a newly published one and a withdrawn one
+    generate_trip_files(str(tmp_path / "upstream"), rows=12_000, months=["2025-02", "2025-03"], taxis=["yellow"],
+                        ghost_rate=0.05, seed=7)
+    for month in ("2025-02", "2025-03"):
+        name = f"yellow_tripdata_{month}.parquet"
+        os.replace(tmp_path / "upstream" / name, os.path.join("data", name))
+    os.remove("data/green_tripdata_2025-01.parquet")
+
+    untouched = os.path.abspath("data/yellow_tripdata_2025-01.parquet")
+    ingested_at = "SELECT ingested_at FROM lake_manifest WHERE source_file = ?"
+    before = lake.con.execute(ingested_at, [untouched]).fetchone()
+    lake.unify_metropolitan_lake()
+    lake.apply_sanitization_policy(export_dataset=False)
+    # Only the changed months were reloaded
+    assert lake.con.execute(ingested_at, [untouched]).fetchone() == before
+
+    rebuilt = _ingest("data/rebuilt.duckdb")
+    incremental, full = _lake_state(lake.con), _lake_state(rebuilt.con)
+    assert len(full["manifest"]) == 4
+    for table in full:
+        assert incremental[table] == full[table], table
+    lake.con.close()
+    rebuilt.con.close()
+
+def test_unchanged_sources_are_not_reloaded(workspace):
+    generate_trip_files("data", rows=4_000, months=["2025-01"])
+    lake = _ingest("data/lake.duckdb")
+    state = _lake_state(lake.con)
+    manifest = lake.con.execute("SELECT source_file, ingested_at FROM lake_manifest ORDER BY 1").fetchall()
+
+    lake.unify_metropolitan_lake()
+    lake.apply_sanitization_policy(export_dataset=False)
+    assert lake.con.execute("SELECT source_file, ingested_at FROM lake_manifest ORDER BY 1").fetchall() == manifest
+    assert _lake_state(lake.con) == state
+    lake.con.close()
+
+def test_files_without_congestion_surcharge_are_filled_with_zero(workspace):
+    # Every third month omits the column, as the pre-2019 TLC files do; all share one multi-file scan
+    paths = generate_trip_files("data", rows=12_000, months=["2025-01", "2025-02", "2025-03"], taxis=["yellow"],
+                                missing_surcharge_every=3)
+    generate_trip_files("data", rows=2_000, months=["2025-01"], taxis=["green"], missing_surcharge_every=1)
+    lake = MetropolitanIngestor(database="data/lake.duckdb")
+    lake.unify_metropolitan_lake()
+    assert lake.ingestion_failures == []
+
+    ingested = dict(lake.con.execute("""
+        SELECT regexp_extract(source_file, '[^/]+$'), SUM(surcharge)
+        FROM raw_trips GROUP BY 1 HAVING COUNT(*) = COUNT(surcharge)
+    """).fetchall())
+    assert ingested["yellow_tripdata_2025-03.parquet"] == 0
+    assert ingested["green_tripdata_2025-01.parquet"] == 0
+    for path in paths[:2]:
+        source = lake.con.execute(f"SELECT SUM(congestion_surcharge) FROM read_parquet('{path}')").fetchone()[0]
+        assert ingested[os.path.basename(path)] == source > 0
+    lake.con.close()
+
+def test_ghost_audit_counts_each_rejected_trip_once_by_reason(workspace):
+    generate_trip_files("data", rows=8_000, months=["2025-01", "2025-02"], ghost_rate=0.1)
+    lake = _ingest("data/lake.duckdb")
+    UrbanLogisticsEngine(lake.con).run_report("audit_ghost_trips")
+
+    reasons = ArtifactStore().load_table("ghost_trip_reasons")
+    expected = lake.con.execute("""
+        SELECT taxi_type, reject_reason, COUNT(*)
+        FROM raw_trips WHERE reject_reason IS NOT NULL
+        GROUP BY ALL ORDER BY ALL
+    """).fetchall()
+    assert list(reasons.itertuples(index=False, name=None)) == expected
+    assert {reason for _, reason, _ in expected} >= {"duration_out_of_bounds", "non_positive_distance", "non_positive_fare"}
+    # trip_id keys every raw trip; accepted trips are exactly the clean ones
+    assert lake.con.execute("SELECT COUNT(*) = COUNT(DISTINCT trip_id) FROM raw_trips").fetchone()[0]
+    assert lake.con.execute("""
+        SELECT COUNT(*) FROM raw_trips r ANTI JOIN trips_clean c USING (trip_id) WHERE r.reject_reason IS NULL
+    """).fetchone()[0] == 0
+
+    # Re-ingesting a touched month reproduces its trip identifiers
+    ids = "SELECT source_file, SUM(trip_id), COUNT(*) FROM trips_clean GROUP BY 1 ORDER BY 1"
+    before = lake.con.execute(ids).fetchall()
+    os.utime("data/yellow_tripdata_2025-01.parquet", (0, 0))
+    lake.unify_metropolitan_lake()
+    lake.apply_sanitization_policy(export_dataset=False)
+    assert lake.con.execute(ids).fetchall() == before
+    lake.con.close()
+
+def _crz_mismatches(con, table, zones):
+    """Rows of ``table`` whose crossing disagrees with membership in ``zones``."""
+    return con.execute(f"""
+        SELECT COUNT(*) FROM {table}
+        WHERE crossing != list_contains(?, pickup_loc)::UTINYINT * 2 + list_contains(?, dropoff_loc)::UTINYINT
+    """, [zones, zones]).fetchone()[0]
+
+def test_crz_columns_follow_the_congestion_zone_list(workspace, zone_list):
+    generate_trip_files("data", rows=8_000, months=["2025-01"])
+    lake = _ingest("data/lake.duckdb")
+    for table in ("raw_trips", "trips_clean", "trip_rollup"):
+        assert _crz_mismatches(lake.con, table, list(zone_list)) == 0, table
+    assert lake.con.execute("""
+        SELECT COUNT(*) FROM trips_clean WHERE crossing != pickup_in_crz::UTINYINT * 2 + dropoff_in_crz::UTINYINT
+    """).fetchone()[0] == 0
+    crossings = "SELECT crossing, COUNT(*) FROM trips_clean GROUP BY 1 ORDER BY 1"
+    before = lake.con.execute(crossings).fetchall()
+    assert len(before) == 4
+    ingested_at = lake.con.execute("SELECT source_file, ingested_at FROM lake_manifest ORDER BY 1").fetchall()
+    lake.con.close()
+
+    # A redefined zone re-derives the columns in place, without reloading any month
+    zone_list[:] = zone_list[::2]
+    lake = MetropolitanIngestor(database="data/lake.duckdb")
+    for table in ("raw_trips", "trips_clean", "trip_rollup"):
+        assert _crz_mismatches(lake.con, table, list(zone_list)) == 0, table
+    assert lake.con.execute(crossings).fetchall() != before
+    assert lake.con.execute("SELECT source_file, ingested_at FROM lake_manifest ORDER BY 1").fetchall() == ingested_at
+    lake.con.close()
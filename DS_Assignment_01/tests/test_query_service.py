@@ -0,0 +1,74 @@
+import glob
+import pytest
+from src.data_pipeline import MetropolitanIngestor, CROSSING_ENTERING, CROSSING_INTERNAL
+from src.query_service import LakeQueryService, QueryTimeoutError, publish_lake_snapshot
+from benchmarks.synthetic_trips import generate_trip_files
+
+YEAR_2025 = ("2025-01-01", "2026-01-01")
+
+@pytest.fixture
+def lake(workspace):
+    generate_trip_files("data", rows=20_000, months=["2025-01", "2025-02"])
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    yield ingestor
+    ingestor.con.close()
+
+def test_without_a_snapshot_queries_return_none(workspace):
+    service = LakeQueryService()
+    assert service.snapshot_version() is None
+    assert service.border_compliance(*YEAR_2025) is None
+
+def test_drill_downs_match_trips_clean(lake):
+    publish_lake_snapshot(lake.con)
+    service = LakeQueryService()
+
+    compliance = service.border_compliance(*YEAR_2025, taxi_types=["yellow"], min_trips=0)
+    expected = lake.con.execute(f"""
+        SELECT pickup_loc, COUNT(*), COUNT(*) FILTER (WHERE surcharge > 0)
+        FROM trips_clean
+        WHERE taxi_type = 'yellow' AND crossing = {CROSSING_ENTERING} AND year(pickup_time) = 2025
+        GROUP BY 1 ORDER BY 1
+    """).fetchall()
+    assert expected
+    assert sorted(compliance[["pickup_loc", "trips", "paid"]].itertuples(index=False, name=None)) == expected
+
+    velocity = service.velocity_matrix("2025-02-01", "2025-03-01")
+    expected = lake.con.execute(f"""
+        SELECT year(pickup_time), dayofweek(pickup_time), hour(pickup_time), AVG(speed_mph)
+        FROM trips_clean
+        WHERE crossing = {CROSSING_INTERNAL} AND month(pickup_time) = 2
+        GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+    """).fetchall()
+    assert len(velocity) == len(expected)
+    assert list(velocity["avg_speed"]) == pytest.approx([row[3] for row in expected])
+
+def test_results_are_cached_per_snapshot_version(lake):
+    first = publish_lake_snapshot(lake.con)
+    service = LakeQueryService()
+    before = service.border_compliance(*YEAR_2025, min_trips=0)
+    # Served from the cache: no connection is borrowed from the pool
+    idle = service._pool.idle
+    service._pool.idle = None
+    assert service.border_compliance(*YEAR_2025, min_trips=0).equals(before)
+    service._pool.idle = idle
+
+    generate_trip_files("data", rows=20_000, months=["2025-03"], seed=5)
+    lake.unify_metropolitan_lake()
+    lake.apply_sanitization_policy(export_dataset=False)
+    second = publish_lake_snapshot(lake.con)
+    assert second != first
+    assert service.snapshot_version() == second
+    assert service.border_compliance(*YEAR_2025, min_trips=0)["trips"].sum() > before["trips"].sum()
+    assert len(glob.glob("data/snapshots/lake_*.duckdb")) == 2
+
+def test_slow_queries_and_exhausted_pools_time_out(lake):
+    publish_lake_snapshot(lake.con)
+    service = LakeQueryService(pool_size=1, timeout=0.2)
+    with pytest.raises(QueryTimeoutError, match="limit"):
+        service.query("SELECT COUNT(*) FROM range(100000) a, range(100000) b WHERE a.range + b.range = -1")
+
+    with service._borrow(service._current_pool()):
+        with pytest.raises(QueryTimeoutError, match="No query connection"):
+            service.query("SELECT 1")
+    assert service.query("SELECT 1 as one")["one"].item() == 1
@@ -0,0 +1,29 @@
+import pytest
+from src.data_pipeline import MetropolitanIngestor
+from benchmarks.synthetic_trips import generate_trip_files
+
+@pytest.fixture
+def sources(workspace):
+    generate_trip_files("data", rows=20_000, months=["2025-01", "2025-02", "2025-03"], ghost_rate=0.1)
+
+def _sanitize(database, streaming):
+    ingestor = MetropolitanIngestor(database=database, streaming=streaming)
+    ingestor.unify_metropolitan_lake()
+    ingestor.apply_sanitization_policy(export_dataset=False)
+    return ingestor.con
+
+def test_streaming_matches_batch_sanitization(sources):
+    batch = _sanitize("data/batch.duckdb", streaming=False)
+    streaming = _sanitize("data/streaming.duckdb", streaming=True)
+
+    clean = "SELECT COUNT(*), SUM(trip_id), SUM(speed_mph) FROM trips_clean"
+    rejections = "SELECT taxi_type, reject_reason, SUM(trips) FROM trip_rejections GROUP BY 1, 2 ORDER BY 1, 2"
+    assert streaming.execute(clean).fetchone() == pytest.approx(batch.execute(clean).fetchone())
+    assert streaming.execute(rejections).fetchall() == batch.execute(rejections).fetchall()
+    assert batch.execute(rejections).fetchall()
+
+    # Streaming keeps neither unfiltered rows nor its per-batch staging table
+    assert streaming.execute("SELECT COUNT(*) FROM raw_trips").fetchone()[0] == 0
+    assert streaming.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'staged_trips'").fetchone()[0] == 0
+    batch.close()
+    streaming.close()
@@ -0,0 +1,92 @@
+import os
+import pytest
+import pipeline
+from src.stage_scheduler import Stage, StageScheduler
+from src.artifact_store import load_artifact_version
+from benchmarks.synthetic_trips import generate_trip_files, generate_weather_cache, generate_zone_geojson
+
+class Dag:
+    """A small diamond DAG (source -> left, right -> join) recording which stages ran."""
+    def __init__(self, workspace):
+        self.cache_path = str(workspace / "stage_cache.json")
+        self.source = "v1"
+        self.params = {"left": 1}
+        self.failing = set()
+        self.ran = []
+
+    def _stage(self, name, **kwargs):
+        def run():
+            self.ran.append(name)
+            if name in self.failing:
+                raise RuntimeError(f"{name} failed")
+            for path in kwargs.get("outputs", []):
+                open(path, 'w').close()
+        return Stage(name, run, **kwargs)
+
+    def run(self, force=False):
+        self.ran = []
+        stages = [
+            self._stage("source", digest=lambda: self.source),
+            self._stage("left", deps=["source"], params=[self.params["left"]], outputs=["output/left.txt"]),
+            self._stage("right", deps=["source"]),
+            self._stage("join", deps=["left", "right"]),
+        ]
+        executed = StageScheduler(stages, cache_path=self.cache_path, workers=2).run(force=force)
+        return sorted(executed)
+
+@pytest.fixture
+def dag(workspace):
+    return Dag(workspace)
+
+def test_unchanged_inputs_skip_every_derived_stage(dag):
+    assert dag.run() == ["join", "left", "right"]
+    assert dag.run() == []
+    assert dag.run() == []
+    # Source stages always run; their digest decides what is stale
+    assert dag.ran == ["source"]
+    assert dag.run(force=True) == ["join", "left", "right"]
+
+def test_changes_rerun_only_the_affected_stages(dag):
+    dag.run()
+    dag.params["left"] = 2
+    assert dag.run() == ["join", "left"]
+
+    # A missing output is rebuilt from the same inputs, so its dependents stay current
+    os.remove("output/left.txt")
+    assert dag.run() == ["left"]
+
+    dag.source = "v2"
+    assert dag.run() == ["join", "left", "right"]
+    assert dag.run() == []
+
+def test_failed_stage_is_retried_and_its_siblings_stay_cached(dag):
+    dag.failing.add("left")
+    with pytest.raises(RuntimeError, match="left failed"):
+        dag.run()
+    assert "join" not in dag.ran
+
+    dag.failing.clear()
+    assert dag.run() == ["join", "left"]
+    assert dag.run() == []
+
+def test_invalid_dags_are_rejected(dag):
+    with pytest.raises(ValueError, match="unknown stage"):
+        StageScheduler([Stage("a", lambda: None, deps=["missing"])], cache_path=dag.cache_path)
+    with pytest.raises(ValueError, match="cycle"):
+        StageScheduler([Stage("a", lambda: None, deps=["b"]), Stage("b", lambda: None, deps=["a"])],
+                       cache_path=dag.cache_path)
+
+def test_pipeline_rerun_on_an_unchanged_lake_skips_every_stage(workspace):
+    generate_trip_files("data", rows=6_000, months=["2024-12", "2025-01", "2025-02"])
+    generate_zone_geojson()
+    generate_weather_cache()
+
+    pipeline.main(mode="rollup", acquire=False)
+    first = load_artifact_version()
+    assert "forecast" in first["executed"]
+
+    pipeline.main(mode="rollup", acquire=False)
+    second = load_artifact_version()
+    assert second["executed"] == []
+    assert second["lake"] == first["lake"]
+    assert second["version"] == first["version"] + 1
@@ -0,0 +1,115 @@
+import os
+import pytest
+import pipeline
+import src.data_pipeline as data_pipeline
+from src.watcher import MonthWatcher
+from src.data_pipeline import MetropolitanIngestor, lake_fingerprint
+from src.artifact_store import publish_artifact_version
+from src.job_runner import pipeline_lock
+from benchmarks.synthetic_trips import generate_trip_files
+
+@pytest.fixture
+def published(tmp_path):
+    """Monthly files of an upstream source, generated outside the workspace."""
+    source = tmp_path / "source"
+    generate_trip_files(str(source), rows=6_000, months=["2025-01", "2025-02", "2025-03"], taxis=["yellow"],
+                        missing_surcharge_every=0)
+    return source
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replaces the pipeline run with a recorder (scripted to fail while ``fail`` holds errors)."""
+    calls = {"count": 0, "fail": []}
+    def main(**kwargs):
+        calls["count"] += 1
+        assert kwargs["acquire"] is False
+        if calls["fail"]:
+            raise calls["fail"].pop(0)
+    monkeypatch.setattr(pipeline, "main", main)
+    return calls
+
+def _ingest_and_publish():
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    publish_artifact_version(lake_fingerprint(ingestor.con), [])
+    ingestor.con.close()
+
+def test_http_source_probes_months_after_the_latest_local_one(workspace, stand_in, published):
+    for month in ("2025-01", "2025-02", "2025-03"):
+        name = f"yellow_tripdata_{month}.parquet"
+        stand_in.serve(f"/trip-data/{name}", (published / name).read_bytes())
+    os.replace(published / "yellow_tripdata_2025-01.parquet", "data/yellow_tripdata_2025-01.parquet")
+
+    watcher = MonthWatcher(source=f"{stand_in.url}/trip-data", taxis=["yellow"])
+    fetched = watcher.poll()
+
+    assert sorted(os.path.basename(p) for p in fetched) == ["yellow_tripdata_2025-02.parquet",
+                                                            "yellow_tripdata_2025-03.parquet"]
+    for path in fetched:
+        with open(path, 'rb') as f:
+            assert f.read() == (published / os.path.basename(path)).read_bytes()
+    # Probing stopped at the first unpublished month
+    heads = [r[1] for r in stand_in.requests if r[0] == "HEAD"]
+    assert heads[-1] == "/trip-data/yellow_tripdata_2025-04.parquet"
+    assert not any(p.endswith(".part") for p in os.listdir("data"))
+
+def test_empty_data_dir_probes_from_the_ingest_start_month(workspace, stand_in, published, monkeypatch):
+    # Small chunks so the dropped connection leaves a partial file to resume
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(data_pipeline, "DOWNLOAD_BACKOFF", 0)
+    start = "yellow_tripdata_2023-12.parquet"
+    stand_in.serve(f"/trip-data/{start}", (published / "yellow_tripdata_2025-01.parquet").read_bytes(), faults=["drop"])
+    watcher = MonthWatcher(source=f"{stand_in.url}/trip-data", taxis=["yellow"])
+
+    assert [os.path.basename(p) for p in watcher.poll()] == [start]
+    first, resumed = stand_in.requests_for(f"/trip-data/{start}", "GET")
+    assert first[2] is None and resumed[2].startswith("bytes=")
+
+def test_corrupt_upload_is_not_landed(workspace, stand_in):
+    stand_in.serve("/trip-data/yellow_tripdata_2023-12.parquet", b"not a parquet file")
+    watcher = MonthWatcher(source=f"{stand_in.url}/trip-data", taxis=["yellow"])
+    assert watcher.poll() == []
+    assert stand_in.requests_for("/trip-data/yellow_tripdata_2023-12.parquet", "GET")
+    assert not any("tripdata" in name for name in os.listdir("data"))
+
+def test_new_month_makes_the_lake_stale(workspace, published):
+    watcher = MonthWatcher(source=str(published), taxis=["yellow"])
+    os.replace(published / "yellow_tripdata_2025-01.parquet", "data/yellow_tripdata_2025-01.parquet")
+    assert watcher.lake_is_stale()
+
+    _ingest_and_publish()
+    assert not watcher.lake_is_stale()
+
+    assert len(watcher.poll()) == 2
+    assert watcher.lake_is_stale()
+    _ingest_and_publish()
+    assert not watcher.lake_is_stale()
+
+def test_staleness_only_considers_the_watched_taxis(workspace, published):
+    os.replace(published / "yellow_tripdata_2025-01.parquet", "data/yellow_tripdata_2025-01.parquet")
+    assert not MonthWatcher(source=str(published), taxis=["green"]).lake_is_stale()
+    assert MonthWatcher(source=str(published), taxis=["yellow"]).lake_is_stale()
+
+def test_blocked_or_failed_runs_are_retried_on_later_polls(workspace, published, runs):
+    watcher = MonthWatcher(source=str(published), taxis=["yellow"], interval=0)
+
+    # Another run holds the lake: the months land but the pipeline cannot start
+    with pipeline_lock(job_id="dashboard"):
+        watcher.watch(once=True)
+    assert len([n for n in os.listdir("data") if n.endswith(".parquet")]) == 3
+    assert runs["count"] == 0
+
+    # Nothing new to fetch, but the lake is still behind DATA_DIR; a failing run keeps the daemon alive
+    runs["fail"].append(RuntimeError("disk full"))
+    watcher.watch(once=True)
+    assert runs["count"] == 1
+
+    assert watcher.run_cycle() is True
+    assert runs["count"] == 2
+
+def test_current_lake_is_not_rerun(workspace, published, runs):
+    watcher = MonthWatcher(source=str(published), taxis=["yellow"])
+    watcher.poll()
+    _ingest_and_publish()
+    assert watcher.run_cycle() is False
+    assert runs["count"] == 0
@@ -0,0 +1,101 @@
+import json
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs
+import duckdb
+import pyarrow.parquet as pq
+import pytest
+import src.analytics as analytics
+from src.weather import MeteorologicalArchive
+from src.data_pipeline import MetropolitanIngestor
+from src.analytics import UrbanLogisticsEngine
+from benchmarks.synthetic_trips import generate_weather_cache
+
+VARIABLES = ["precipitation_sum", "temperature_2m_mean"]
+
+def _archive_response(request_path):
+    """open-meteo archive stand-in: deterministic values for every requested day."""
+    query = {key: values[0] for key, values in parse_qs(urlsplit(request_path).query).items()}
+    start, end = date.fromisoformat(query["start_date"]), date.fromisoformat(query["end_date"])
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    daily = {"time": [d.isoformat() for d in days]}
+    for n, variable in enumerate(query["daily"].split(",")):
+        daily[variable] = [float(d.toordinal() % 17 + n) for d in days]
+    return json.dumps({"daily": daily}).encode()
+
+@pytest.fixture
+def archive(workspace, stand_in):
+    stand_in.handlers["/v1/archive"] = _archive_response
+    return MeteorologicalArchive(cache_path="data/weather_daily.parquet", base_url=f"{stand_in.url}/v1/archive",
+                                 chunk_days=30)
+
+def _requested_windows(stand_in):
+    windows = []
+    for request in stand_in.requests_for("/v1/archive"):
+        query = parse_qs(urlsplit(request[3]).query)
+        windows.append((query["start_date"][0], query["end_date"][0]))
+    return sorted(windows)
+
+def test_only_missing_days_are_fetched(archive, stand_in):
+    assert archive.synchronize("2024-01-11", "2024-01-20", VARIABLES) == 10 * len(VARIABLES)
+    assert archive.synchronize("2024-01-01", "2024-01-31", VARIABLES) == 21 * len(VARIABLES)
+
+    assert _requested_windows(stand_in) == [
+        ("2024-01-01", "2024-01-10"), ("2024-01-11", "2024-01-20"), ("2024-01-21", "2024-01-31"),
+    ]
+    # Fully cached: no further requests
+    assert archive.synchronize("2024-01-01", "2024-01-31", VARIABLES) == 0
+    assert len(stand_in.requests_for("/v1/archive")) == 3
+
+def test_long_ranges_are_chunked(archive, stand_in):
+    archive.synchronize("2024-01-01", "2024-03-31", VARIABLES)
+    windows = _requested_windows(stand_in)
+    assert len(windows) == 4
+    assert all((date.fromisoformat(end) - date.fromisoformat(start)).days < 30 for start, end in windows)
+
+def test_concurrent_synchronizations_keep_every_day_once(archive):
+    other = MeteorologicalArchive(cache_path=archive.cache_path, base_url=archive.base_url, chunk_days=7)
+    errors = []
+    def run(target, start, end):
+        try:
+            target.synchronize(start, end, VARIABLES)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(archive, "2024-01-01", "2024-02-29")),
+               threading.Thread(target=run, args=(other, "2024-02-01", "2024-03-31"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    rows = pq.read_table(archive.cache_path).to_pylist()
+    keys = [(row["date"], row["variable"]) for row in rows]
+    assert len(keys) == len(set(keys)) == 91 * len(VARIABLES)
+
+def test_register_builds_typed_table(archive):
+    archive.synchronize("2024-01-01", "2024-01-10", VARIABLES)
+    con = duckdb.connect()
+    archive.register(con, "2024-01-01", "2024-01-31", VARIABLES)
+    types = dict(con.execute("SELECT column_name, column_type FROM (DESCRIBE weather_daily)").fetchall())
+    assert types == {"date": "DATE", "precipitation_sum": "DOUBLE", "temperature_2m_mean": "DOUBLE"}
+    assert con.execute("SELECT COUNT(*) FROM weather_daily").fetchone()[0] == 10
+
+def test_offline_mode_serves_fixture_cache(workspace, stand_in):
+    path = generate_weather_cache("data/weather_daily.parquet", start="2025-01-01", end="2025-01-31")
+    archive = MeteorologicalArchive(cache_path=path, base_url=f"{stand_in.url}/v1/archive", offline=True)
+    assert archive.synchronize("2024-12-01", "2025-01-31") == 0
+    assert stand_in.requests == []
+
+    con = duckdb.connect()
+    archive.register(con, "2025-01-01", "2025-01-31")
+    assert con.execute("SELECT COUNT(*) FROM weather_daily").fetchone()[0] == 31
+
+def test_scheduled_report_does_not_fetch(workspace, monkeypatch):
+    generate_weather_cache()
+    def fail(*args, **kwargs):
+        raise AssertionError("the weather stage owns the fetch")
+    monkeypatch.setattr(analytics.MeteorologicalArchive, "synchronize", fail)
+    ingestor = MetropolitanIngestor(database=":memory:")
+    UrbanLogisticsEngine(ingestor.con, fetch_weather=False).run_report("synchronize_meteorological_data")
+    ingestor.con.close()
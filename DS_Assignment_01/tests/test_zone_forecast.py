@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from src.config import CONGESTION_ZONE_IDS, ZONE_FORECAST_HORIZON_HOURS
+from src.data_pipeline import MetropolitanIngestor
+from src.forecasting_engine import ZoneDemandForecaster
+from src.model_store import ModelStore
+from benchmarks.synthetic_trips import generate_trip_files
+
+@pytest.fixture
+def lake(workspace):
+    generate_trip_files("data", rows=30_000, months=["2025-01", "2025-02"], ghost_rate=0)
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    # A mis-dated record weeks past the last month, as TLC files occasionally carry
+    ingestor.con.execute("""
+        INSERT INTO trip_rollup (pickup_hour, pickup_loc, dropoff_loc, crossing, taxi_type, source_file, trip_count)
+        VALUES (TIMESTAMP '2025-03-20 08:00:00', ?, ?, 3, 'yellow', 'misdated', 1)
+    """, [CONGESTION_ZONE_IDS[0], CONGESTION_ZONE_IDS[0]])
+    yield ingestor.con
+    ingestor.con.close()
+
+def test_history_ends_with_the_last_ingested_month(lake):
+    forecaster = ZoneDemandForecaster(store=ModelStore("zone_hourly", root="output/models"))
+    matrix = forecaster.build_hourly_matrix(lake)
+    history = matrix[matrix['trip_count'].notna()]
+    future = matrix[matrix['trip_count'].isna()]
+
+    first_observed = lake.execute("SELECT MIN(pickup_hour) FROM trip_rollup").fetchone()[0]
+    assert history['pickup_hour'].min() == pd.Timestamp(first_observed)
+    assert history['pickup_hour'].max() == pd.Timestamp("2025-02-28 23:00")
+    assert future['pickup_hour'].min() == pd.Timestamp("2025-03-01 00:00")
+    assert future['pickup_hour'].nunique() == ZONE_FORECAST_HORIZON_HOURS
+    # Lags of the forecast hours read real February volumes, not a zero-filled gap
+    assert future['lag_168'].sum() > 0
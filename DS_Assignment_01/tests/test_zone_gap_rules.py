@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+from src.data_pipeline import MetropolitanIngestor
+from benchmarks.synthetic_trips import generate_trip_files
+
+def _write_zones(path, offset):
+    """Two square zones ``offset`` degrees apart (ids 1 and 2)."""
+    def square(x0):
+        return {"type": "Polygon", "coordinates": [[[x0, 40.7], [x0 + 0.01, 40.7], [x0 + 0.01, 40.71], [x0, 40.71], [x0, 40.7]]]}
+    features = [
+        {"type": "Feature", "properties": {"locationid": str(i + 1), "zone": f"Z{i + 1}", "borough": "Manhattan"},
+         "geometry": square(-74.0 + i * offset)}
+        for i in range(2)
+    ]
+    with open(path, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+@pytest.fixture
+def lake_files(workspace):
+    _write_zones("data/taxi_zones.geojson", offset=0.02)
+    return generate_trip_files("data", rows=6_000, months=["2025-01", "2025-02", "2025-03"], taxis=["yellow"])
+
+def test_geometry_change_still_evicts_deleted_sources(lake_files):
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    ingestor.con.close()
+
+    removed = os.path.abspath(lake_files[0]).replace('\\', '/')
+    os.remove(lake_files[0])
+    _write_zones("data/taxi_zones.geojson", offset=0.05)
+
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    con = ingestor.con
+    for table in ["raw_trips", "trips_clean", "trip_rollup", "trips_sample", "trip_rejections", "lake_manifest"]:
+        assert con.execute(f"SELECT COUNT(*) FROM {table} WHERE source_file = ?", [removed]).fetchone()[0] == 0, table
+    # The remaining months were re-ingested against the new geometry and fingerprinted again
+    assert con.execute("SELECT COUNT(*) FROM lake_manifest WHERE file_size IS NOT NULL AND sanitized").fetchone()[0] == 2
+    assert con.execute("SELECT COUNT(*) FROM trips_clean").fetchone()[0] > 0
+    con.close()
+
+def test_synthetic_ghost_trips_cover_every_rule(workspace):
+    from src.data_pipeline import SANITIZATION_RULES
+    from benchmarks.synthetic_trips import generate_zone_geojson
+    generate_zone_geojson("data/taxi_zones.geojson")
+    generate_trip_files("data", rows=20_000, months=["2025-01"], ghost_rate=0.05)
+
+    ingestor = MetropolitanIngestor()
+    ingestor.run_full_lifecycle(acquire=False)
+    counts = dict(ingestor.con.execute(
+        "SELECT reject_reason, SUM(trips) FROM trip_rejections GROUP BY 1").fetchall())
+    ingestor.con.close()
+    assert set(counts) == {reason for reason, _ in SANITIZATION_RULES}
+    # Regular trips never cross a zone gap: each reason holds about a fifth of the ghosts
+    assert max(counts.values()) < 2 * min(counts.values())